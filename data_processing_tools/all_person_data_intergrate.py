@@ -1,7 +1,10 @@
+import argparse
 import json
 import os
 import subprocess
 from single_person_data_intergrate import SingleExpDataIntergrate
+from job_scheduler import JobScheduler
+from trial_catalog import TrialCatalog, default_catalog_path
 
 def find_all_person_data(data_dir):
 
@@ -15,26 +18,98 @@ def create_folder(dir_path):
     if not os.path.exists(os.path.join(os.getcwd(), dir_path)):
         os.mkdir(dir_path)
 
-def run():
+def collect_all_jobs(person_dirs, out_put_dir):
+    # 先构建所有被试、所有实验的任务列表
+    jobs = []
+    for person_dir in sorted(person_dirs, key=lambda x: int(os.path.basename(x))):
+        jobs.extend(SingleExpDataIntergrate(person_dir, out_put_dir).collect_exp_jobs())
+    return jobs
+
+def run(data_dir=None, out_put_dir=None, workers=None, max_tasks_per_child=None,
+        state_file=None, retries=2, fresh=False, clock_correction=False):
     # 当前目录
     now_dir = os.path.dirname(os.path.abspath(__file__))
     # 上级目录
     uplevel_dir = os.path.dirname(now_dir)
-    data_dir = os.path.join(uplevel_dir, 'lc_exp_data')
-    out_put_dir = os.path.join(uplevel_dir, 'lc_data_all')
+    if data_dir is None:
+        data_dir = os.path.join(uplevel_dir, 'lc_exp_data')
+    if out_put_dir is None:
+        out_put_dir = os.path.join(uplevel_dir, 'lc_data_all')
     create_folder(out_put_dir)
     person_dirs = find_all_person_data(data_dir)
-    exp_intergrators = [SingleExpDataIntergrate(
-        person_dir, out_put_dir) for person_dir in person_dirs]
-    # # 打印33对应的索引
-    # for idx,person_dir in enumerate(person_dirs):
-    #      if os.path.basename(person_dir)=='33':
-    #         print(idx)
-    # print(person_dirs)
-    for idx,exp_intergrator in enumerate(exp_intergrators):
-        print('idx',idx)
-        exp_intergrator.find_all_exp_data()
+    jobs = collect_all_jobs(person_dirs, out_put_dir)
+    if clock_correction:
+        # 匹配前先用拟合的时钟模型换算轨迹时间戳
+        for job in jobs:
+            job['clock_correction'] = True
+    # 记录已完成/失败的任务, 中断后重新运行会跳过已完成的任务
+    if state_file is None:
+        state_file = os.path.join(out_put_dir, '.job_state.json')
+    # 与 build.py 共用同一个状态文件和代码版本, 两个入口互相认可已完成的任务
+    from build import stage_version
+    scheduler = JobScheduler(
+        state_file, max_retries=retries, fresh=fresh, version=stage_version('convert')
+    )
+    # 每完成一个实验就更新 trial catalog, 最后再同步一次(跳过的/删除的实验)
+    catalog = TrialCatalog(default_catalog_path(out_put_dir))
+    summary = scheduler.run(jobs, workers, max_tasks_per_child, on_result=catalog.on_result)
+    catalog.sync(out_put_dir)
+    catalog.close()
+    return summary
     
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser(
+        description='Convert and integrate the trials of all participants'
+    )
+    parser.add_argument(
+        '--data-dir', '-d',
+        type=str,
+        default=None,
+        help='Path to the raw experiment data directory (default: ../lc_exp_data)'
+    )
+    parser.add_argument(
+        '--output-dir', '-o',
+        type=str,
+        default=None,
+        help='Path to the processed data directory (default: ../lc_data_all)'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: number of CPUs, 1 runs in-process)'
+    )
+    parser.add_argument(
+        '--max-tasks-per-child',
+        type=int,
+        default=None,
+        help='Recycle each worker process after this many trials'
+    )
+    parser.add_argument(
+        '--state-file',
+        type=str,
+        default=None,
+        help='Path of the job state file (default: <output-dir>/.job_state.json)'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=2,
+        help='Number of retries for transiently failing trials'
+    )
+    parser.add_argument(
+        '--clock-correction',
+        action='store_true',
+        help='Map trajectory timestamps through the fitted clock model before matching'
+    )
+    parser.add_argument(
+        '--fresh',
+        action='store_true',
+        help='Ignore the job state file and reprocess every trial'
+    )
+    args = parser.parse_args()
+
+    run(data_dir=args.data_dir, out_put_dir=args.output_dir, workers=args.workers,
+        max_tasks_per_child=args.max_tasks_per_child, state_file=args.state_file,
+        retries=args.retries, fresh=args.fresh, clock_correction=args.clock_correction)
@@ -0,0 +1,554 @@
+"""
+build.py - Incremental build of the whole processing pipeline
+
+This script runs the three pipeline stages and only redoes the work whose
+inputs changed since the last build:
+
+1. log2txt:   CARLA recorder .log  ->  recording .txt
+2. convert:   trajectory .json + recording .txt  ->  integrated trial JSON
+              (plus the parsed VR cache and VR JSON written alongside)
+3. aggregate: all integrated trial JSON files  ->  data_all.json
+              (or, with --format shards, a sharded store where only the
+              shards of changed trials are rewritten)
+
+A manifest records, for every output, the fingerprints of its inputs and the
+version of the code and scenario configuration that produced it. An output is
+rebuilt when it is missing, when any input fingerprint differs or when the
+stage's source files / configuration changed. Adding one participant therefore
+converts only that participant's trials.
+
+Usage:
+    python build.py [--data-dir DATA_DIR] [--output-dir OUTPUT_DIR]
+                    [--stages log2txt,convert,aggregate] [--dry-run]
+
+Manifest Structure (<output-dir>/.build_manifest.json):
+    {
+        "version": 1,
+        "outputs": {
+            "<output path>": {
+                "stage": "convert",
+                "inputs": {"<input path>": "<fingerprint>", ...},
+                "code_version": "3f1a...",
+                "extra_outputs": ["<parsed cache path>", ...],
+                "built_at": 1700000000.0
+            },
+            ...
+        }
+    }
+"""
+
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import intergrate_all
+import log2txt
+from all_person_data_intergrate import collect_all_jobs, create_folder
+from config_loader import DEFAULT_CONFIG_PATH
+from job_scheduler import JobScheduler, file_fingerprint
+from src.parser import cache_path
+from trial_catalog import TrialCatalog, default_catalog_path
+
+
+MANIFEST_VERSION = 1
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = ('log2txt', 'convert', 'aggregate')
+
+# Source files (relative to this folder) whose changes invalidate a stage
+STAGE_SOURCES = {
+    'log2txt': ['log2txt.py'],
+    'convert': ['convert.py', 'single_person_data_intergrate.py'],
+    'aggregate': ['intergrate_all.py', 'dataset_store.py', 'config_loader.py'],
+}
+
+# Stages whose version also covers every local module their sources import, so that
+# editing an analysis-only module in src/ does not reconvert the whole corpus
+FOLLOW_IMPORTS = {'convert'}
+
+
+# ============================================================================
+# VERSION AND FINGERPRINT FUNCTIONS
+# ============================================================================
+
+def _module_paths(importer: str, module: Optional[str], level: int) -> List[str]:
+    """Candidate files of a module imported by importer (absolute or relative import)."""
+    parts = module.split('.') if module else []
+    if level:
+        base = os.path.dirname(importer)
+        for _ in range(level - 1):
+            base = os.path.dirname(base)
+        bases = [base]
+    else:
+        # Tools import each other and src.x from this folder, src modules fall back
+        # to bare names from their own folder
+        bases = [TOOLS_DIR, os.path.dirname(importer)]
+    candidates = []
+    for base in bases:
+        path = os.path.join(base, *parts)
+        candidates.extend([path + '.py', os.path.join(path, '__init__.py')])
+    return candidates
+
+
+def local_imports(paths: List[str]) -> List[str]:
+    """
+    Expand source files with every module of this folder they import, transitively.
+
+    Both module level and function level imports count, third party modules
+    (anything that does not resolve to a file below TOOLS_DIR) are ignored.
+
+    Args:
+        paths: Absolute paths of Python source files
+
+    Returns:
+        Sorted absolute paths of the files and their local imports
+    """
+    seen = set()
+    pending = [os.path.abspath(path) for path in paths]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [(alias.name, 0) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                # "from pkg import name" may import the submodule pkg.name
+                prefix = f"{node.module}." if node.module else ''
+                modules = [(node.module, node.level)] + [
+                    (prefix + alias.name, node.level) for alias in node.names
+                ]
+            else:
+                continue
+            for module, level in modules:
+                if module is None:
+                    continue
+                # importing a.b also runs a/__init__.py
+                parts = module.split('.')
+                for depth in range(1, len(parts) + 1):
+                    for candidate in _module_paths(path, '.'.join(parts[:depth]), level):
+                        if os.path.isfile(candidate) and candidate.startswith(TOOLS_DIR + os.sep):
+                            pending.append(os.path.abspath(candidate))
+                            break
+    return sorted(seen)
+
+
+def stage_version(stage: str, config_path: str = str(DEFAULT_CONFIG_PATH)) -> str:
+    """
+    Hash the source files of a stage together with the scenario configuration.
+
+    For the stages in FOLLOW_IMPORTS the local modules the sources import
+    (see local_imports) are hashed as well.
+
+    Args:
+        stage: One of STAGES
+        config_path: Path of the scenario configuration file
+
+    Returns:
+        Hex digest identifying the code/config version of the stage
+    """
+    digest = hashlib.sha1()
+    paths = []
+    for pattern in STAGE_SOURCES[stage]:
+        paths.extend(sorted(glob.glob(os.path.join(TOOLS_DIR, pattern))))
+    if stage in FOLLOW_IMPORTS:
+        paths = local_imports(paths)
+    paths.append(config_path)
+    for path in paths:
+        digest.update(os.path.relpath(path, TOOLS_DIR).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    if stage == 'log2txt':
+        digest.update(log2txt.CARLA_RECORDER_SCRIPT.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def input_fingerprints(paths: List[str]) -> Dict[str, str]:
+    """Map each (absolute) input path to its current fingerprint."""
+    return {os.path.abspath(path): file_fingerprint(path) for path in paths}
+
+
+def parsed_cache_path(txt_file: str) -> str:
+    """Path of the parsed VR cache that convert writes for a recording."""
+    return cache_path(txt_file)
+
+
+# ============================================================================
+# BUILD MANIFEST
+# ============================================================================
+
+class BuildManifest:
+    """
+    Persistent record of how every pipeline output was produced.
+
+    Attributes:
+        path: Path of the manifest JSON file
+        outputs: Mapping from output path to its build record
+    """
+
+    def __init__(self, path: str):
+        """
+        Load the manifest from disk if it exists.
+
+        Args:
+            path: Path of the manifest JSON file
+        """
+        self.path = path
+        self.outputs = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.outputs = manifest['outputs']
+
+    def is_fresh(self, output: str, inputs: Dict[str, str], code_version: str) -> bool:
+        """
+        Check whether an output is up to date.
+
+        Args:
+            output: Output file path
+            inputs: Current input fingerprints (see input_fingerprints)
+            code_version: Current version of the producing stage
+
+        Returns:
+            True if the output exists and was built from identical inputs
+            with the same code/config version
+        """
+        record = self.outputs.get(os.path.abspath(output))
+        return (
+            record is not None
+            and os.path.exists(output)
+            and record['code_version'] == code_version
+            and record['inputs'] == inputs
+        )
+
+    def record(
+        self,
+        output: str,
+        stage: str,
+        inputs: Dict[str, str],
+        code_version: str,
+        extra_outputs: Optional[List[str]] = None
+    ) -> None:
+        """Record a freshly built output and persist the manifest."""
+        self.outputs[os.path.abspath(output)] = {
+            'stage': stage,
+            'inputs': inputs,
+            'code_version': code_version,
+            'extra_outputs': [os.path.abspath(p) for p in extra_outputs or []],
+            'built_at': time.time(),
+        }
+        self.save()
+
+    def save(self) -> None:
+        """Atomically write the manifest."""
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'outputs': self.outputs}, f, indent=4)
+        os.replace(tmp_file, self.path)
+
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def build_log2txt(manifest: BuildManifest, data_dir: str, dry_run: bool = False) -> int:
+    """
+    Convert every CARLA .log whose .txt is missing or out of date.
+
+    Args:
+        manifest: Build manifest
+        data_dir: Raw experiment data directory
+        dry_run: Only report what would be rebuilt
+
+    Returns:
+        Number of outputs (re)built
+    """
+    version = stage_version('log2txt')
+    stale = []
+    for person_dir in log2txt.find_all_person_data(data_dir):
+        for log_file in log2txt.collect_log_files(person_dir):
+            txt_file = log_file.replace('.log', '.txt')
+            inputs = input_fingerprints([log_file])
+            if not manifest.is_fresh(txt_file, inputs, version):
+                stale.append((log_file, txt_file))
+
+    print(f"[log2txt] {len(stale)} recordings to convert")
+    if dry_run:
+        for log_file, _ in stale:
+            print(f"  would convert {log_file}")
+        return len(stale)
+
+    built = 0
+    for log_file, txt_file in stale:
+        log2txt.run_convert(log_file)
+        if os.path.exists(txt_file):
+            manifest.record(txt_file, 'log2txt', input_fingerprints([log_file]), version)
+            built += 1
+        else:
+            print(f"  FAILED {log_file}: no {txt_file} produced")
+    return built
+
+
+def build_convert(
+    manifest: BuildManifest,
+    data_dir: str,
+    output_dir: str,
+    workers: Optional[int] = None,
+    max_tasks_per_child: Optional[int] = None,
+    retries: int = 2,
+    dry_run: bool = False
+) -> int:
+    """
+    Integrate every trial whose inputs or convert code changed.
+
+    Args:
+        manifest: Build manifest
+        data_dir: Raw experiment data directory
+        output_dir: Processed data directory
+        workers: Number of worker processes
+        max_tasks_per_child: Recycle each worker after this many trials
+        retries: Number of retries for transiently failing trials
+        dry_run: Only report what would be rebuilt
+
+    Returns:
+        Number of outputs (re)built
+    """
+    version = stage_version('convert')
+    jobs = collect_all_jobs(log2txt.find_all_person_data(data_dir), output_dir)
+
+    def job_inputs(job):
+        return input_fingerprints([job['json_file'], job['log_file']])
+
+    def record(job):
+        manifest.record(
+            job['output_dir'], 'convert', job_inputs(job), version,
+            extra_outputs=[job['vr_dir'] + '.json', parsed_cache_path(job['log_file'])]
+        )
+
+    stale = [
+        job for job in jobs
+        if not manifest.is_fresh(job['output_dir'], job_inputs(job), version)
+    ]
+    print(f"[convert] {len(stale)}/{len(jobs)} trials to integrate")
+    if dry_run:
+        for job in stale:
+            print(f"  would integrate {job['json_file']}")
+        return len(stale)
+    catalog = TrialCatalog(default_catalog_path(output_dir))
+    built = 0
+    if stale:
+        scheduler = JobScheduler(
+            os.path.join(output_dir, '.job_state.json'), max_retries=retries, version=version
+        )
+
+        def on_result(result):
+            record(result['job'])
+            catalog.on_result(result)
+
+        summary = scheduler.run(stale, workers, max_tasks_per_child, on_result=on_result)
+        # Jobs the scheduler already completed under this version only miss
+        # their manifest entry (e.g. the manifest was deleted)
+        for job in summary['skipped']:
+            record(job)
+        built = len(summary['completed']) + len(summary['skipped'])
+    # Catalogue trials converted outside this build and drop deleted ones
+    catalog.sync(output_dir)
+    catalog.close()
+    return built
+
+
+def build_aggregate(
+    manifest: BuildManifest,
+    output_dir: str,
+    output_file: str,
+    dry_run: bool = False,
+    output_format: str = 'json'
+) -> int:
+    """
+    Re-aggregate the dataset if any integrated trial changed.
+
+    Args:
+        manifest: Build manifest
+        output_dir: Processed data directory
+        output_file: Aggregated dataset path (data_all.json, or the store
+            directory with output_format='shards')
+        dry_run: Only report what would be rebuilt
+        output_format: 'json' or 'shards' (see intergrate_all.run)
+
+    Returns:
+        1 if the aggregated dataset was (re)built, else 0
+    """
+    version = stage_version('aggregate')
+    trial_files = sorted(glob.glob(os.path.join(output_dir, '*', 'traj_data', '*.json')))
+    inputs = input_fingerprints(trial_files)
+    target = output_file
+    if output_format == 'shards':
+        from dataset_store import INDEX_FILE
+        target = os.path.join(output_file, INDEX_FILE)
+    if manifest.is_fresh(target, inputs, version):
+        print(f"[aggregate] {output_file} is up to date")
+        return 0
+
+    print(f"[aggregate] rebuilding {output_file} from {len(trial_files)} trials")
+    if dry_run:
+        return 1
+    if output_format == 'shards':
+        intergrate_all.run(data_dir=output_dir, output_format='shards', store_dir=output_file)
+    else:
+        intergrate_all.run(data_dir=output_dir, output_file=output_file)
+    manifest.record(target, 'aggregate', inputs, version)
+    return 1
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+def build(
+    data_dir: str = None,
+    output_dir: str = None,
+    output_file: str = None,
+    stages: List[str] = STAGES,
+    workers: Optional[int] = None,
+    max_tasks_per_child: Optional[int] = None,
+    retries: int = 2,
+    dry_run: bool = False,
+    output_format: str = 'json'
+) -> Dict[str, int]:
+    """
+    Run the requested pipeline stages incrementally.
+
+    Args:
+        data_dir: Raw experiment data directory (default: ../lc_exp_data)
+        output_dir: Processed data directory (default: ../lc_data_all)
+        output_file: Aggregated dataset path (default: ../data_all.json, or
+            ../data_store with output_format='shards')
+        stages: Stages to run, in pipeline order
+        workers: Number of worker processes for the convert stage
+        max_tasks_per_child: Recycle each convert worker after this many trials
+        retries: Number of retries for transiently failing trials
+        dry_run: Only report what would be rebuilt
+        output_format: 'json' for data_all.json, 'shards' for a sharded store
+
+    Returns:
+        Number of outputs (re)built per stage
+    """
+    parent_dir = os.path.dirname(TOOLS_DIR)
+    if data_dir is None:
+        data_dir = os.path.join(parent_dir, 'lc_exp_data')
+    if output_dir is None:
+        output_dir = os.path.join(parent_dir, 'lc_data_all')
+    if output_file is None:
+        default_name = 'data_store' if output_format == 'shards' else 'data_all.json'
+        output_file = os.path.join(parent_dir, default_name)
+    create_folder(output_dir)
+
+    manifest = BuildManifest(os.path.join(output_dir, '.build_manifest.json'))
+    start_t = time.time()
+    built = {}
+    if 'log2txt' in stages:
+        built['log2txt'] = build_log2txt(manifest, data_dir, dry_run)
+    if 'convert' in stages:
+        built['convert'] = build_convert(
+            manifest, data_dir, output_dir, workers, max_tasks_per_child, retries, dry_run
+        )
+    if 'aggregate' in stages:
+        built['aggregate'] = build_aggregate(
+            manifest, output_dir, output_file, dry_run, output_format
+        )
+
+    verb = "would rebuild" if dry_run else "rebuilt"
+    print(f"Build finished in {time.time() - start_t:.1f}s, {verb}: {built}")
+    return built
+
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Incrementally rebuild the processed dataset'
+    )
+    parser.add_argument(
+        '--data-dir', '-d',
+        type=str,
+        default=None,
+        help='Path to the raw experiment data directory'
+    )
+    parser.add_argument(
+        '--output-dir', '-o',
+        type=str,
+        default=None,
+        help='Path to the processed data directory'
+    )
+    parser.add_argument(
+        '--output-file', '-f',
+        type=str,
+        default=None,
+        help='Path for the aggregated JSON file (store directory with --format shards)'
+    )
+    parser.add_argument(
+        '--format', '-F',
+        type=str,
+        choices=['json', 'shards'],
+        default='json',
+        help='Aggregate into a single JSON file or a sharded store (default: json)'
+    )
+    parser.add_argument(
+        '--stages', '-s',
+        type=str,
+        default=','.join(STAGES),
+        help=f'Comma-separated stages to run (default: {",".join(STAGES)})'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='Number of worker processes for the convert stage'
+    )
+    parser.add_argument(
+        '--max-tasks-per-child',
+        type=int,
+        default=None,
+        help='Recycle each convert worker after this many trials'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=2,
+        help='Number of retries for transiently failing trials'
+    )
+    parser.add_argument(
+        '--dry-run', '-n',
+        action='store_true',
+        help='Only report what would be rebuilt'
+    )
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)}")
+
+    build(
+        data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        output_file=args.output_file,
+        stages=stages,
+        workers=args.workers,
+        max_tasks_per_child=args.max_tasks_per_child,
+        retries=args.retries,
+        dry_run=args.dry_run,
+        output_format=args.format
+    )
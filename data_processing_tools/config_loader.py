@@ -24,6 +24,7 @@ Usage:
     config = load_scenario_config(config_path="/path/to/config.json")
 """
 
+import functools
 import json
 import os
 from pathlib import Path
@@ -154,6 +155,8 @@ class Constants:
         mandatory_params: List of parameter value combinations for MLC
         discretionary_param_dict: Mapping from param string to scenario index
         mandatory_param_dict: Mapping from param string to scenario index
+        lane_geometry: Optional road description for lane assignment
+            (see src/lanes.py), None if the config has no 'lane_geometry'
     
     Example:
         >>> constants = Constants(load_scenario_config())
@@ -193,6 +196,9 @@ class Constants:
             str(p): i for i, p in enumerate(self.mandatory_params)
         }
         
+        # Optional lane geometry (lane centres, width, heading) of the road
+        self.lane_geometry = config.get('lane_geometry', None)
+        
         # Store config path for reference
         self._config_path = config.get('_config_path', None)
     
@@ -244,10 +250,15 @@ class Constants:
 # CONVENIENCE FUNCTIONS
 # ============================================================================
 
+@functools.lru_cache(maxsize=None)
 def get_default_constants() -> Constants:
     """
     Get Constants object for the default scenario.
     
+    The configuration is parsed on the first call only; later calls return
+    the same (read-only) object. Modules use this instead of building
+    Constants at import time, so importing them stays cheap.
+    
     Returns:
         Constants object initialized with default scenario configuration
     """
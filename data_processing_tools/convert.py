@@ -1,4 +1,4 @@
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List
 # from src.parser import parse_file
 # from src.utils import get_good_idxs, fill_gaps, smooth_arr, compute_YP
 # from src.visualizer import (
@@ -11,11 +11,18 @@ from typing import Dict, Optional, List
 from src.parser import *
 from src.utils import *
 from src.visualizer import *
+from src.plot_queue import PlotQueue
+from src.gap_filling import fill_gaps as fill_runs
+from src.smoothing import moving_average
+from src.pyramid import build_pyramids, save_pyramids, pyramid_cache_path
+from src.gaze import cached_world_gaze_rays
+from src.actors import actor_tracks, relative_kinematics
+from src.lanes import LaneGeometry, cached_lane_assignment
+from config_loader import get_default_constants
 from single_exp_data_intergrate import SingleExpDataIntergrate
 
 import numpy as np
 import argparse
-import pandas as pd
 import json
 import os
 import shutil
@@ -36,12 +43,20 @@ def convert(obj):
     if isinstance(obj, np.ndarray):
         return obj.tolist()  # 将numpy数组转换为列表
 
-def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_name:str, vlines: Optional[List[float]] = None):
+def build_cache(kind: str, vr_dir: str, build: Callable[[], object]) -> None:
+    # 派生缓存只是附加输出: 构建失败时只打印警告, 不影响集成 JSON 的生成
+    try:
+        build()
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"WARNING: could not build the {kind} cache of {vr_dir}: {type(e).__name__}: {e}")
+
+def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_name:str, vlines: Optional[List[float]] = None, align_all: bool = False, plot_workers: Optional[int] = None, force_reload: bool = False, clock_correction: bool = False):
     set_results_dir(results_dir)
     """parse the file"""
     # vr数据txt格式转换为json格式
     # print('--------------------------------',vr_dir)
-    data: Dict[str, np.ndarray or dict] = parse_file(vr_dir,force_reload=True)
+    # 解析结果按记录文件路径缓存, 记录文件未更新时直接复用 (force_reload=True 强制重新解析)
+    data: Dict[str, np.ndarray or dict] = parse_file(vr_dir, force_reload=force_reload)
     vr_data_name = vr_data_name+ '.json'
     with open(vr_data_name, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4, default=convert)
@@ -51,45 +66,32 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     copy_file(traj_dir.replace('json','log'),log_name)
 
-    new_data = SingleExpDataIntergrate(traj_dir, vr_data_name).run()
+    new_data = SingleExpDataIntergrate(
+        traj_dir, vr_data_name, align_all=align_all, clock_correction=clock_correction
+    ).run()
     save_data(new_data,json_name)
-    # can also use data["TimestampCarla"] which is in simulator time
-    t: np.ndarray = data["TimeElapsed"]
-
-    """visualize some interesting data!"""
-    pupil_L = data["EyeTracker"]["LEFTPupilDiameter"]
-    # drop invalid data
-    good_pupil_diam = lambda x: x > 0  # need positive diameter
-    good_idxs = get_good_idxs(pupil_L, good_pupil_diam)
-    pupil_L = pupil_L[good_idxs]
-    time_L = t[good_idxs]
-
-    plot_versus(
-        data_x=time_L,
-        name_x="Time",
-        data_y=pupil_L,
-        name_y="Left pupil diameter",
-        units_y="mm",
-        units_x="s",
-        lines=True,
-        vlines=vlines,
-    )
-
-    pupil_R = data["EyeTracker"]["RIGHTPupilDiameter"]
-    good_idxs = get_good_idxs(pupil_R, good_pupil_diam)
-    pupil_R = pupil_R[good_idxs]
-    time_R = t[good_idxs]
-    plot_versus(
-        data_x=time_R,
-        name_x="Time",
-        data_y=pupil_R,
-        name_y="Right pupil diameter",
-        units_y="mm",
-        units_x="s",
-        lines=True,
-        vlines=vlines,
-    )
 
+    # 派生缓存不在关键路径上: 集成结果写出之后再构建 (须在 submit_plots 修改 data 之前)
+    # 多分辨率摘要 (min/max/sum/count) 与解析缓存存放在一起, 用于快速区间统计; 记录文件未更新时复用
+    pyramid_path = pyramid_cache_path(vr_dir)
+    if force_reload or not cache_is_fresh(pyramid_path, vr_dir):
+        build_cache('pyramid', vr_dir, lambda: save_pyramids(build_pyramids(data), pyramid_path))
+    # 世界坐标系下的视线射线 (所有帧, 双眼及合成), 同样缓存, 供注意力分析使用
+    build_cache('gaze', vr_dir, lambda: cached_world_gaze_rays(data, vr_dir, force_reload=force_reload))
+    # 车道分配 (自车及所有车辆), 配置中无车道几何时由轨迹拟合
+    def lane_assignment():
+        geometry = LaneGeometry.from_config(get_default_constants().lane_geometry)
+        cached_lane_assignment(data, vr_dir, actor_tracks(data), geometry, force_reload=force_reload)
+    build_cache('lane', vr_dir, lane_assignment)
+
+    # 集成结果已写出, 图在进程池中并行渲染 (plot_workers=0 为串行)
+    with PlotQueue(results_dir, plot_workers) as plots:
+        submit_plots(plots, data, vlines)
+
+
+def submit_plots(plots: PlotQueue, data: Dict[str, np.ndarray or dict], vlines: Optional[List[float]] = None):
+    # NOTE: the raw (TimeElapsed) pupil diameter plots used to be drawn here, but they
+    # were always overwritten by the smoothed plots of the same name below
     data["TimestampCarla"] = data["TimestampCarla"] / 1000  # to seconds
     t = data["TimestampCarla"]
     # now t is in seconds
@@ -109,7 +111,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     all_valid_idxs = np.where(all_valid == 1)
     print(f"Total validity percentage: {100 * np.sum(all_valid) / len(all_valid):.3f}%")
 
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=all_valid,
@@ -119,13 +122,15 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         vlines=vlines,
     )
 
-    pupil_mm_L = eye["LEFTPupilDiameter"]
-    if (pupil_mm_L < 0).any():  # correct for negatives
-        pupil_mm_L = fill_gaps(pupil_mm_L, lambda x: x < 0, mode="mean")
-    plot_versus(
+    # correct for negatives (blinks) in both eyes at once
+    pupil_mm = np.stack([eye["LEFTPupilDiameter"], eye["RIGHTPupilDiameter"]], axis=1)
+    pupil_mm, _ = fill_runs(pupil_mm, pupil_mm < 0, mode="mean")
+    pupil_mm_L, pupil_mm_R = pupil_mm[:, 0], pupil_mm[:, 1]
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
-        data_y=smooth_arr(pupil_mm_L, 100),
+        data_y=moving_average(pupil_mm_L, 100),
         name_y="Left pupil diameter",
         units_y="mm",
         units_x="s",
@@ -134,13 +139,11 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         vlines=vlines,
     )
 
-    pupil_mm_R = eye["RIGHTPupilDiameter"]
-    if (pupil_mm_R < 0).any():  # correct for negatives
-        pupil_mm_R = fill_gaps(pupil_mm_R, lambda x: x < 0, mode="mean")
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
-        data_y=smooth_arr(pupil_mm_R),
+        data_y=moving_average(pupil_mm_R, 5),
         name_y="Right pupil diameter",
         units_y="mm",
         units_x="s",
@@ -151,7 +154,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     gaze_dir_C = eye["COMBINEDGazeDir"][all_valid_idxs]
     gaze_yaw_C, gaze_pitch_C = compute_YP(gaze_dir_C)
-    plot_histogram2d(
+    plots.submit(
+        plot_histogram2d,
         data_x=gaze_yaw_C,
         data_y=gaze_pitch_C,
         name_x="yaw_C",
@@ -162,7 +166,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
     gaze_dir_L = eye["LEFTGazeDir"][all_valid_idxs]
     gaze_yaw_L, gaze_pitch_L = compute_YP(gaze_dir_L)
-    plot_histogram2d(
+    plots.submit(
+        plot_histogram2d,
         data_x=gaze_yaw_L,
         data_y=gaze_pitch_L,
         name_x="yaw_L",
@@ -174,7 +179,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     gaze_dir_R = eye["RIGHTGazeDir"][all_valid_idxs]
     gaze_yaw_R, gaze_pitch_R = compute_YP(gaze_dir_R)
-    plot_histogram2d(
+    plots.submit(
+        plot_histogram2d,
         data_x=gaze_yaw_R,
         data_y=gaze_pitch_R,
         name_x="yaw_R",
@@ -186,7 +192,6 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     """plot 3D position over time"""
     pos3D = data["EgoVariables"]["VehicleLoc"]
-    plot_vector_vs_time(pos3D, t, "EgoPos XYZ", vlines=vlines)
 
     if vlines is not None:  # if you want to zoom in to a particular point in time
         zoom_pt = vlines[0]  # TODO: generalize for all vlines
@@ -208,7 +213,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         omit_front_valid: int = omit_front
         omit_rear_valid: int = omit_rear
 
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         pos3D, 
         t, 
         "EgoPos XYZ", 
@@ -217,7 +223,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     rot3D = data["EgoVariables"]["VehicleRot"]
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         rot3D,
         t,
         "EgoRot PYR",
@@ -226,7 +233,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         vlines=vlines,
     )
 
-    plot_3Dt(
+    plots.submit(
+        plot_3Dt,
         xyz=pos3D,
         t=t,
         title="Vehicle position over time",
@@ -238,7 +246,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     if "CustomActor" in data:
         for name in data["CustomActor"].keys():
             CA_data: dict = data["CustomActor"][name]
-            plot_3Dt(
+            plots.submit(
+                plot_3Dt,
                 xyz=CA_data["Location"],
                 t=CA_data["t"],
                 title=f"CA {name} position",
@@ -248,7 +257,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     """plot pupil position"""
     pupil_pos_L = eye["LEFTPupilPosition"]
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         pupil_pos_L,
         t,
         "Left pupil position",
@@ -257,7 +267,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         norm=True,
         vlines=vlines,
     )
-    plot_histogram2d(
+    plots.submit(
+        plot_histogram2d,
         data_x=pupil_pos_L[all_valid_idxs][:, 0],
         data_y=pupil_pos_L[all_valid_idxs][:, 1],
         name_x="LPupilX",
@@ -266,7 +277,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     pupil_pos_R = eye["RIGHTPupilPosition"]
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         pupil_pos_R,
         t,
         "Right pupil position",
@@ -275,7 +287,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         norm=True,
         vlines=vlines,
     )
-    plot_histogram2d(
+    plots.submit(
+        plot_histogram2d,
         data_x=pupil_pos_R[all_valid_idxs][:, 0],
         data_y=pupil_pos_R[all_valid_idxs][:, 1],
         name_x="RPupilX",
@@ -284,7 +297,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     """plot eye vars"""
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=eye["LEFTEyeOpenness"],
@@ -297,7 +311,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         lines=True,
     )
 
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=eye["RIGHTEyeOpenness"],
@@ -320,7 +335,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     cmps2mph = 0.0223694  # cm/s to mph
     cmps2mph = 0.036  # cm/s to km/h 杨沈改
     speed = np.linalg.norm(ego_velocity, axis=1)  # velocity (3D) to speed (1D)
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t[1:],
         name_x="Time",
         data_y=cmps2mph * speed,
@@ -334,7 +350,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     ego_accel = (np.diff(ego_velocity, axis=0).T / delta_ts[1:]).T
     assert ego_accel.shape == (n - 1, 3)
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t[2:],
         name_x="Time",
         data_y=np.linalg.norm(ego_accel, axis=1),  # accel (3D) to speed (1D)
@@ -345,11 +362,12 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         lines=True,
         # omit=(omit_front, omit_rear),
     )
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t[2:],
         name_x="Time",
-        data_y=smooth_arr(
-            np.linalg.norm(ego_accel, axis=1), kernel_size=20
+        data_y=moving_average(
+            np.linalg.norm(ego_accel, axis=1), 20
         ),  # accel (3D) to speed (1D)
         name_y="Smooth Ego Accel",
         units_y="cm/s^2",
@@ -368,7 +386,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     # neg_roll_idxs = np.squeeze(np.where(np.diff(rot3D[:, 1], axis=0) < -359))
     # angular_disp[neg_roll_idxs][:, 1] = 360 + angular_disp[neg_roll_idxs][:, 1]
     angular_vel = (angular_disp.T / delta_ts).T
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         angular_vel,
         t[1:],
         "Delta EgoRot PYR",
@@ -380,7 +399,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     # TODO: keep track of vehicles in the scene and track their positions (interpolated) over time
 
     """steering over time"""
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=data["UserInputs"]["Steering"],
@@ -394,20 +414,23 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
 
     """velocity over time"""
 
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         ego_velocity,
         t[1:],
         "EgoVel XYZ",
         # omit=(omit_front, omit_rear),
         vlines=vlines,
     )
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         ego_accel, t[2:], 
         "EgoAccel XYZ", 
         # omit=(omit_front, omit_rear), 
         vlines=vlines,
     )
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EgoVariables"]["VehicleRot"],
         t,
         "EgoRot XYZ",
@@ -416,7 +439,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     """Stored velocity over time"""
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=data["EgoVariables"]["VehicleVel"],
@@ -428,7 +452,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         # omit=(omit_front, omit_rear),
     )
 
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=data["UserInputs"]["Throttle"],
@@ -439,7 +464,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         # omit=(omit_front, omit_rear),
     )
 
-    plot_versus(
+    plots.submit(
+        plot_versus,
         data_x=t,
         name_x="Time",
         data_y=data["UserInputs"]["Brake"],
@@ -451,14 +477,16 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     """plot relative camera things"""
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EgoVariables"]["CameraLoc"],
         t,
         "CameraLoc",
         # omit=(omit_front, omit_rear),
         vlines=vlines,
     )
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EgoVariables"]["CameraRot"],
         t,
         "CameraRot",
@@ -467,7 +495,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     """plot gaze things"""
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EyeTracker"]["COMBINEDGazeDir"],
         t,
         "CombinedGaze",
@@ -476,7 +505,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         norm=True,
         vlines=vlines,
     )
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EyeTracker"]["LEFTGazeDir"],
         t,
         "LeftGaze",
@@ -485,7 +515,8 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
         # omit=(omit_front_valid, omit_rear_valid),
         vlines=vlines,
     )
-    plot_vector_vs_time(
+    plots.submit(
+        plot_vector_vs_time,
         data["EyeTracker"]["RIGHTGazeDir"],
         t,
         "RightGaze",
@@ -496,40 +527,35 @@ def main(vr_dir: str, traj_dir:str, results_dir: str, json_name:str, vr_data_nam
     )
 
     """plot actor things"""
+    # ego<->actor table (T x actors) on the ego time base, computed once for all actors
+    kin = relative_kinematics(data, actor_tracks(data, exclude_ego=False, t=t))
+    actor_idx = {Id: a for a, Id in enumerate(kin["ids"].tolist())}
     np.random.seed(2)
     for _ in range(10):  # plot 10 random actors
         Id: int = np.random.choice(np.array(list(data["Actors"].keys())))
         actor_data = data["Actors"][Id]
 
-        def get_non_zero_idxs(arr: np.ndarray) -> np.ndarray:
-            return np.array([i for i in range(len(arr)) ]) # 杨沈改
-            # return np.array([i for i in range(len(arr)) if (arr[i] != 0).all()])
-
-        non_zeros = get_non_zero_idxs(actor_data["Location"])
-        pos3D = actor_data["Location"][non_zeros]
-        _t = actor_data["Time"][non_zeros]
-        plot_3Dt(
+        pos3D = actor_data["Location"]
+        _t = actor_data["Time"]
+        plots.submit(
+            plot_3Dt,
             xyz=pos3D,
             t=_t,
             title=f"Actor id {Id} position over time",
             interactive=False,  # set to True to move it around
         )
 
-        # plot the distance to this actor (need to match their timestamps)
-        haz_t = actor_data["Time"] / 1000  # to get in seconds
-        t = t  # should be a superset of haz_t (contain everything + more)
-        idxs = np.searchsorted(t, haz_t)  # find  where hazard's t is in world t
-        new_t = t[idxs]
-
-        ego_xyz = data["EgoVariables"]["VehicleLoc"][idxs]
-        haz_xyz = actor_data["Location"]
-
-        assert ego_xyz.shape == haz_xyz.shape
-        assert len(ego_xyz) == len(new_t)
-        dist = np.linalg.norm(ego_xyz - haz_xyz, axis=1) / 100
+        # plot the distance to this actor
+        if Id not in actor_idx:
+            continue
+        present = kin["present"][:, actor_idx[Id]]
+        if not present.any():  # no sample inside the ego time base
+            continue
+        dist = kin["distance"][present, actor_idx[Id]]
         print(f"Minimum distance: {np.min(dist):.2f}m")
-        plot_versus(
-            data_x=new_t,
+        plots.submit(
+            plot_versus,
+            data_x=t[present],
             name_x="Time",
             data_y=dist,
             name_y=f"Distance to actor {Id}",
@@ -578,6 +604,23 @@ if __name__ == "__main__":
         type=str,
         help="path of the results folder",
     )
+    argparser.add_argument(
+        "--align-all",
+        action="store_true",
+        help="also store all vehicles resampled onto the ego time base",
+    )
+    argparser.add_argument(
+        "--clock-correction",
+        action="store_true",
+        help="map trajectory timestamps through the fitted clock model before matching",
+    )
+    argparser.add_argument(
+        "--plot-workers",
+        type=int,
+        default=None,
+        help="number of plot rendering processes (0 renders serially)",
+    )
     args = argparser.parse_args()
 
-    main(args.file, args.traj,args.out, args.json, args.vr)
+    main(args.file, args.traj,args.out, args.json, args.vr, align_all=args.align_all,
+         plot_workers=args.plot_workers, clock_correction=args.clock_correction)
@@ -0,0 +1,262 @@
+"""
+dataset_query.py - Parameter-indexed queries over the sharded dataset store
+
+Selecting trials by their experimental parameters normally means loading the
+whole dataset and comparing exp_info['param'] of every trial. This module
+answers such queries from two small indexes instead:
+
+1. ParameterIndex: built from config_loader.Constants, maps
+   exp_type -> parameter name -> value -> set of scenario indices
+2. The store index (see dataset_store.py): maps
+   exp_type -> scenario index -> participant -> shard
+
+A query intersects scenario index sets and filters participants, and resolves
+to ShardHandle objects. No trial payload is read until handle.load() is called.
+
+Usage:
+    from dataset_query import DatasetQuery
+
+    query = DatasetQuery('data_store')
+    handles = query.select(exp_type='discretionary', cav_time_gap=0.6,
+                           cav_max_speed=108, participants=['1', '2'])
+    for handle in handles:
+        trial = handle.load()
+
+    # Several allowed values of one parameter
+    handles = query.select(cav_time_gap=[0.6, 0.9])
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+from config_loader import Constants, get_default_constants
+from dataset_store import load_index
+
+
+# ============================================================================
+# PARAMETER INDEX
+# ============================================================================
+
+def _as_value_set(value) -> list:
+    """Treat a scalar as a single allowed value and an iterable as several."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+class ParameterIndex:
+    """
+    Inverted index of the factorial design of a scenario.
+
+    Attributes:
+        constants: Constants object the index was built from
+        index: exp_type -> parameter name -> value -> set of scenario indices
+    """
+
+    def __init__(self, constants: Optional[Constants] = None):
+        """
+        Build the index from the scenario parameter combinations.
+
+        Args:
+            constants: Constants object with scenario parameters (default scenario if None)
+        """
+        if constants is None:
+            constants = get_default_constants()
+        self.constants = constants
+        self.index = {}
+        for exp_type, param_names in constants.param_dict.items():
+            by_name = {name: {} for name in param_names}
+            for scenario_idx, values in enumerate(constants.get_params(exp_type)):
+                for name, value in zip(param_names, values):
+                    by_name[name].setdefault(value, set()).add(scenario_idx)
+            self.index[exp_type] = by_name
+
+    def exp_types(self) -> List[str]:
+        """Experiment types known to the index."""
+        return list(self.index)
+
+    def values(self, exp_type: str, param_name: str) -> list:
+        """Sorted distinct values of one parameter."""
+        return sorted(self.index[exp_type][param_name])
+
+    def scenarios(self, exp_type: str, **params) -> Set[int]:
+        """
+        Scenario indices of one experiment type matching all given parameters.
+
+        Args:
+            exp_type: Either 'discretionary' or 'mandatory'
+            **params: Parameter name -> value, or list of allowed values
+
+        Returns:
+            Set of matching scenario indices
+
+        Raises:
+            KeyError: If a parameter name is not defined for exp_type
+        """
+        by_name = self.index[exp_type]
+        matched = set(range(len(self.constants.get_params(exp_type))))
+        for name, value in params.items():
+            if name not in by_name:
+                raise KeyError(f"Unknown parameter for {exp_type}: {name}")
+            allowed = set()
+            for v in _as_value_set(value):
+                allowed |= by_name[name].get(v, set())
+            matched &= allowed
+        return matched
+
+
+# ============================================================================
+# SHARD HANDLES
+# ============================================================================
+
+class ShardHandle:
+    """
+    Reference to one trial in the store; loads the trial on demand.
+
+    Attributes:
+        exp_type: Experiment type
+        scenario_idx: Scenario index
+        participant: Participant ID
+        params: Parameter name -> value of the scenario
+        path: Absolute path of the shard file
+    """
+
+    def __init__(
+        self,
+        exp_type: str,
+        scenario_idx: int,
+        participant: str,
+        params: Dict[str, object],
+        path: str
+    ):
+        self.exp_type = exp_type
+        self.scenario_idx = scenario_idx
+        self.participant = participant
+        self.params = params
+        self.path = path
+
+    def load(self) -> dict:
+        """Read the trial data of this shard."""
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def __repr__(self) -> str:
+        return (
+            f"ShardHandle({self.exp_type}, scenario={self.scenario_idx}, "
+            f"participant={self.participant})"
+        )
+
+
+# ============================================================================
+# QUERY API
+# ============================================================================
+
+class DatasetQuery:
+    """
+    Query interface combining the parameter index with a store index.
+
+    Attributes:
+        store_dir: Store directory
+        params: ParameterIndex of the scenario
+        shards: exp_type -> scenario index -> participant -> shard entry
+        by_participant: participant -> set of (exp_type, scenario index)
+    """
+
+    def __init__(self, store_dir: str, constants: Optional[Constants] = None):
+        """
+        Open a store for querying.
+
+        Args:
+            store_dir: Directory written by dataset_store.write_store
+            constants: Constants object with scenario parameters (default scenario if None)
+
+        Raises:
+            FileNotFoundError: If the directory contains no valid index
+        """
+        index = load_index(store_dir)
+        if index is None:
+            raise FileNotFoundError(f"No dataset store index found in: {store_dir}")
+        self.store_dir = store_dir
+        self.params = ParameterIndex(constants)
+        self.shards = {
+            exp_type: {int(idx): entries for idx, entries in scenarios.items()}
+            for exp_type, scenarios in index['shards'].items()
+        }
+        self.by_participant = {}
+        for exp_type, scenarios in self.shards.items():
+            for scenario_idx, entries in scenarios.items():
+                for participant in entries:
+                    self.by_participant.setdefault(participant, set()).add(
+                        (exp_type, scenario_idx)
+                    )
+
+    def participants(self) -> List[str]:
+        """All participant IDs in the store, sorted numerically."""
+        return sorted(self.by_participant, key=int)
+
+    def select(
+        self,
+        exp_type: Optional[str] = None,
+        participants: Optional[Iterable] = None,
+        **params
+    ) -> List[ShardHandle]:
+        """
+        Find the trials matching an experiment type, participants and parameters.
+
+        Args:
+            exp_type: Restrict to 'discretionary' or 'mandatory' (default: both;
+                experiment types lacking a queried parameter are skipped)
+            participants: Restrict to these participant IDs (str or int)
+            **params: Parameter name -> value, or list of allowed values
+
+        Returns:
+            Handles sorted by experiment type, scenario index and participant
+
+        Raises:
+            KeyError: If a parameter name is not defined for any queried
+                experiment type
+        """
+        exp_types = [exp_type] if exp_type is not None else self.params.exp_types()
+        if exp_type is None:
+            exp_types = [
+                t for t in exp_types
+                if all(name in self.params.index[t] for name in params)
+            ]
+            if not exp_types:
+                raise KeyError(f"Unknown parameters: {sorted(params)}")
+        candidates = {
+            (t, scenario_idx)
+            for t in exp_types
+            for scenario_idx in self.params.scenarios(t, **params)
+        }
+        if participants is not None:
+            rows = [
+                (t, scenario_idx, participant)
+                for participant in {str(p) for p in participants}
+                for t, scenario_idx in self.by_participant.get(participant, set()) & candidates
+            ]
+        else:
+            rows = [
+                (t, scenario_idx, participant)
+                for t, scenario_idx in candidates
+                for participant in self.shards.get(t, {}).get(scenario_idx, {})
+            ]
+        rows.sort(key=lambda r: (exp_types.index(r[0]), r[1], int(r[2])))
+
+        handles = []
+        for t, scenario_idx, participant in rows:
+            param_names = self.params.constants.get_param_names(t)
+            param_values = self.params.constants.get_params(t)[scenario_idx]
+            handles.append(ShardHandle(
+                t, scenario_idx, participant,
+                dict(zip(param_names, param_values)),
+                os.path.abspath(os.path.join(
+                    self.store_dir, self.shards[t][scenario_idx][participant]['path']
+                ))
+            ))
+        return handles
+
+    def count(self, **query) -> int:
+        """Number of trials matching a select() query."""
+        return len(self.select(**query))
@@ -0,0 +1,302 @@
+"""
+dataset_store.py - Sharded, indexed storage of the aggregated dataset
+
+Instead of one monolithic data_all.json, the store keeps one compact JSON
+shard per (exp_type, scenario_idx, participant) plus a small index file:
+
+    store/
+    ├── index.json
+    ├── discretionary/
+    │   ├── 0/
+    │   │   ├── 1.json
+    │   │   └── 2.json
+    │   └── ...
+    └── mandatory/
+        └── ...
+
+ShardedDataset reads only the index on construction and offers the same
+dataset[exp_type][scenario_idx][participant] access pattern as data_all.json,
+loading each shard lazily on first access. Opening the store and reading one
+trial therefore costs the same regardless of corpus size.
+
+Usage:
+    from dataset_store import write_store, ShardedDataset
+
+    write_store('lc_data_all', 'data_store')
+
+    dataset = ShardedDataset('data_store')
+    trial = dataset['discretionary'][0]['12']
+    print(trial['vr_id'])
+
+Index Structure (index.json):
+    {
+        "version": 1,
+        "scenario_name": "HDV Cuts into a CAV Platoon",
+        "shards": {
+            "discretionary": {
+                "0": {
+                    "12": {
+                        "path": "discretionary/0/12.json",
+                        "param_name": "[72, 0.6, 64.8, 7]",
+                        "source": "/abs/path/lc_data_all/12/traj_data/...json",
+                        "fingerprint": "123456-1700000000000000000"
+                    },
+                    ...
+                },
+                ...
+            },
+            "mandatory": {...}
+        }
+    }
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+from config_loader import Constants, get_default_constants
+from intergrate_all import find_all_person_data, find_trial_files, parse_trial_file_name
+from job_scheduler import file_fingerprint
+
+
+STORE_VERSION = 1
+INDEX_FILE = 'index.json'
+
+
+# ============================================================================
+# WRITING
+# ============================================================================
+
+def shard_relpath(exp_type: str, scenario_idx: int, participant: str) -> str:
+    """Path of a shard relative to the store directory."""
+    return os.path.join(exp_type, str(scenario_idx), f"{participant}.json")
+
+
+def load_index(store_dir: str) -> Optional[dict]:
+    """Load the index of a store, or None if it does not exist."""
+    index_file = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(index_file):
+        return None
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    if index.get('version') != STORE_VERSION:
+        return None
+    return index
+
+
+def write_shard(json_file: str, shard_file: str) -> None:
+    """Write one integrated trial as a compact shard (atomically replaced)."""
+    with open(json_file, 'r') as f:
+        trial = json.load(f)
+    os.makedirs(os.path.dirname(shard_file), exist_ok=True)
+    tmp_file = f"{shard_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(trial, f, separators=(',', ':'))
+    os.replace(tmp_file, shard_file)
+
+
+def write_store(
+    data_dir: str,
+    store_dir: str,
+    constants: Optional[Constants] = None,
+    max_participants: Optional[int] = None
+) -> dict:
+    """
+    Build or update a sharded store from the processed participant data.
+
+    Trials are placed by their file names (see parse_trial_file_name) and
+    rewritten as compact JSON (no indentation); shards whose source
+    fingerprint is unchanged since the last run are not written again, and
+    shards whose source disappeared are removed.
+
+    Args:
+        data_dir: Directory containing processed participant data
+        store_dir: Output directory of the store
+        constants: Constants object with scenario parameters (default scenario if None)
+        max_participants: Limit number of participants to process (for testing)
+
+    Returns:
+        The written index dictionary
+    """
+    if constants is None:
+        constants = get_default_constants()
+    os.makedirs(store_dir, exist_ok=True)
+    previous = load_index(store_dir) or {'shards': {}}
+
+    shards = {
+        exp_type: {str(i): {} for i in range(len(constants.get_params(exp_type)))}
+        for exp_type in constants.param_dict
+    }
+    written, unchanged = 0, 0
+    person_dirs = find_all_person_data(data_dir)
+    if max_participants is not None:
+        person_dirs = person_dirs[:max_participants]
+    for person_dir in person_dirs:
+        participant_id = os.path.basename(os.path.dirname(person_dir))
+        for json_file in find_trial_files(person_dir):
+            exp_type, scenario_idx = parse_trial_file_name(json_file, constants)
+            relpath = shard_relpath(exp_type, scenario_idx, participant_id)
+            entry = {
+                'path': relpath,
+                'param_name': str(constants.get_params(exp_type)[scenario_idx]),
+                'source': os.path.abspath(json_file),
+                'fingerprint': file_fingerprint(json_file),
+            }
+            old_entry = previous['shards'].get(exp_type, {}).get(
+                str(scenario_idx), {}).get(participant_id)
+            shard_file = os.path.join(store_dir, relpath)
+            if old_entry == entry and os.path.exists(shard_file):
+                unchanged += 1
+            else:
+                write_shard(json_file, shard_file)
+                written += 1
+            shards[exp_type][str(scenario_idx)][participant_id] = entry
+
+    # Drop shards whose trial no longer exists
+    removed = 0
+    for exp_type, scenarios in previous['shards'].items():
+        for scenario_idx, participants in scenarios.items():
+            for participant_id, entry in participants.items():
+                if participant_id not in shards.get(exp_type, {}).get(scenario_idx, {}):
+                    shard_file = os.path.join(store_dir, entry['path'])
+                    if os.path.exists(shard_file):
+                        os.remove(shard_file)
+                    removed += 1
+
+    index = {
+        'version': STORE_VERSION,
+        'scenario_name': constants.scenario_name,
+        'shards': shards,
+    }
+    tmp_file = os.path.join(store_dir, f"{INDEX_FILE}.tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp_file, os.path.join(store_dir, INDEX_FILE))
+    print(f"Store written to: {store_dir} "
+          f"({written} shards written, {unchanged} unchanged, {removed} removed)")
+    return index
+
+
+# ============================================================================
+# LAZY LOADING
+# ============================================================================
+
+class ScenarioShards(Mapping):
+    """
+    Participants of one (exp_type, scenario_idx), loaded on first access.
+
+    Behaves like the {participant: trial_data} dict of data_all.json.
+    """
+
+    def __init__(self, store_dir: str, entries: Dict[str, dict]):
+        self.store_dir = store_dir
+        self.entries = entries
+        self._loaded = {}
+
+    def __getitem__(self, participant) -> dict:
+        participant = str(participant)
+        if participant not in self._loaded:
+            entry = self.entries[participant]
+            with open(os.path.join(self.store_dir, entry['path']), 'r') as f:
+                self._loaded[participant] = json.load(f)
+        return self._loaded[participant]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, participant) -> bool:
+        return str(participant) in self.entries
+
+    def clear_cache(self) -> None:
+        """Forget loaded shards so their memory can be reclaimed."""
+        self._loaded.clear()
+
+
+class ExpTypeShards(Mapping):
+    """Scenarios of one experiment type, keyed by integer scenario index."""
+
+    def __init__(self, store_dir: str, scenarios: Dict[str, Dict[str, dict]]):
+        self.scenarios = {
+            int(idx): ScenarioShards(store_dir, entries)
+            for idx, entries in scenarios.items()
+        }
+
+    def __getitem__(self, scenario_idx) -> ScenarioShards:
+        return self.scenarios[int(scenario_idx)]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.scenarios)
+
+    def __len__(self) -> int:
+        return len(self.scenarios)
+
+    def __contains__(self, scenario_idx) -> bool:
+        try:
+            return int(scenario_idx) in self.scenarios
+        except (TypeError, ValueError):
+            return False
+
+
+class ShardedDataset(Mapping):
+    """
+    Read-only view of a sharded store with lazy shard loading.
+
+    Only index.json is read on construction. Scenario indices may be given
+    as int or str, participant IDs as str or int.
+
+    Attributes:
+        store_dir: Store directory
+        index: Parsed index file
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        Open a store.
+
+        Args:
+            store_dir: Directory written by write_store
+
+        Raises:
+            FileNotFoundError: If the directory contains no valid index
+        """
+        self.store_dir = store_dir
+        self.index = load_index(store_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No dataset store index found in: {store_dir}")
+        self.exp_types = {
+            exp_type: ExpTypeShards(store_dir, scenarios)
+            for exp_type, scenarios in self.index['shards'].items()
+        }
+
+    def __getitem__(self, exp_type: str) -> ExpTypeShards:
+        return self.exp_types[exp_type]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.exp_types)
+
+    def __len__(self) -> int:
+        return len(self.exp_types)
+
+    def num_trials(self) -> int:
+        """Total number of trials in the store."""
+        return sum(
+            len(participants)
+            for scenarios in self.exp_types.values()
+            for participants in scenarios.values()
+        )
+
+    def clear_cache(self) -> None:
+        """Forget all loaded shards."""
+        for scenarios in self.exp_types.values():
+            for participants in scenarios.values():
+                participants.clear_cache()
+
+    def __repr__(self) -> str:
+        return (
+            f"ShardedDataset(store_dir='{self.store_dir}', "
+            f"trials={self.num_trials()})"
+        )
@@ -14,7 +14,6 @@ from src.visualizer import *
 
 import numpy as np
 import argparse
-import pandas as pd
 import json
 import os
 
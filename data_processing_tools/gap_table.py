@@ -0,0 +1,312 @@
+"""
+gap_table.py - Gap acceptance table for all processed trials
+
+For every integrated trial, finds the gaps between consecutive vehicles of the
+target lane (the CAV platoon) that the VR ego drove alongside, and labels them
+'accepted' (the gap next to the ego when it crossed into the lane), 'rejected'
+(alongside for at least --min-offer seconds) or 'passed'. Per frame the gap
+next to the ego is described by its front/rear gap length, time gap and the
+speeds of its leader and follower relative to the ego (src/gap_acceptance.py,
+all frames in one vectorised pass on the aligned all-vehicle tensor). Trials
+are processed in parallel worker processes.
+
+The target lane is the lane the ego changed into (first complete lane change,
+see lane_change_events.py); in trials without a lane change it is the
+neighbouring lane with the most traffic.
+
+Usage:
+    # All participants, default output <data-dir>/gap_acceptance.csv
+    python gap_table.py --data-dir ../lc_data_all
+
+    # Also write the per-frame gap table of every trial
+    python gap_table.py --data-dir ../lc_data_all --frames-dir ../lc_data_all/gaps
+
+    from gap_table import trial_gaps
+
+    rows, frames = trial_gaps('lc_data_all/1/traj_data/mandatory_[72, 0.6, 7].json')
+
+Columns:
+    participant, exp_type, scenario_idx, param_name, label, lead_id, follow_id
+    (empty for an open gap), t_start, t_end, duration [s], gap_length [m] and
+    time_gap [s] when the ego came alongside, min_gap_length, min_time_gap,
+    mean_lead_rel_speed, mean_follow_rel_speed [m/s], target_lane, t_cross [s]
+    (of the lane change, empty without one), output_file
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from intergrate_all import find_all_person_data, find_trial_files, read_json
+from lane_change_events import ego_lane_changes, trial_info, trial_road_frame
+from src.gap_acceptance import adjacent_gaps, gap_episodes
+from src.lanes import LaneGeometry
+
+
+GAPS_FILE = 'gap_acceptance.csv'
+
+GAP_COLUMNS = [
+    'participant', 'exp_type', 'scenario_idx', 'param_name', 'label',
+    'lead_id', 'follow_id', 't_start', 't_end', 'duration', 'gap_length',
+    'time_gap', 'min_gap_length', 'min_time_gap', 'mean_lead_rel_speed',
+    'mean_follow_rel_speed', 'target_lane', 't_cross', 'output_file',
+]
+
+FRAME_COLUMNS = [
+    't', 'ego_lane', 'lead_id', 'follow_id', 'front_gap', 'rear_gap', 'gap_length',
+    'time_gap', 'front_time_gap', 'rear_time_gap', 'lead_rel_speed', 'follow_rel_speed',
+]
+
+
+# ============================================================================
+# SINGLE TRIAL
+# ============================================================================
+
+def _optional(value) -> Optional[float]:
+    """Float for the CSV, None (empty cell) for NaN."""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def trial_gaps(
+    output_file: str,
+    geometry: Optional[LaneGeometry] = None,
+    hysteresis: float = 0.3,
+    min_offer: float = 0.5,
+    **detector_kwargs
+) -> tuple:
+    """
+    Extract the offered gaps of one integrated trial.
+
+    Args:
+        output_file: Path of the integrated trial JSON
+        geometry: Road geometry (default: the scenario config's
+            'lane_geometry', else fitted to the trial)
+        hysteresis: Lane assignment hysteresis in metres (see LaneGeometry.assign)
+        min_offer: Minimum time in seconds alongside a gap for it to count as
+            rejected rather than passed
+        **detector_kwargs: Thresholds passed to detect_lane_changes
+
+    Returns:
+        Tuple (rows, frames): one row per offered gap with the columns of
+        GAP_COLUMNS, and the per-frame gap table as a dictionary of arrays
+        with the keys of FRAME_COLUMNS
+    """
+    data = read_json(output_file)
+    road = trial_road_frame(data, geometry, hysteresis)
+    events = ego_lane_changes(road, **detector_kwargs)
+    aligned = road['aligned']
+    t, s, lane = road['t'], road['s'], road['lane']
+    ego_lane = lane[0]
+
+    # Target lane: the lane of the first completed lane change, else the busiest
+    # neighbouring lane of the ego's starting lane
+    complete = np.nonzero(events['kind'] == 'complete')[0]
+    if len(complete):
+        first = complete[0]
+        target_lane = int(events['to_lane'][first])
+        direction = int(events['direction'][first])
+        i_cross = int(events['i_cross'][first])
+        t_cross = float(events['t_cross'][first])
+    else:
+        start = int(ego_lane[ego_lane >= 0][0]) if (ego_lane >= 0).any() else 0
+        counts = [np.sum(lane[1:] == start + d) for d in (-1, 1)]
+        direction = 1 if counts[1] >= counts[0] else -1
+        target_lane = start + direction
+        i_cross = None
+        t_cross = np.nan
+
+    # Speed along the road
+    if 'velocity_0' in aligned['features']:
+        col = aligned['features'].index('velocity_0')
+        velocity = aligned['data'][..., col:col + 2]
+        speed = velocity @ road['geometry'].direction
+    else:
+        speed = np.gradient(s, t, axis=1) if len(t) > 1 else np.zeros_like(s)
+
+    gaps = adjacent_gaps(
+        s[1:], road['lateral'][1:], lane[1:], speed[1:], aligned['mask'][1:],
+        s[0], speed[0], target_lane
+    )
+    offered = ego_lane == target_lane - direction
+    episodes = gap_episodes(gaps, t, offered, i_cross, min_offer)
+
+    other_ids = np.array(aligned['veh_ids'][1:] + [None], dtype=object)  # index -1 -> None
+    info = trial_info(output_file, data)
+    rows = []
+    for k in range(len(episodes['label'])):
+        rows.append({
+            **info,
+            'label': episodes['label'][k],
+            'lead_id': other_ids[episodes['lead'][k]],
+            'follow_id': other_ids[episodes['follow'][k]],
+            't_start': float(episodes['t_start'][k]),
+            't_end': float(episodes['t_end'][k]),
+            'duration': float(episodes['duration'][k]),
+            'gap_length': _optional(episodes['gap_length'][k]),
+            'time_gap': _optional(episodes['time_gap'][k]),
+            'min_gap_length': _optional(episodes['min_gap_length'][k]),
+            'min_time_gap': _optional(episodes['min_time_gap'][k]),
+            'mean_lead_rel_speed': _optional(episodes['mean_lead_rel_speed'][k]),
+            'mean_follow_rel_speed': _optional(episodes['mean_follow_rel_speed'][k]),
+            'target_lane': target_lane,
+            't_cross': _optional(t_cross),
+            'output_file': os.path.abspath(output_file),
+        })
+
+    frames = {
+        't': t,
+        'ego_lane': ego_lane,
+        'lead_id': other_ids[gaps['lead']],
+        'follow_id': other_ids[gaps['follow']],
+    }
+    frames.update({k: gaps[k] for k in FRAME_COLUMNS if k in gaps and k not in frames})
+    return rows, frames
+
+
+def write_frame_table(frames: Dict[str, np.ndarray], csv_file: str) -> None:
+    """Write the per-frame gap table of one trial (see trial_gaps) to a CSV file."""
+    os.makedirs(os.path.dirname(os.path.abspath(csv_file)), exist_ok=True)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FRAME_COLUMNS)
+        columns = [frames[k] for k in FRAME_COLUMNS]
+        for values in zip(*columns):
+            writer.writerow(['' if v is None or (isinstance(v, float) and np.isnan(v)) else v
+                             for v in values])
+
+
+def frame_table_path(frames_dir: str, output_file: str) -> str:
+    """<frames_dir>/<participant>/<trial>.csv for an integrated trial file."""
+    participant = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(output_file))))
+    name = os.path.splitext(os.path.basename(output_file))[0]
+    return os.path.join(frames_dir, participant, f"{name}.csv")
+
+
+def _trial_job(args: tuple) -> tuple:
+    """Worker entry point: (output_file, rows, error message or None)."""
+    output_file, frames_dir, kwargs = args
+    try:
+        rows, frames = trial_gaps(output_file, **kwargs)
+        if frames_dir is not None:
+            write_frame_table(frames, frame_table_path(frames_dir, output_file))
+        return output_file, rows, None
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        return output_file, [], f"{type(e).__name__}: {e}"
+
+
+# ============================================================================
+# CORPUS
+# ============================================================================
+
+def build_gap_table(
+    data_dir: str,
+    workers: Optional[int] = None,
+    frames_dir: Optional[str] = None,
+    **kwargs
+) -> List[Dict[str, object]]:
+    """
+    Extract the offered gaps of every processed trial, in parallel.
+
+    Args:
+        data_dir: Directory containing processed participant data
+        workers: Number of worker processes (default: os.cpu_count());
+            1 runs every trial in the calling process
+        frames_dir: If given, the per-frame table of every trial is written
+            below this directory (see frame_table_path)
+        **kwargs: Passed to trial_gaps
+
+    Returns:
+        Gap rows of all trials, in participant and trial order
+    """
+    jobs = [
+        (output_file, frames_dir, kwargs)
+        for person_dir in find_all_person_data(data_dir)
+        for output_file in find_trial_files(person_dir)
+    ]
+    if workers == 1:
+        results = [_trial_job(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_trial_job, jobs, chunksize=chunksize))
+
+    rows = []
+    for output_file, trial_rows, error in results:
+        if error is not None:
+            print(f"WARNING: could not process {output_file}: {error}")
+        rows.extend(trial_rows)
+    return rows
+
+
+def write_gaps(rows: List[Dict[str, object]], csv_file: str) -> None:
+    """Write gap rows to a CSV file with the columns of GAP_COLUMNS."""
+    os.makedirs(os.path.dirname(os.path.abspath(csv_file)), exist_ok=True)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=GAP_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Extract the accepted, rejected and passed gaps of all processed trials'
+    )
+    parser.add_argument(
+        '--data-dir', '-d',
+        type=str,
+        default=None,
+        help='Path to the processed data directory (default: ../lc_data_all)'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        type=str,
+        default=None,
+        help=f'Path of the CSV table (default: <data-dir>/{GAPS_FILE})'
+    )
+    parser.add_argument(
+        '--frames-dir',
+        type=str,
+        default=None,
+        help='Also write the per-frame gap table of every trial below this directory'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: CPU count, 1 = sequential)'
+    )
+    parser.add_argument(
+        '--min-offer',
+        type=float,
+        default=0.5,
+        help='Seconds alongside a gap for it to count as rejected rather than passed'
+    )
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lc_data_all'
+        )
+    output = args.output or os.path.join(data_dir, GAPS_FILE)
+    start_t = time.time()
+    rows = build_gap_table(
+        data_dir,
+        workers=args.workers,
+        frames_dir=args.frames_dir,
+        min_offer=args.min_offer,
+    )
+    write_gaps(rows, output)
+    n_accepted = sum(row['label'] == 'accepted' for row in rows)
+    print(f"{len(rows)} gaps ({n_accepted} accepted) "
+          f"in {time.time() - start_t:.2f}s -> {output}")
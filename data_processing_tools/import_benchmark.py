@@ -0,0 +1,204 @@
+"""
+import_benchmark.py - Track the import time of every command line entry point
+
+The pipeline starts a fresh interpreter per trial, so the time spent importing
+the entry point (and everything it pulls in) is paid hundreds of times. This
+script measures it with `python -X importtime`, reports the heaviest imports
+and can save the results to compare later runs against.
+
+Usage:
+    python import_benchmark.py                        # measure all entry points
+    python import_benchmark.py convert intergrate_all # measure some of them
+    python import_benchmark.py --save import_times.json
+    python import_benchmark.py --baseline import_times.json
+
+Results File Structure:
+    {
+        "python": "3.11.4",
+        "repeats": 5,
+        "modules": {
+            "convert": {
+                "total_ms": 85.2,
+                "top": [["numpy", 40.1], ["src.parser", 12.3], ...]
+            },
+            ...
+        }
+    }
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points of the pipeline (modules with a command line interface)
+CLI_MODULES = [
+    'log2txt',
+    'convert',
+    'example',
+    'single_exp_data_intergrate',
+    'all_person_data_intergrate',
+    'intergrate_all',
+    'build',
+    'dataset_store',
+    'trial_catalog',
+    'lane_change_events',
+    'gap_table',
+]
+
+
+# ============================================================================
+# MEASUREMENT FUNCTIONS
+# ============================================================================
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Parse the output of `python -X importtime`.
+
+    Args:
+        stderr: Captured standard error of the interpreter
+
+    Returns:
+        List of (module name with nesting indentation, self us, cumulative us)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entries.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure_module(module: str, top: int = 10) -> Dict[str, object]:
+    """
+    Import one module in a fresh interpreter and measure the import time.
+
+    Args:
+        module: Module name (importable from this folder)
+        top: Number of heaviest top-level dependencies to report
+
+    Returns:
+        Dictionary with 'total_ms' and 'top' [(module, cumulative ms), ...]
+
+    Raises:
+        RuntimeError: If the module fails to import
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=TOOLS_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    entries = parse_importtime(proc.stderr)
+    total_us = next(
+        (cumulative for name, _, cumulative in reversed(entries) if name == module), 0
+    )
+    # Direct children of the imported module are indented by two spaces
+    children = [
+        (name.strip(), cumulative) for name, _, cumulative in entries
+        if name.startswith('  ') and not name.startswith('   ')
+    ]
+    children.sort(key=lambda x: x[1], reverse=True)
+    return {
+        'total_ms': total_us / 1000,
+        'top': [[name, us / 1000] for name, us in children[:top]],
+    }
+
+
+def benchmark(modules: List[str], repeats: int = 5, top: int = 10) -> Dict[str, object]:
+    """
+    Measure every module several times and keep the fastest run.
+
+    The fastest run is the least disturbed by other activity on the machine.
+
+    Args:
+        modules: Module names to measure
+        repeats: Number of fresh interpreters per module
+        top: Number of heaviest dependencies to report
+
+    Returns:
+        Results dictionary (see module docstring)
+    """
+    results = {}
+    for module in modules:
+        runs = [measure_module(module, top) for _ in range(repeats)]
+        results[module] = min(runs, key=lambda r: r['total_ms'])
+    return {
+        'python': platform.python_version(),
+        'repeats': repeats,
+        'modules': results,
+    }
+
+
+def print_results(results: Dict[str, object], baseline: Optional[Dict[str, object]] = None) -> None:
+    """Print the import time of every module, optionally against a baseline."""
+    base_modules = baseline['modules'] if baseline is not None else {}
+    print(f"{'module':<30} {'import [ms]':>12} {'baseline':>10} {'change':>8}")
+    for module, result in results['modules'].items():
+        line = f"{module:<30} {result['total_ms']:12.1f}"
+        if module in base_modules:
+            before = base_modules[module]['total_ms']
+            change = 100 * (result['total_ms'] - before) / before if before else 0.0
+            line += f" {before:10.1f} {change:+7.0f}%"
+        print(line)
+        heaviest = ', '.join(f"{name} {ms:.1f}" for name, ms in result['top'][:3])
+        print(f"    heaviest: {heaviest}")
+
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the import time of the pipeline entry points'
+    )
+    parser.add_argument(
+        'modules',
+        nargs='*',
+        default=CLI_MODULES,
+        help='Modules to measure (default: all entry points)'
+    )
+    parser.add_argument(
+        '--repeats', '-r',
+        type=int,
+        default=5,
+        help='Number of fresh interpreters per module; the fastest run is kept'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='Number of heaviest dependencies stored per module'
+    )
+    parser.add_argument(
+        '--save',
+        type=str,
+        default=None,
+        help='Write the results to this JSON file'
+    )
+    parser.add_argument(
+        '--baseline',
+        type=str,
+        default=None,
+        help='Compare against results saved earlier with --save'
+    )
+    args = parser.parse_args()
+
+    results = benchmark(args.modules, args.repeats, args.top)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to: {args.save}")
@@ -7,8 +7,18 @@ into a single structured JSON file for analysis. The output organizes data by:
 2. Scenario parameter combination
 3. Participant ID
 
+The JSON file is written as a stream: trials are placed by their file names,
+then loaded, encoded and written one at a time, so peak memory is bounded by
+the largest trial rather than the whole corpus. The output is byte-identical
+to json.dump(data, indent=4) of the fully loaded dataset.
+
 Usage:
     python intergrate_all.py [--scenario SCENARIO_NAME] [--output OUTPUT_FILE]
+    python intergrate_all.py --format shards [--store-dir STORE_DIR]
+
+With --format shards the data is written as one shard per
+(exp_type, scenario_idx, participant) plus an index instead of a single file
+(see dataset_store.py).
 
 Output Structure:
     {
@@ -26,19 +36,27 @@ Output Structure:
 
 import os
 import json
+import time
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from config_loader import load_scenario_config, Constants
+from typing import Optional
+from config_loader import get_default_constants, Constants
+
 
-# Load default scenario configuration
-constants = Constants(load_scenario_config())
+def __getattr__(name: str):
+    # Default scenario configuration, loaded on first access
+    if name == 'constants':
+        return get_default_constants()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ============================================================================
 # DATA STRUCTURE FUNCTIONS
 # ============================================================================
 
-def create_data_format(constants: Constants = constants) -> dict:
+def create_data_format(constants: Optional[Constants] = None) -> dict:
     """
     Create the hierarchical data structure for storing all experiment data.
     
@@ -48,11 +66,13 @@ def create_data_format(constants: Constants = constants) -> dict:
     - Participant ID
     
     Args:
-        constants: Constants object with scenario parameters
+        constants: Constants object with scenario parameters (default scenario if None)
         
     Returns:
         Empty nested dictionary structure ready to be populated
     """
+    if constants is None:
+        constants = get_default_constants()
     data_final = {
         'discretionary': {},
         'mandatory': {}
@@ -92,6 +112,50 @@ def find_all_person_data(data_dir: str) -> list:
     return sorted(person_dirs, key=lambda x: int(os.path.basename(os.path.dirname(x))))
 
 
+def parse_trial_file_name(json_file: str, constants: Optional[Constants] = None) -> tuple:
+    """
+    Get the experiment type and scenario index of a trial from its file name.
+    
+    Integrated trial files are named like the trajectory files they come from,
+    '{exp_type}_[param1, param2, ...].json', so a trial can be placed in the
+    dataset structure without loading it.
+    
+    Args:
+        json_file: Path to an integrated trial JSON file
+        constants: Constants object with scenario parameters (default scenario if None)
+        
+    Returns:
+        Tuple (exp_type, scenario_idx)
+        
+    Raises:
+        KeyError: If the experiment type or parameter combination is unknown
+    """
+    if constants is None:
+        constants = get_default_constants()
+    file_name = os.path.basename(json_file)
+    exp_type = file_name.split('_')[0]
+    param_name = file_name.split('_')[-1][:-len('.json')]
+    scenario_idx = constants.get_param_dict(exp_type)[param_name]
+    return exp_type, scenario_idx
+
+
+def find_trial_files(person_dir: str) -> list:
+    """
+    List the integrated trial JSON files of one participant.
+    
+    Args:
+        person_dir: Path to a participant's 'traj_data' directory
+        
+    Returns:
+        Sorted list of trial JSON file paths
+    """
+    return sorted(
+        os.path.join(person_dir, f)
+        for f in os.listdir(person_dir)
+        if f.endswith('.json')
+    )
+
+
 # ============================================================================
 # FILE I/O FUNCTIONS
 # ============================================================================
@@ -103,6 +167,77 @@ def read_json(json_file: str) -> dict:
     return data
 
 
+def load_trial(json_file: str) -> tuple:
+    """Load one trial file and measure how long it took."""
+    start_t = time.perf_counter()
+    data = read_json(json_file)
+    return data, time.perf_counter() - start_t
+
+
+def iter_trials(
+    json_files: list,
+    workers: int = None,
+    max_in_flight: int = None,
+    use_processes: bool = False
+):
+    """
+    Load trial files concurrently, yielding them in the given order.
+    
+    Reading and decoding of the next files overlaps with the consumer's work
+    on the current one. At most max_in_flight files are loaded ahead, which
+    bounds the extra memory to that many trials.
+    
+    Args:
+        json_files: Trial JSON files in the order they should be yielded
+        workers: Number of loader threads/processes (1 loads sequentially,
+            None uses the executor's default)
+        max_in_flight: Maximum number of files loaded ahead (default: 2 * workers,
+            or 2 * CPU count if workers is None)
+        use_processes: Decode in worker processes instead of threads, which
+            parallelizes JSON decoding at the cost of pickling the results back
+        
+    Yields:
+        Tuple (json_file, data, load_seconds)
+    """
+    if workers == 1:
+        for json_file in json_files:
+            data, elapsed = load_trial(json_file)
+            yield json_file, data, elapsed
+        return
+    
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+    if use_processes:
+        from concurrent.futures import ProcessPoolExecutor as executor_cls
+    else:
+        executor_cls = ThreadPoolExecutor
+    with executor_cls(max_workers=workers) as executor:
+        files = iter(json_files)
+        in_flight = deque()
+        for json_file in files:
+            in_flight.append((json_file, executor.submit(load_trial, json_file)))
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            json_file, future = in_flight.popleft()
+            data, elapsed = future.result()
+            next_file = next(files, None)
+            if next_file is not None:
+                in_flight.append((next_file, executor.submit(load_trial, next_file)))
+            yield json_file, data, elapsed
+
+
+def print_load_timing(timings: list) -> None:
+    """Print a summary of per-file load times [(json_file, seconds), ...]."""
+    if not timings:
+        return
+    total = sum(t for _, t in timings)
+    slowest_file, slowest = max(timings, key=lambda x: x[1])
+    print(f"Loaded {len(timings)} trials: {total:.2f}s total load time, "
+          f"{total / len(timings):.3f}s mean, slowest {slowest:.3f}s "
+          f"({os.path.basename(slowest_file)})")
+
+
 def save_json(data: dict, json_file: str) -> None:
     """Save data to JSON file with proper formatting."""
     with open(json_file, 'w') as f:
@@ -110,6 +245,104 @@ def save_json(data: dict, json_file: str) -> None:
     print(f"Data saved to: {json_file}")
 
 
+def plan_dataset(person_dirs: list, constants: Optional[Constants] = None) -> dict:
+    """
+    Place every trial file in the dataset structure without loading it.
+    
+    Args:
+        person_dirs: Participant 'traj_data' directories (see find_all_person_data)
+        constants: Constants object with scenario parameters (default scenario if None)
+        
+    Returns:
+        Structure of create_data_format with trial file paths as leaves
+    """
+    if constants is None:
+        constants = get_default_constants()
+    layout = create_data_format(constants)
+    for person_dir in person_dirs:
+        participant_id = os.path.basename(os.path.dirname(person_dir))
+        for json_file in find_trial_files(person_dir):
+            exp_type, scenario_idx = parse_trial_file_name(json_file, constants)
+            layout[exp_type][scenario_idx][participant_id] = json_file
+    return layout
+
+
+def stream_json(
+    layout: dict,
+    json_file: str,
+    indent: int = 4,
+    workers: int = 1,
+    max_in_flight: int = None
+) -> int:
+    """
+    Write the aggregated dataset one trial at a time.
+    
+    Produces exactly the bytes json.dump(data, f, indent=indent) would write
+    for the loaded dataset. With workers=1 at most one trial is held in
+    memory; otherwise upcoming trials are loaded concurrently (see
+    iter_trials) and up to max_in_flight more are held. The file is written
+    to a temporary path and moved into place when complete.
+    
+    Args:
+        layout: Dataset structure with trial file paths as leaves (see plan_dataset)
+        json_file: Output JSON file path
+        indent: Indentation width
+        workers: Number of loader threads (see iter_trials)
+        max_in_flight: Maximum number of trials loaded ahead
+        
+    Returns:
+        Number of trials written
+    """
+    encoder = json.JSONEncoder(indent=indent)
+    trial_files = [
+        trial_file
+        for scenarios in layout.values()
+        for participants in scenarios.values()
+        for trial_file in participants.values()
+    ]
+    trials = iter_trials(trial_files, workers, max_in_flight)
+    timings = []
+    
+    def pad(depth: int) -> str:
+        return '\n' + ' ' * (indent * depth)
+    
+    def write_dict(f, items, depth: int, write_value) -> None:
+        # Mirrors the layout of json's indented dict encoding
+        if not items:
+            f.write('{}')
+            return
+        f.write('{')
+        for i, (key, value) in enumerate(items):
+            if i > 0:
+                f.write(',')
+            f.write(pad(depth + 1) + encoder.encode(str(key)) + ': ')
+            write_value(f, value, depth + 1)
+        f.write(pad(depth) + '}')
+    
+    def write_trial(f, trial_file: str, depth: int) -> None:
+        # Newlines only occur between tokens (they are escaped in strings),
+        # so re-indenting every chunk nests the trial at the right depth
+        loaded_file, data, elapsed = next(trials)
+        assert loaded_file == trial_file
+        timings.append((trial_file, elapsed))
+        for chunk in encoder.iterencode(data):
+            f.write(chunk.replace('\n', pad(depth)))
+    
+    def write_scenario(f, participants: dict, depth: int) -> None:
+        write_dict(f, participants.items(), depth, write_trial)
+    
+    def write_exp_type(f, scenarios: dict, depth: int) -> None:
+        write_dict(f, scenarios.items(), depth, write_scenario)
+    
+    tmp_file = f"{json_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        write_dict(f, layout.items(), 0, write_exp_type)
+    os.replace(tmp_file, json_file)
+    print(f"Data saved to: {json_file}")
+    print_load_timing(timings)
+    return len(trial_files)
+
+
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
@@ -117,7 +350,10 @@ def save_json(data: dict, json_file: str) -> None:
 def run(
     data_dir: str = None,
     output_file: str = None,
-    max_participants: int = None
+    max_participants: int = None,
+    output_format: str = 'json',
+    store_dir: str = None,
+    workers: int = 4
 ) -> None:
     """
     Aggregate all experimental data into a unified dataset.
@@ -129,10 +365,12 @@ def run(
         data_dir: Path to directory containing processed data (default: ../lc_data_all)
         output_file: Path for output JSON file (default: ../data_all.json)
         max_participants: Limit number of participants to process (for testing)
+        output_format: 'json' for a single data_all.json, 'shards' for a
+            sharded store (see dataset_store.py)
+        store_dir: Output directory of the sharded store (default: ../data_store)
+        workers: Number of threads reading trial files concurrently
+            (1 reads sequentially with a single trial in memory)
     """
-    # Initialize the output data structure
-    data_final = create_data_format()
-    
     # Set up directories
     current_dir = os.path.dirname(os.path.abspath(__file__))
     parent_dir = os.path.dirname(current_dir)
@@ -140,52 +378,28 @@ def run(
     if data_dir is None:
         data_dir = os.path.join(parent_dir, 'lc_data_all')
     
+    if output_format == 'shards':
+        from dataset_store import write_store
+        if store_dir is None:
+            store_dir = os.path.join(parent_dir, 'data_store')
+        write_store(data_dir, store_dir, max_participants=max_participants)
+        return
+    
     if output_file is None:
         output_file = os.path.join(parent_dir, 'data_all.json')
     
     # Find all participant directories
     person_dirs = find_all_person_data(data_dir)
     print(f"Found {len(person_dirs)} participant directories in: {data_dir}")
+    if max_participants is not None and len(person_dirs) > max_participants:
+        print(f"Reached maximum participant limit: {max_participants}")
+        person_dirs = person_dirs[:max_participants]
     
-    # Process each participant
-    processed_count = 0
-    for person_dir in person_dirs:
-        # Check if we've reached the limit
-        if max_participants is not None and processed_count >= max_participants:
-            print(f"Reached maximum participant limit: {max_participants}")
-            break
-        
-        participant_id = os.path.basename(os.path.dirname(person_dir))
-        print(f"Processing participant: {participant_id}")
-        
-        # Get all JSON files in the trajectory data directory
-        all_files = os.listdir(person_dir)
-        if '.DS_Store' in all_files:
-            all_files.remove('.DS_Store')
-        
-        json_files = [
-            os.path.join(person_dir, f)
-            for f in all_files
-            if f.endswith('.json')
-        ]
-        
-        # Process each trial for this participant
-        for json_file in json_files:
-            data = read_json(json_file)
-            
-            # Extract experiment type and scenario index
-            exp_type = data['exp_info']['type']  # 'discretionary' or 'mandatory'
-            param_dict = getattr(constants, f'{exp_type}_param_dict')
-            scenario_idx = param_dict[str(data['exp_info']['param_name'])]
-            
-            # Store data in the hierarchical structure
-            data_final[exp_type][scenario_idx][participant_id] = data
-        
-        processed_count += 1
-    
-    # Save the aggregated data
-    save_json(data_final, output_file)
-    print(f"Successfully aggregated data from {processed_count} participants")
+    # Place every trial by its file name, then stream them into the output
+    layout = plan_dataset(person_dirs)
+    num_trials = stream_json(layout, output_file, workers=workers)
+    print(f"Successfully aggregated {num_trials} trials "
+          f"from {len(person_dirs)} participants")
 
 
 # ============================================================================
@@ -214,12 +428,34 @@ if __name__ == '__main__':
         default=None,
         help='Maximum number of participants to process (for testing)'
     )
+    parser.add_argument(
+        '--format', '-F',
+        type=str,
+        choices=['json', 'shards'],
+        default='json',
+        help='Write a single JSON file or a sharded store (default: json)'
+    )
+    parser.add_argument(
+        '--store-dir', '-s',
+        type=str,
+        default=None,
+        help='Output directory of the sharded store (with --format shards)'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=4,
+        help='Number of threads reading trial files concurrently (default: 4)'
+    )
     args = parser.parse_args()
     
     run(
         data_dir=args.data_dir,
         output_file=args.output,
-        max_participants=args.max_participants
+        max_participants=args.max_participants,
+        output_format=args.format,
+        store_dir=args.store_dir,
+        workers=args.workers
     )
             
 
@@ -0,0 +1,292 @@
+"""
+job_scheduler.py - Resumable, fault-tolerant scheduling of trial conversions
+
+This module runs the per-trial convert pipeline for many participants while
+recording progress in a JSON state file. Each job is identified by its output
+path and fingerprinted by its inputs (trajectory JSON and VR recording), so:
+
+1. The full job list is built up front
+2. Completed jobs whose inputs are unchanged are skipped on restart
+3. Transient failures (I/O errors, lost worker processes) are retried
+4. A failure summary is printed at the end of every run
+
+Usage:
+    from job_scheduler import JobScheduler
+
+    scheduler = JobScheduler('lc_data_all/.job_state.json', max_retries=2)
+    summary = scheduler.run(jobs, max_workers=8)
+
+State File Structure:
+    {
+        "version": 1,
+        "jobs": {
+            "<output json path>": {
+                "status": "completed",       # or "failed"
+                "fingerprint": "9f2c...",    # hash of the input fingerprints
+                "attempts": 1,
+                "error": null,
+                "elapsed": 12.3,
+                "finished_at": 1700000000.0
+            },
+            ...
+        }
+    }
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from single_person_data_intergrate import run_convert_batch
+
+
+STATE_VERSION = 1
+
+# Job fields that point at input files
+JOB_INPUT_KEYS = ('json_file', 'log_file')
+
+# Job options that change the integrated output (only mixed in when set, so
+# fingerprints of jobs without options stay the same)
+JOB_OPTION_KEYS = ('clock_correction',)
+
+
+# ============================================================================
+# FINGERPRINT FUNCTIONS
+# ============================================================================
+
+def file_fingerprint(path: str) -> str:
+    """
+    Cheap fingerprint of a file from its size and modification time.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        String '{size}-{mtime_ns}', or 'missing' if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def combine_fingerprints(parts: List[str]) -> str:
+    """Hash an ordered list of fingerprint strings into one digest."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def job_key(job: Dict[str, str]) -> str:
+    """Unique identifier of a job: the integrated output file it produces."""
+    return os.path.abspath(job['output_dir'])
+
+
+def job_fingerprint(job: Dict[str, str], version: str = '') -> str:
+    """
+    Fingerprint of all input files of a job.
+
+    Args:
+        job: Job dictionary
+        version: Optional code/config version mixed into the fingerprint so
+            that jobs are redone when the pipeline itself changes
+
+    Returns:
+        Hex digest identifying the job's inputs
+    """
+    return combine_fingerprints([f"version={version}"] + [
+        f"{key}={os.path.abspath(job[key])}:{file_fingerprint(job[key])}"
+        for key in JOB_INPUT_KEYS
+    ] + [f"{key}={job[key]}" for key in JOB_OPTION_KEYS if job.get(key)])
+
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+class JobScheduler:
+    """
+    Runs convert jobs with persistent, crash-safe progress tracking.
+
+    The state file is rewritten atomically after every finished job, so an
+    interrupted run loses at most the trials that were in flight.
+
+    Attributes:
+        state_file: Path of the JSON state file
+        max_retries: Number of extra attempts for transiently failing jobs
+        retry_delay: Seconds to wait before each retry round
+        version: Code/config version mixed into every job fingerprint
+        state: In-memory copy of the state file
+    """
+
+    def __init__(
+        self,
+        state_file: str,
+        max_retries: int = 2,
+        retry_delay: float = 5.0,
+        fresh: bool = False,
+        version: str = ''
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            state_file: Path of the JSON state file (created if missing)
+            max_retries: Number of extra attempts for transiently failing jobs
+            retry_delay: Seconds to wait before each retry round
+            fresh: If True, ignore any existing state and redo every job
+            version: Code/config version; completed jobs recorded under a
+                different version are redone
+        """
+        self.state_file = state_file
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.version = version
+        self.state = {'version': STATE_VERSION, 'jobs': {}}
+        if not fresh:
+            self.load_state()
+
+    def load_state(self) -> None:
+        """Load the state file if it exists and is readable."""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"WARNING: ignoring unreadable state file {self.state_file}: {e}")
+            return
+        if state.get('version') == STATE_VERSION:
+            self.state = state
+
+    def save_state(self) -> None:
+        """Atomically write the state file."""
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(state_dir, exist_ok=True)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_file, self.state_file)
+
+    def is_completed(self, job: Dict[str, str]) -> bool:
+        """
+        Check whether a job finished before with the same inputs.
+
+        Args:
+            job: Job dictionary
+
+        Returns:
+            True if the job is recorded as completed, its input fingerprint
+            is unchanged and its output file still exists
+        """
+        record = self.state['jobs'].get(job_key(job))
+        return (
+            record is not None
+            and record['status'] == 'completed'
+            and record['fingerprint'] == job_fingerprint(job, self.version)
+            and os.path.exists(job['output_dir'])
+        )
+
+    def pending_jobs(self, jobs: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return the jobs that still need to run."""
+        return [job for job in jobs if not self.is_completed(job)]
+
+    def record_result(self, result: Dict[str, object]) -> None:
+        """Store one job result in the state and persist it immediately."""
+        job = result['job']
+        key = job_key(job)
+        previous = self.state['jobs'].get(key, {})
+        self.state['jobs'][key] = {
+            'status': 'completed' if result['ok'] else 'failed',
+            'fingerprint': job_fingerprint(job, self.version),
+            'attempts': previous.get('attempts', 0) + 1,
+            'error': result['error'],
+            'transient': result.get('transient', False),
+            'elapsed': result['elapsed'],
+            'finished_at': time.time(),
+        }
+        self.save_state()
+
+    def run(
+        self,
+        jobs: List[Dict[str, str]],
+        max_workers: Optional[int] = None,
+        max_tasks_per_child: Optional[int] = None,
+        on_result: Optional[Callable[[Dict[str, object]], None]] = None
+    ) -> Dict[str, List]:
+        """
+        Run all pending jobs, retrying transient failures.
+
+        Args:
+            jobs: Complete job list (already finished jobs are skipped)
+            max_workers: Number of worker processes (1 runs in-process)
+            max_tasks_per_child: Recycle each worker after this many trials
+            on_result: Optional callback invoked with every successful result
+
+        Returns:
+            Dictionary with 'skipped', 'completed' and 'failed' lists of
+            job results (skipped entries are job dictionaries)
+        """
+        start_t = time.time()
+        pending = self.pending_jobs(jobs)
+        pending_keys = {job_key(job) for job in pending}
+        skipped = [job for job in jobs if job_key(job) not in pending_keys]
+        print(f"{len(jobs)} jobs: {len(skipped)} already completed, "
+              f"{len(pending)} to run")
+
+        # reset the attempt counter for jobs whose inputs changed
+        for job in pending:
+            record = self.state['jobs'].get(job_key(job))
+            if record is not None and record['fingerprint'] != job_fingerprint(job, self.version):
+                del self.state['jobs'][job_key(job)]
+
+        def handle(result: Dict[str, object]) -> None:
+            self.record_result(result)
+            if result['ok'] and on_result is not None:
+                on_result(result)
+
+        completed, failed = [], []
+        attempt = 0
+        while pending:
+            if attempt > 0:
+                print(f"Retrying {len(pending)} transiently failed jobs "
+                      f"(attempt {attempt + 1}/{self.max_retries + 1}) "
+                      f"in {self.retry_delay:.1f}s")
+                time.sleep(self.retry_delay)
+            results = run_convert_batch(
+                pending, max_workers, max_tasks_per_child, on_result=handle
+            )
+            completed.extend(r for r in results if r['ok'])
+            retry = [r for r in results if not r['ok'] and r.get('transient')]
+            failed.extend(r for r in results if not r['ok'] and not r.get('transient'))
+            attempt += 1
+            if attempt > self.max_retries:
+                failed.extend(retry)
+                break
+            pending = [r['job'] for r in retry]
+
+        self.print_summary(skipped, completed, failed, time.time() - start_t)
+        return {'skipped': skipped, 'completed': completed, 'failed': failed}
+
+    def print_summary(
+        self,
+        skipped: List[Dict[str, str]],
+        completed: List[Dict[str, object]],
+        failed: List[Dict[str, object]],
+        elapsed: float
+    ) -> None:
+        """Print a final report of the run."""
+        print("=" * 60)
+        print(f"Scheduler finished in {elapsed:.1f}s: {len(completed)} completed, "
+              f"{len(skipped)} skipped, {len(failed)} failed")
+        for result in failed:
+            print(f"  FAILED {result['job']['output_dir']}: {result['error']}")
+        if failed:
+            print(f"Failed jobs are recorded in {self.state_file} and will be "
+                  f"retried on the next run")
+        print("=" * 60)
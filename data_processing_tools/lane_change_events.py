@@ -0,0 +1,293 @@
+"""
+lane_change_events.py - Lane-change event table for all processed trials
+
+Finds the lane changes of the VR ego in every integrated trial and writes one
+row per event to a CSV table. For each trial the road geometry is taken from
+the scenario config ('lane_geometry', see src/lanes.py) or fitted to the
+recorded vehicle positions, the ego is assigned to lanes with hysteresis, and
+src.lane_changes.detect_lane_changes finds the start, boundary crossing and
+completion of every lane change (plus aborted attempts) from the lateral
+position, lateral velocity and heading in one vectorised pass. Trials are
+processed in parallel worker processes.
+
+Usage:
+    # All participants, default output <data-dir>/lane_change_events.csv
+    python lane_change_events.py --data-dir ../lc_data_all
+
+    from lane_change_events import trial_lane_changes, detect_corpus
+
+    rows = trial_lane_changes('lc_data_all/1/traj_data/mandatory_[72, 0.6, 7].json')
+    rows = detect_corpus('lc_data_all', workers=8)
+
+Columns:
+    participant, exp_type, scenario_idx, param_name, event ('complete' or
+    'aborted'), direction (+1 right, -1 left), from_lane, to_lane (numbered
+    from the left), t_start, t_cross, t_end [s] (carla_ts; t_cross is empty for
+    aborted attempts), duration [s], peak_lateral_speed [m/s], output_file
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config_loader import get_default_constants
+from intergrate_all import find_all_person_data, find_trial_files, read_json
+from single_exp_data_intergrate import build_aligned_tensor
+from src.lane_changes import detect_lane_changes
+from src.lanes import LaneGeometry
+
+
+EVENTS_FILE = 'lane_change_events.csv'
+
+EVENT_COLUMNS = [
+    'participant', 'exp_type', 'scenario_idx', 'param_name', 'event', 'direction',
+    'from_lane', 'to_lane', 't_start', 't_cross', 't_end', 'duration',
+    'peak_lateral_speed', 'output_file',
+]
+
+
+# ============================================================================
+# SINGLE TRIAL
+# ============================================================================
+
+def trial_info(output_file: str, data: dict) -> Dict[str, object]:
+    """Participant and scenario columns of an integrated trial."""
+    exp_info = data['exp_info']
+    return {
+        'participant': os.path.basename(os.path.dirname(os.path.dirname(
+            os.path.abspath(output_file)))),
+        'exp_type': exp_info['type'],
+        'scenario_idx': get_default_constants().get_param_dict(exp_info['type']).get(
+            str(exp_info['param_name'])),
+        'param_name': str(exp_info['param_name']),
+    }
+
+
+def trial_road_frame(
+    data: dict,
+    geometry: Optional[LaneGeometry] = None,
+    hysteresis: float = 0.3
+) -> Dict[str, object]:
+    """
+    Express every vehicle of an integrated trial in the road frame.
+
+    Args:
+        data: Integrated trial data (see read_json)
+        geometry: Road geometry (default: the scenario config's
+            'lane_geometry', else fitted to the trial)
+        hysteresis: Lane assignment hysteresis in metres (see LaneGeometry.assign)
+
+    Returns:
+        Dictionary with:
+        - aligned: build_aligned_tensor of the location (and velocity, if all
+          vehicles have one), VR ego first
+        - geometry: The LaneGeometry used
+        - t: Ego timestamps in seconds, shape (T,)
+        - s, lateral: Longitudinal and lateral position in metres, shape (V, T)
+        - lane: Lane index (-1 off the road or absent), shape (V, T)
+        - heading: Ego heading relative to the road in degrees, shape (T,)
+    """
+    vr_id = str(data['vr_id'])
+    all_veh_info = data['all_veh_info']
+    features = ['location']
+    if all('velocity' in veh for veh in all_veh_info.values()):
+        features.append('velocity')
+    aligned = build_aligned_tensor(all_veh_info, vr_id, features=features)
+
+    # Integrated trials store positions in metres, the lane geometry works in cm
+    locations = aligned['data'][..., :3] * 100
+    if geometry is None:
+        geometry = LaneGeometry.from_config(get_default_constants().lane_geometry)
+    if geometry is None:
+        geometry = LaneGeometry.fit(locations[0], locations[1:])
+    lane, _ = geometry.assign(locations, hysteresis)
+    lane[~aligned['mask']] = -1
+    s, lateral = geometry.to_road_frame(locations)
+    yaw = np.asarray(all_veh_info[vr_id]['rotation'], dtype=float)[:, 1]
+    return {
+        'aligned': aligned,
+        'geometry': geometry,
+        't': aligned['ts'],
+        's': s,
+        'lateral': lateral,
+        'lane': lane,
+        'heading': (yaw - np.degrees(geometry.heading) + 180) % 360 - 180,
+    }
+
+
+def ego_lane_changes(road: Dict[str, object], **detector_kwargs) -> Dict[str, np.ndarray]:
+    """Run detect_lane_changes on the ego of a trial_road_frame result."""
+    geometry = road['geometry']
+    return detect_lane_changes(
+        road['t'], road['lateral'][0], road['lane'][0], road['heading'],
+        lane_centres=geometry.lane_centres,
+        lane_width=geometry.lane_width,
+        **detector_kwargs
+    )
+
+
+def trial_lane_changes(
+    output_file: str,
+    geometry: Optional[LaneGeometry] = None,
+    hysteresis: float = 0.3,
+    **detector_kwargs
+) -> List[Dict[str, object]]:
+    """
+    Detect the lane changes of the VR ego in one integrated trial.
+
+    Args:
+        output_file: Path of the integrated trial JSON
+        geometry: Road geometry (default: the scenario config's
+            'lane_geometry', else fitted to the trial)
+        hysteresis: Lane assignment hysteresis in metres (see LaneGeometry.assign)
+        **detector_kwargs: Thresholds passed to detect_lane_changes
+
+    Returns:
+        List of event rows with the columns of EVENT_COLUMNS
+    """
+    data = read_json(output_file)
+    events = ego_lane_changes(trial_road_frame(data, geometry, hysteresis), **detector_kwargs)
+
+    info = trial_info(output_file, data)
+    rows = []
+    for k in range(len(events['kind'])):
+        t_cross = float(events['t_cross'][k])
+        rows.append({
+            **info,
+            'event': events['kind'][k],
+            'direction': int(events['direction'][k]),
+            'from_lane': int(events['from_lane'][k]),
+            'to_lane': int(events['to_lane'][k]),
+            't_start': float(events['t_start'][k]),
+            't_cross': t_cross if np.isfinite(t_cross) else None,
+            't_end': float(events['t_end'][k]),
+            'duration': float(events['t_end'][k] - events['t_start'][k]),
+            'peak_lateral_speed': float(events['peak_lateral_speed'][k]),
+            'output_file': os.path.abspath(output_file),
+        })
+    return rows
+
+
+def _trial_job(args: tuple) -> tuple:
+    """Worker entry point: (output_file, rows, error message or None)."""
+    output_file, kwargs = args
+    try:
+        return output_file, trial_lane_changes(output_file, **kwargs), None
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        return output_file, [], f"{type(e).__name__}: {e}"
+
+
+# ============================================================================
+# CORPUS
+# ============================================================================
+
+def detect_corpus(
+    data_dir: str,
+    workers: Optional[int] = None,
+    **kwargs
+) -> List[Dict[str, object]]:
+    """
+    Detect the lane changes of every processed trial, in parallel.
+
+    Args:
+        data_dir: Directory containing processed participant data
+        workers: Number of worker processes (default: os.cpu_count());
+            1 runs every trial in the calling process
+        **kwargs: Passed to trial_lane_changes
+
+    Returns:
+        Event rows of all trials, in participant and trial order
+    """
+    output_files = [
+        output_file
+        for person_dir in find_all_person_data(data_dir)
+        for output_file in find_trial_files(person_dir)
+    ]
+    jobs = [(output_file, kwargs) for output_file in output_files]
+    if workers == 1:
+        results = [_trial_job(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_trial_job, jobs, chunksize=chunksize))
+
+    rows = []
+    for output_file, trial_rows, error in results:
+        if error is not None:
+            print(f"WARNING: could not process {output_file}: {error}")
+        rows.extend(trial_rows)
+    return rows
+
+
+def write_events(rows: List[Dict[str, object]], csv_file: str) -> None:
+    """Write event rows to a CSV file with the columns of EVENT_COLUMNS."""
+    os.makedirs(os.path.dirname(os.path.abspath(csv_file)), exist_ok=True)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=EVENT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Detect the lane changes of all processed trials and write an event table'
+    )
+    parser.add_argument(
+        '--data-dir', '-d',
+        type=str,
+        default=None,
+        help='Path to the processed data directory (default: ../lc_data_all)'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        type=str,
+        default=None,
+        help=f'Path of the CSV table (default: <data-dir>/{EVENTS_FILE})'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: CPU count, 1 = sequential)'
+    )
+    parser.add_argument(
+        '--lateral-speed',
+        type=float,
+        default=0.2,
+        help='Lateral speed [m/s] above which the ego counts as moving sideways'
+    )
+    parser.add_argument(
+        '--abort-offset',
+        type=float,
+        default=0.8,
+        help='Offset [m] from the lane centre that makes a manoeuvre without '
+             'a lane change an aborted attempt'
+    )
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lc_data_all'
+        )
+    output = args.output or os.path.join(data_dir, EVENTS_FILE)
+    start_t = time.time()
+    rows = detect_corpus(
+        data_dir,
+        workers=args.workers,
+        lateral_speed=args.lateral_speed,
+        abort_offset=args.abort_offset,
+    )
+    write_events(rows, output)
+    n_complete = sum(row['event'] == 'complete' for row in rows)
+    print(f"{n_complete} lane changes and {len(rows) - n_complete} aborted attempts "
+          f"in {time.time() - start_t:.2f}s -> {output}")
@@ -68,6 +68,22 @@ def find_all_exp_data(person_dir: str) -> None:
     and each experiment folder contains one .log file to be converted.
     """
     print(f'Processing participant directory: {os.path.basename(person_dir)}')
+    for log_file in collect_log_files(person_dir):
+        print(f"Found log file: {log_file}")
+        run_convert(log_file)
+
+
+def collect_log_files(person_dir: str) -> list:
+    """
+    Find the .log file of every experiment folder of a single participant.
+    
+    Args:
+        person_dir: Path to the participant's data directory
+        
+    Returns:
+        List of .log file paths (one per experiment folder that has one)
+    """
+    log_file_list = []
     
     # Get all experiment directories for this participant
     all_exp = os.listdir(person_dir)
@@ -90,9 +106,9 @@ def find_all_exp_data(person_dir: str) -> None:
         log_files = [os.path.join(exp_data_dir, f) for f in all_files if f.endswith('.log')]
         
         if log_files:
-            log_file = log_files[0].replace('\\', '/')
-            print(f"Found log file: {log_file}")
-            run_convert(log_file)
+            log_file_list.append(log_files[0].replace('\\', '/'))
+    
+    return log_file_list
 
 
 def find_all_person_data(data_dir: str) -> list:
@@ -8,22 +8,371 @@ trajectory data from CARLA for a single experimental trial. It performs:
 3. Experiment metadata extraction from file names
 
 The output is a unified JSON structure containing all data streams aligned
-by timestamp.
+by timestamp. Optionally, every vehicle in the trajectory data can also be
+resampled onto the VR ego's time base as a dense (vehicles x T x features)
+tensor with presence masks (see build_aligned_tensor).
+
+Every run also fits an affine clock model between the trajectory 'carla_ts'
+and the VR 'TimestampCarla' streams (see estimate_clock_model) and stores the
+fit and its residuals under 'clock_alignment' for quality checks. With
+clock_correction=True the fitted mapping is applied before matching.
 
 Usage:
     from single_exp_data_intergrate import SingleExpDataIntergrate
     
     integrator = SingleExpDataIntergrate(traj_path, vr_path)
     result = integrator.run()
+
+    # Also attach the all-vehicle tensor on the ego time base
+    result = SingleExpDataIntergrate(traj_path, vr_path, align_all=True).run()
+    aligned = result['aligned']
 """
 
 import json
 import os
 from pathlib import Path
-from config_loader import load_scenario_config, Constants
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config_loader import get_default_constants
+
+
+def __getattr__(name: str):
+    # Default scenario configuration, loaded on first access
+    if name == 'constants':
+        return get_default_constants()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Per-vehicle trajectory fields that are bookkeeping rather than kinematics
+NON_FEATURE_KEYS = ('carla_ts', 'if_vr')
+
+
+# ============================================================================
+# ALL-VEHICLE TIME-GRID ALIGNMENT
+# ============================================================================
+
+def _as_columns(values: list) -> Optional[np.ndarray]:
+    """Convert a per-sample field to a float (n, d) array, or None if not numeric."""
+    try:
+        arr = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if arr.ndim == 0:
+        return None
+    return arr.reshape(len(arr), -1)
+
+
+def find_common_features(all_veh_info: dict) -> List[str]:
+    """
+    Find the numeric per-sample fields shared by every vehicle.
+
+    Fields merged in from the VR data (eye tracking, user inputs, ...) only
+    exist on the ego vehicle and are therefore excluded automatically.
+
+    Args:
+        all_veh_info: Dictionary of vehicle trajectories keyed by vehicle ID
+
+    Returns:
+        Sorted list of trajectory field names usable as tensor features
+    """
+    common = None
+    for veh in all_veh_info.values():
+        keys = set(veh.keys()) - set(NON_FEATURE_KEYS)
+        common = keys if common is None else common & keys
+    features = []
+    for key in sorted(common or []):
+        for veh in all_veh_info.values():
+            if len(veh[key]) != len(veh['carla_ts']):
+                break
+            if len(veh[key]) > 0 and _as_columns(veh[key]) is None:
+                break
+        else:
+            features.append(key)
+    return features
+
+
+def build_aligned_tensor(
+    all_veh_info: dict,
+    ref_id: str,
+    features: Optional[List[str]] = None,
+    tolerance: Optional[float] = None
+) -> Dict[str, object]:
+    """
+    Resample every vehicle onto the reference vehicle's time base.
+
+    Each vehicle is matched to the reference timestamps by nearest neighbour
+    (one np.searchsorted per vehicle, vectorised over time). A reference frame
+    counts as present for a vehicle only if that vehicle has a sample within
+    `tolerance` seconds of it, which masks out vehicles that are spawned or
+    despawned mid-trial.
+
+    Args:
+        all_veh_info: Dictionary of vehicle trajectories keyed by vehicle ID,
+            as found in the trajectory JSON or in an integrated trial's
+            'all_veh_info'
+        ref_id: Vehicle ID whose 'carla_ts' defines the time base (the VR ego)
+        features: Trajectory fields to include (default: all numeric fields
+            shared by every vehicle, see find_common_features)
+        tolerance: Maximum matching distance in seconds (default: half the
+            median reference frame interval)
+
+    Returns:
+        Dictionary with:
+        - veh_ids: Vehicle IDs, reference vehicle first (axis 0)
+        - features: Column names (axis 2); multi-dimensional fields are
+          split into '{name}_{i}' columns
+        - ts: Reference timestamps in seconds, shape (T,)
+        - data: Float array of shape (vehicles, T, features), NaN where absent
+        - mask: Boolean array of shape (vehicles, T), True where present
+    """
+    if features is None:
+        features = find_common_features(all_veh_info)
+
+    ref_ts = np.asarray(all_veh_info[ref_id]['carla_ts'], dtype=float)
+    n_frames = len(ref_ts)
+    if tolerance is None:
+        tolerance = 0.5 * np.median(np.diff(ref_ts)) if n_frames > 1 else 0.0
+
+    veh_ids = [ref_id] + [veh_id for veh_id in all_veh_info if veh_id != ref_id]
+
+    # Column layout is taken from the reference vehicle
+    widths = [
+        _as_columns(all_veh_info[ref_id][key]).shape[1] if n_frames > 0 else 1
+        for key in features
+    ]
+    feature_names = []
+    for key, width in zip(features, widths):
+        if width == 1:
+            feature_names.append(key)
+        else:
+            feature_names.extend(f"{key}_{i}" for i in range(width))
+
+    data = np.full((len(veh_ids), n_frames, len(feature_names)), np.nan)
+    mask = np.zeros((len(veh_ids), n_frames), dtype=bool)
+
+    for v, veh_id in enumerate(veh_ids):
+        veh = all_veh_info[veh_id]
+        ts = np.asarray(veh['carla_ts'], dtype=float)
+        if len(ts) == 0 or n_frames == 0:
+            continue
+        columns = [_as_columns(veh[key]) for key in features]
+        for key, width, col in zip(features, widths, columns):
+            if col is None or col.shape[1] != width:
+                found = 'non-numeric values' if col is None else f"width {col.shape[1]}"
+                raise ValueError(
+                    f"Vehicle {veh_id}: field '{key}' has {found}, "
+                    f"expected width {width} as on reference vehicle {ref_id}"
+                )
+        values = np.concatenate(columns, axis=1) if features else np.empty((len(ts), 0))
+
+        # Nearest sample on either side of each reference timestamp
+        right = np.clip(np.searchsorted(ts, ref_ts), 0, len(ts) - 1)
+        left = np.clip(right - 1, 0, len(ts) - 1)
+        use_left = np.abs(ts[left] - ref_ts) <= np.abs(ts[right] - ref_ts)
+        nearest = np.where(use_left, left, right)
+
+        present = np.abs(ts[nearest] - ref_ts) <= tolerance
+        mask[v] = present
+        data[v, present] = values[nearest[present]]
+
+    return {
+        'veh_ids': veh_ids,
+        'features': feature_names,
+        'ts': ref_ts,
+        'data': data,
+        'mask': mask,
+    }
+
+
+# ============================================================================
+# CLOCK OFFSET AND DRIFT ESTIMATION
+# ============================================================================
+
+def match_nearest(query: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Index of the nearest element of the sorted `reference` for every query."""
+    right = np.clip(np.searchsorted(reference, query), 0, len(reference) - 1)
+    left = np.clip(right - 1, 0, len(reference) - 1)
+    use_left = np.abs(reference[left] - query) <= np.abs(reference[right] - query)
+    return np.where(use_left, left, right)
+
+
+def pair_by_position(
+    traj_ts_ms: np.ndarray,
+    traj_loc_cm: np.ndarray,
+    vr_ts_ms: np.ndarray,
+    vr_loc_cm: np.ndarray,
+    min_speed: float = 100.0
+) -> tuple:
+    """
+    Pair trajectory samples with the VR time at which the ego was at the same place.
+
+    Both logs record the ego position, so each trajectory sample is matched on
+    content rather than on its own timestamp: positions are projected onto
+    the main direction of the VR path (a straight highway, so the projection
+    increases monotonically while driving) and the VR time at the trajectory
+    sample's position is interpolated between VR frames. Only samples inside
+    the part of the road covered by both logs, and driven at min_speed or
+    faster, are paired.
+
+    Args:
+        traj_ts_ms: Trajectory timestamps in milliseconds
+        traj_loc_cm: Trajectory ego positions in cm, shape (n, 2) or (n, 3)
+        vr_ts_ms: VR 'TimestampCarla' values in milliseconds (sorted)
+        vr_loc_cm: VR 'VehicleLoc' positions in cm, shape (m, 2) or (m, 3)
+        min_speed: Minimum VR speed along the path in cm/s
+
+    Returns:
+        Tuple (traj_ms, vr_ms) of the paired timestamps
+    """
+    traj_ts_ms = np.asarray(traj_ts_ms, dtype=float)
+    vr_ts_ms = np.asarray(vr_ts_ms, dtype=float)
+    traj_xy = np.asarray(traj_loc_cm, dtype=float)[:, :2]
+    vr_xy = np.asarray(vr_loc_cm, dtype=float)[:, :2]
+    finite = np.isfinite(vr_xy).all(axis=1)
+    vr_ts_ms, vr_xy = vr_ts_ms[finite], vr_xy[finite]
+    if len(vr_xy) < 2 or len(traj_xy) == 0:
+        return np.zeros(0), np.zeros(0)
+
+    # Main direction of travel, oriented along the driving direction
+    centre = vr_xy.mean(axis=0)
+    direction = np.linalg.svd(vr_xy - centre, full_matrices=False)[2][0]
+    if np.dot(vr_xy[-1] - vr_xy[0], direction) < 0:
+        direction = -direction
+    vr_s = (vr_xy - centre) @ direction
+    traj_s = (traj_xy - centre) @ direction
+
+    # Strictly increasing VR samples driven fast enough, so s -> time is a function
+    speed = np.gradient(vr_s, vr_ts_ms / 1000) if len(vr_s) > 1 else np.zeros(1)
+    moving = speed >= min_speed
+    vr_s, vr_t = vr_s[moving], vr_ts_ms[moving]
+    if len(vr_s) < 2:
+        return np.zeros(0), np.zeros(0)
+    previous_max = np.concatenate([[-np.inf], np.maximum.accumulate(vr_s)[:-1]])
+    increasing = vr_s > previous_max
+    vr_s, vr_t = vr_s[increasing], vr_t[increasing]
+
+    inside = np.isfinite(traj_s) & (traj_s >= vr_s[0]) & (traj_s <= vr_s[-1])
+    return traj_ts_ms[inside], np.interp(traj_s[inside], vr_s, vr_t)
+
+
+def estimate_clock_model(
+    traj_ts_ms: np.ndarray,
+    traj_loc_cm: np.ndarray,
+    vr_ts_ms: np.ndarray,
+    vr_loc_cm: np.ndarray,
+    huber_k: float = 1.345,
+    max_iter: int = 50,
+    min_speed: float = 100.0
+) -> Optional[Dict[str, object]]:
+    """
+    Fit VR time as an affine function of trajectory time over a whole trial.
+
+    Trajectory and VR samples are paired on the ego position both logs
+    carry (see pair_by_position), so the fit recovers offsets of any size,
+    not only within half a VR frame as pairing by nearest timestamp would.
+    vr = t0 + offset + slope * (traj - t0) is fitted by iteratively
+    reweighted least squares with Huber weights, so occasional dropped or
+    duplicated frames do not bias the estimate. Pass only the samples of the
+    overlapping interval of both logs.
+
+    Args:
+        traj_ts_ms: Trajectory timestamps in milliseconds
+        traj_loc_cm: Trajectory ego positions in cm, shape (n, 3)
+        vr_ts_ms: VR 'TimestampCarla' values in milliseconds (sorted)
+        vr_loc_cm: VR 'VehicleLoc' positions in cm, shape (m, 3)
+        huber_k: Huber threshold in units of the robust residual scale
+        max_iter: Maximum number of reweighting iterations
+        min_speed: Minimum ego speed in cm/s for a sample to be paired
+
+    Returns:
+        Dictionary with the following keys, or None if fewer than two
+        samples could be paired (e.g. the ego never moved):
+        - ref_ts_ms: Trajectory time t0 the model is expressed around
+        - offset_ms: VR minus trajectory time at t0
+        - slope: Rate of the VR clock relative to the trajectory clock
+        - drift_ppm: (slope - 1) in parts per million
+        - n_pairs: Number of paired samples
+        - residual_stats: mean/std/median_abs/p95_abs/max_abs in milliseconds
+        - residuals_ms: Per-pair residuals after the fit
+    """
+    traj_ms, vr_ms = pair_by_position(traj_ts_ms, traj_loc_cm, vr_ts_ms, vr_loc_cm, min_speed)
+    if len(traj_ms) < 2:
+        return None
+    t0 = traj_ms[0]
+
+    x = traj_ms - t0
+    y = vr_ms - t0
+    design = np.stack([np.ones_like(x), x], axis=1)
+
+    weights = np.ones_like(x)
+    coef = np.array([0.0, 1.0])
+    for _ in range(max_iter):
+        sqrt_w = np.sqrt(weights)
+        coef, *_ = np.linalg.lstsq(design * sqrt_w[:, None], y * sqrt_w, rcond=None)
+        residuals = y - design @ coef
+        # Median absolute deviation as a robust residual scale
+        scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+        if scale == 0:
+            break
+        abs_res = np.maximum(np.abs(residuals), 1e-12)
+        new_weights = np.minimum(1.0, huber_k * scale / abs_res)
+        if np.allclose(new_weights, weights):
+            break
+        weights = new_weights
+
+    residuals = y - design @ coef
+    abs_res = np.abs(residuals)
+    return {
+        'ref_ts_ms': float(t0),
+        'offset_ms': float(coef[0]),
+        'slope': float(coef[1]),
+        'drift_ppm': float((coef[1] - 1.0) * 1e6),
+        'n_pairs': int(len(x)),
+        'residual_stats': {
+            'mean': float(np.mean(residuals)),
+            'std': float(np.std(residuals)),
+            'median_abs': float(np.median(abs_res)),
+            'p95_abs': float(np.percentile(abs_res, 95)),
+            'max_abs': float(np.max(abs_res)),
+        },
+        'residuals_ms': residuals,
+    }
+
+
+def traj_to_vr_time(traj_ts_ms: np.ndarray, clock_model: dict) -> np.ndarray:
+    """Map trajectory timestamps (ms) onto the VR clock with a fitted model."""
+    t0 = clock_model['ref_ts_ms']
+    x = np.asarray(traj_ts_ms, dtype=float) - t0
+    return t0 + clock_model['offset_ms'] + clock_model['slope'] * x
+
+
+def vr_to_traj_time(vr_ts_ms: np.ndarray, clock_model: dict) -> np.ndarray:
+    """Map VR timestamps (ms) onto the trajectory clock with a fitted model."""
+    t0 = clock_model['ref_ts_ms']
+    y = np.asarray(vr_ts_ms, dtype=float) - t0
+    return t0 + (y - clock_model['offset_ms']) / clock_model['slope']
+
+
+def aligned_tensor_to_json(aligned: Dict[str, object]) -> dict:
+    """
+    Convert the arrays of build_aligned_tensor to JSON-serialisable lists.
+
+    Absent samples (NaN) become None, i.e. null in the JSON file, since NaN
+    is not valid JSON for readers other than Python's; 'mask' marks them too.
+    """
+    result = {}
+    for key, value in aligned.items():
+        if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+            obj = value.astype(object)
+            obj[np.isnan(value)] = None
+            result[key] = obj.tolist()
+        elif isinstance(value, np.ndarray):
+            result[key] = value.tolist()
+        else:
+            result[key] = value
+    return result
 
-# Load default scenario configuration (can be overridden per-instance)
-constants = Constants(load_scenario_config())
 
 class SingleExpDataIntergrate:
     """
@@ -41,9 +390,18 @@ class SingleExpDataIntergrate:
         vr_data_path: Path to VR data JSON file
         have_vr_data: Whether raw VR data is provided directly
         raw_vr_data: Pre-loaded VR data (optional)
+        align_all: Whether to also build the all-vehicle aligned tensor
+        clock_correction: Whether to apply the fitted clock model before matching
     """
 
-    def __init__(self, traj_data_path: str, vr_data_path: str, raw_vr_data: dict = None):
+    def __init__(
+        self,
+        traj_data_path: str,
+        vr_data_path: str,
+        raw_vr_data: dict = None,
+        align_all: bool = False,
+        clock_correction: bool = False
+    ):
         """
         Initialize the data integrator.
         
@@ -51,9 +409,15 @@ class SingleExpDataIntergrate:
             traj_data_path: Path to the trajectory data JSON file
             vr_data_path: Path to the VR data JSON file
             raw_vr_data: Optional pre-loaded VR data dictionary
+            align_all: If True, resample every vehicle onto the VR ego's
+                time base and store it under 'aligned' in the output
+            clock_correction: If True, map trajectory timestamps onto the VR
+                clock with the fitted offset/drift model before matching
         """
         self.traj_data_path = traj_data_path
         self.vr_data_path = vr_data_path
+        self.align_all = align_all
+        self.clock_correction = clock_correction
         self.have_vr_data = False
         if raw_vr_data is not None:
             self.have_vr_data = True
@@ -105,6 +469,28 @@ class SingleExpDataIntergrate:
         vr_v_traj = self.delete_vr_data(vr_v_traj, vr_data, vaild_idx)
         return vr_v_traj
 
+    def filter_ts_corrected(self, vr_v_traj: dict, vr_data: dict, clock_model: dict) -> dict:
+        """
+        Filter VR data using a fitted clock model instead of a per-sample search.
+        
+        Trajectory timestamps are mapped onto the VR clock with the affine
+        model and matched to their nearest VR sample in one vectorised pass.
+        
+        Args:
+            vr_v_traj: Trajectory data for the VR vehicle
+            vr_data: Full VR data dictionary
+            clock_model: Model returned by estimate_clock_model
+            
+        Returns:
+            Updated trajectory dict with synchronized VR data added
+        """
+        traj_ts_ms = np.asarray(vr_v_traj['carla_ts'], dtype=float) * 1000
+        vr_ts_ms = np.asarray(vr_data['TimestampCarla'], dtype=float)
+        predicted = traj_to_vr_time(traj_ts_ms, clock_model)
+        vaild_idx = match_nearest(predicted, vr_ts_ms).tolist()
+        vr_v_traj = self.delete_vr_data(vr_v_traj, vr_data, vaild_idx)
+        return vr_v_traj
+
     def delete_vr_data(self, vr_v_traj: dict, vr_data: dict, vaild_idx: list) -> dict:
         """
         Extract VR data at specified indices and merge into trajectory data.
@@ -187,7 +573,13 @@ class SingleExpDataIntergrate:
             ]
         return traj_data
 
-    def determine_interval(self, traj_data: dict, vr_data: dict, vr_veh_id: str) -> list:
+    def determine_interval(
+        self,
+        traj_data: dict,
+        vr_data: dict,
+        vr_veh_id: str,
+        clock_model: Optional[dict] = None
+    ) -> list:
         """
         Determine the overlapping time interval between VR and trajectory data.
         
@@ -198,6 +590,8 @@ class SingleExpDataIntergrate:
             traj_data: Trajectory data dictionary
             vr_data: VR data dictionary
             vr_veh_id: Vehicle ID of the VR-controlled vehicle
+            clock_model: Optional fitted clock model; if given, the VR range
+                is first mapped onto the trajectory clock
             
         Returns:
             [start_time, end_time] interval in milliseconds
@@ -205,6 +599,8 @@ class SingleExpDataIntergrate:
         # VR data time range
         min_vr_ts = vr_data['TimestampCarla'][0]
         max_vr_ts = vr_data['TimestampCarla'][-1]
+        if clock_model is not None:
+            min_vr_ts, max_vr_ts = vr_to_traj_time([min_vr_ts, max_vr_ts], clock_model)
         
         # Trajectory data time range (convert to milliseconds)
         min_traj_ts = int(traj_data[vr_veh_id]['carla_ts'][0] * 1000)
@@ -221,15 +617,21 @@ class SingleExpDataIntergrate:
         This is the core data integration step that:
         1. Identifies the VR-controlled vehicle
         2. Finds the common time interval
-        3. Trims trajectory data to this interval
-        4. Synchronizes VR data to trajectory timestamps
+        3. Fits the clock offset/drift on the ego samples inside it
+        4. Trims trajectory data to this interval (on the corrected clock
+           if clock_correction is set)
+        5. Optionally resamples all vehicles onto the ego time base
+        6. Synchronizes VR data to trajectory timestamps
         
         Args:
             traj_data_path: Path to trajectory JSON file
             vr_data_path: Path to VR data JSON file
             
         Returns:
-            Dictionary with 'vr_id' and 'all_veh_info' containing aligned data
+            Dictionary with 'vr_id', 'all_veh_info' containing aligned data and
+            'clock_alignment' (see estimate_clock_model; None if the ego
+            positions could not be paired), plus 'aligned'
+            (see build_aligned_tensor) if align_all is set
         """
         traj_data = self.read_json(traj_data_path)
         
@@ -241,16 +643,66 @@ class SingleExpDataIntergrate:
         vr_veh_id = self.find_vr_veh(traj_data)
         print(f"VR vehicle ID: {vr_veh_id}")
         
-        # Determine overlapping time interval
+        # Overlap of the two logs on their own clocks
         interval = self.determine_interval(traj_data, vr_data, vr_veh_id)
         
+        # Fit clock offset and drift on the ego samples inside the overlap,
+        # pairing them on the ego position both logs carry
+        ego = traj_data[vr_veh_id]
+        traj_ts_ms = np.asarray(ego['carla_ts'], dtype=float) * 1000
+        inside = (traj_ts_ms >= interval[0]) & (traj_ts_ms <= interval[1])
+        vr_ts_ms = np.asarray(vr_data['TimestampCarla'], dtype=float)
+        vr_inside = (vr_ts_ms >= interval[0]) & (vr_ts_ms <= interval[1])
+        clock_model = None
+        if 'VehicleLoc' in vr_data.get('EgoVariables', {}):
+            clock_model = estimate_clock_model(
+                traj_ts_ms[inside],
+                np.asarray(ego['location'], dtype=float)[inside] * 100,  # m -> cm
+                vr_ts_ms[vr_inside],
+                np.asarray(vr_data['EgoVariables']['VehicleLoc'], dtype=float)[vr_inside]
+            )
+        if clock_model is None:
+            print("WARNING: could not pair trajectory and VR ego positions, no clock model")
+        else:
+            stats = clock_model['residual_stats']
+            print(
+                f"Clock offset: {clock_model['offset_ms']:.3f}ms, "
+                f"drift: {clock_model['drift_ppm']:.1f}ppm, "
+                f"max residual: {stats['max_abs']:.3f}ms"
+            )
+        active_model = clock_model if self.clock_correction else None
+        
+        # With clock correction the overlap is taken on the corrected clock
+        if active_model is not None:
+            interval = self.determine_interval(traj_data, vr_data, vr_veh_id, active_model)
+        
         # Trim trajectory data to the common interval
         traj_data = self.cut_traj_data(traj_data, interval)
         
-        # Synchronize VR data to trajectory timestamps
-        traj_data[vr_veh_id] = self.filter_ts(traj_data[vr_veh_id], vr_data)
+        # Resample all vehicles before VR-only fields are merged into the ego
+        aligned = None
+        if self.align_all:
+            aligned = build_aligned_tensor(traj_data, vr_veh_id)
         
-        return {'vr_id': vr_veh_id, 'all_veh_info': traj_data}
+        # Synchronize VR data to trajectory timestamps
+        if active_model is not None:
+            traj_data[vr_veh_id] = self.filter_ts_corrected(
+                traj_data[vr_veh_id], vr_data, active_model
+            )
+        else:
+            traj_data[vr_veh_id] = self.filter_ts(traj_data[vr_veh_id], vr_data)
+        
+        if clock_model is not None:
+            clock_model['applied'] = self.clock_correction
+            clock_model['residuals_ms'] = clock_model['residuals_ms'].tolist()
+        result = {
+            'vr_id': vr_veh_id,
+            'all_veh_info': traj_data,
+            'clock_alignment': clock_model,
+        }
+        if aligned is not None:
+            result['aligned'] = aligned_tensor_to_json(aligned)
+        return result
 
     def divide_file_name(self, file_name: str) -> dict:
         """
@@ -277,7 +729,7 @@ class SingleExpDataIntergrate:
         exp_param = [eval(i.strip()) for i in exp_param]  # Convert to numbers
         
         # Map parameter values to named parameters
-        param_name_list = constants.param_dict[exp_type]
+        param_name_list = get_default_constants().param_dict[exp_type]
         exp_param_dict = {
             param_name_list[i]: exp_param[i] 
             for i in range(len(param_name_list))
@@ -318,6 +770,8 @@ class SingleExpDataIntergrate:
             - exp_info: Experiment metadata (type, parameters)
             - vr_id: Vehicle ID of the VR-controlled vehicle
             - all_veh_info: Trajectory data for all vehicles with VR data merged
+            - clock_alignment: Clock offset/drift fit and residuals for QA
+            - aligned: All-vehicle tensor on the ego time base (if align_all)
         """
         # Step 1: Align timestamps between trajectory and VR data
         new_data = self.time_alignment(self.traj_data_path, self.vr_data_path)
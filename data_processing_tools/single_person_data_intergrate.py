@@ -1,6 +1,125 @@
+import errno
 import json
 import os
 import subprocess
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+# Failures worth retrying: lost workers, memory pressure, timeouts and I/O hiccups
+# on (network) storage. Other OSErrors (missing files, permissions, ...) are permanent.
+TRANSIENT_ERRORS = (MemoryError, TimeoutError, BrokenProcessPool)
+TRANSIENT_ERRNOS = {errno.EAGAIN, errno.EIO, errno.ENOSPC, errno.ESTALE, errno.ETIMEDOUT}
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed trial is worth retrying (see TRANSIENT_ERRORS/TRANSIENT_ERRNOS)."""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, OSError) and error.errno in TRANSIENT_ERRNOS
+
+
+def convert_trial(job: Dict[str, str], plot_workers: Optional[int] = None) -> Dict[str, object]:
+    """
+    Run the convert.py pipeline for one trial inside the current process.
+
+    convert (and with it numpy, pandas and matplotlib) is imported on the first
+    call only, so a pool worker pays the import cost once for all its trials.
+
+    Args:
+        job: Dictionary with 'json_file', 'log_file', 'pic_dir', 'output_dir'
+            and 'vr_dir' (the same arguments run_convert passes on the CLI),
+            optionally 'plot_workers' and 'clock_correction' (see convert.main)
+        plot_workers: Plot processes used when the job sets no 'plot_workers'
+            (default: PlotQueue's; 0 renders inline)
+
+    Returns:
+        Dictionary with the job, 'ok', 'error', 'transient', 'traceback'
+        and 'elapsed' (s)
+    """
+    from convert import main as convert_main
+
+    start_t = time.time()
+    result = {'job': job, 'ok': True, 'error': None, 'transient': False,
+              'traceback': None}
+    try:
+        convert_main(
+            job['log_file'],
+            job['json_file'],
+            job['pic_dir'],
+            job['output_dir'],
+            job['vr_dir'],
+            plot_workers=job.get('plot_workers', plot_workers),
+            clock_correction=job.get('clock_correction', False),
+        )
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['transient'] = is_transient(e)
+        result['traceback'] = traceback.format_exc()
+    result['elapsed'] = time.time() - start_t
+    return result
+
+
+def run_convert_batch(
+    jobs: List[Dict[str, str]],
+    max_workers: Optional[int] = None,
+    max_tasks_per_child: Optional[int] = None,
+    on_result: Optional[Callable[[Dict[str, object]], None]] = None,
+) -> List[Dict[str, object]]:
+    """
+    Convert many trials through a process pool instead of one interpreter each.
+
+    Args:
+        jobs: Trial jobs as built by SingleExpDataIntergrate.collect_exp_jobs
+        max_workers: Number of worker processes (default: os.cpu_count());
+            1 runs every job in the calling process. Pool workers render their
+            trial's plots inline unless a job sets 'plot_workers'
+        max_tasks_per_child: Recycle a worker after this many trials to bound
+            memory growth (requires Python >= 3.11)
+        on_result: Optional callback invoked with each result as soon as its
+            trial finishes (in completion order)
+
+    Returns:
+        One result dictionary per job (see convert_trial), in job order
+    """
+    start_t = time.time()
+    results = [None] * len(jobs)
+    if max_workers == 1:
+        for i, job in enumerate(jobs):
+            results[i] = convert_trial(job)
+            if on_result is not None:
+                on_result(results[i])
+    else:
+        pool_kwargs = {'max_workers': max_workers}
+        if max_tasks_per_child is not None:
+            pool_kwargs['max_tasks_per_child'] = max_tasks_per_child
+        with ProcessPoolExecutor(**pool_kwargs) as pool:
+            # The pool already occupies the cores: render each trial's plots inline
+            # rather than giving every worker its own plot pool
+            futures = {pool.submit(convert_trial, job, 0): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool as e:
+                    # the worker died (e.g. killed for memory) before returning
+                    results[i] = {'job': jobs[i], 'ok': False,
+                                  'error': f"{type(e).__name__}: {e}",
+                                  'transient': True, 'traceback': None,
+                                  'elapsed': None}
+                if on_result is not None:
+                    on_result(results[i])
+
+    failed = [r for r in results if not r['ok']]
+    print(f"converted {len(results) - len(failed)}/{len(results)} trials "
+          f"in {time.time() - start_t:.3f}s")
+    for r in failed:
+        print(f"FAILED {r['job']['json_file']}: {r['error']}")
+    return results
+
 
 class SingleExpDataIntergrate():
 
@@ -27,7 +146,18 @@ class SingleExpDataIntergrate():
                          '-j', output_dir,
                          '-v', vr_dir])
 
-    def find_all_exp_data(self):
+    def find_all_exp_data(self, workers=None, max_tasks_per_child=None):
+        # workers=None 保持原来的逐个子进程方式, 否则使用进程池批量转换
+        if workers is not None:
+            return run_convert_batch(
+                self.collect_exp_jobs(), workers, max_tasks_per_child)
+        for job in self.collect_exp_jobs():
+            self.run_convert(job['json_file'], job['log_file'], job['pic_dir'],
+                             job['output_dir'], job['vr_dir'])
+
+    def collect_exp_jobs(self):
+        # 收集该被试所有实验的转换任务
+        jobs = []
         print('person_dir', os.path.basename(self.person_dir))
         # 获取所有单人的实验数据
         all_exp = os.listdir(self.person_dir)
@@ -44,13 +174,22 @@ class SingleExpDataIntergrate():
             # print('exp_data_dir', exp_data_dir)
             # 获取文件夹下的json地址和log地址
             # 忽略.DS_Store
+            if not os.path.isdir(exp_data_dir):
+                continue
             all_files = os.listdir(exp_data_dir)
             if '.DS_Store' in all_files:
                 all_files.remove('.DS_Store')
-            json_file = [os.path.join(exp_data_dir, json_file)
-                         for json_file in all_files if json_file.endswith('.json')][0]
-            log_file = [os.path.join(exp_data_dir, log_file)
-                        for log_file in all_files if log_file.endswith('.txt')][0]
+            json_files = [os.path.join(exp_data_dir, json_file)
+                          for json_file in all_files if json_file.endswith('.json')]
+            log_files = [os.path.join(exp_data_dir, log_file)
+                         for log_file in all_files if log_file.endswith('.txt')]
+            # 不完整的实验文件夹直接跳过, 不再抛出 IndexError
+            if not json_files or not log_files:
+                print(f"WARNING: skipping incomplete trial folder {exp_data_dir} "
+                      f"({len(json_files)} .json, {len(log_files)} .txt)")
+                continue
+            json_file = json_files[0]
+            log_file = log_files[0]
 
             if json_file and log_file:
                 # 总json文件名是jsonfile的文件名
@@ -65,7 +204,12 @@ class SingleExpDataIntergrate():
                 # print('output_dir',output_dir)
                 # print('pic_dir',pic_dir)
                 # print('vr_dir',vr_dir)
-                self.run_convert(json_file, log_file, pic_dir,output_dir,vr_dir)
+                jobs.append({'json_file': json_file,
+                             'log_file': log_file,
+                             'pic_dir': pic_dir,
+                             'output_dir': output_dir,
+                             'vr_dir': vr_dir})
+        return jobs
 
     def create_folder(self, dir_path):
         # print('dir_path',dir_path)
@@ -0,0 +1,144 @@
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+
+# Dense actor tables on the ego time base.
+#
+# The recorder logs every actor with its own timestamps (Actors[id]["Time"], ms), usually
+# less often than the ego frames. actor_tracks resamples all actors onto the ego frame
+# times (TimestampCarla) at once, so later analyses work on (A, T, ...) arrays instead
+# of looping over actors and calling searchsorted per actor:
+#
+#   tracks = actor_tracks(data)
+#   tracks["location"]  # (A, T, 3) cm, NaN where the actor is not present
+#   tracks["present"]   # (A, T) bool, inside the time span the actor was recorded
+#
+# Locations are interpolated linearly, rotations on unwrapped angles (no jumps at
+# +-180 deg). The ego vehicle itself is dropped if it also shows up among the actors.
+#
+# relative_kinematics turns the tracks into (T, A) tables in the ego frame:
+#
+#   kin = relative_kinematics(data, tracks)
+#   kin["longitudinal"], kin["lateral"]  # m, ahead / right of the ego (UE axes)
+#   kin["distance"], kin["relative_speed"], kin["bearing"]
+
+
+def _resample(
+    actor_t: np.ndarray, values: np.ndarray, t: np.ndarray, angles: bool = False
+) -> np.ndarray:
+    order = np.argsort(actor_t, kind="stable")
+    actor_t, values = actor_t[order], np.asarray(values, dtype=float)[order]
+    if angles:
+        values = np.unwrap(values, period=360, axis=0)
+    out = np.stack([np.interp(t, actor_t, values[:, i]) for i in range(values.shape[1])], axis=1)
+    if angles:
+        out = (out + 180) % 360 - 180
+    return out
+
+
+def actor_tracks(
+    data: Dict,
+    ids: Optional[Iterable[Any]] = None,
+    max_gap: Optional[float] = None,
+    exclude_ego: bool = True,
+    ego_radius: float = 100.0,  # cm, an actor this close to the ego all the time is the ego
+    t: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    # {"ids": (A,), "t": (T,) s, "location": (A, T, 3) cm, "rotation": (A, T, 3) deg
+    #  (roll, pitch, yaw as recorded), "present": (A, T)}; max_gap [s] also marks frames between two actor samples that
+    # are further apart than this as not present. t is the ego time base in s
+    # (default: TimestampCarla, which the recording stores in ms)
+    actors = data["Actors"]
+    if t is None:
+        t = np.asarray(data["TimestampCarla"], dtype=float) / 1000
+    t = np.asarray(t, dtype=float)
+    T = len(t)
+    if ids is None:
+        ids = list(actors.keys())
+    ids = [Id for Id in ids if len(actors[Id]["Time"]) > 0]
+    A = len(ids)
+    location = np.full((A, T, 3), np.nan)
+    rotation = np.full((A, T, 3), np.nan)
+    present = np.zeros((A, T), dtype=bool)
+    for a, Id in enumerate(ids):
+        actor_t = np.asarray(actors[Id]["Time"], dtype=float) / 1000
+        inside = (t >= actor_t.min()) & (t <= actor_t.max())
+        if max_gap is not None and len(actor_t) > 1:
+            sorted_t = np.sort(actor_t)
+            nxt = np.clip(np.searchsorted(sorted_t, t), 0, len(sorted_t) - 1)
+            prv = np.clip(nxt - 1, 0, len(sorted_t) - 1)
+            inside &= (sorted_t[nxt] - sorted_t[prv] <= max_gap) | (sorted_t[nxt] == t)
+        if not inside.any():
+            continue
+        present[a] = inside
+        location[a, inside] = _resample(actor_t, actors[Id]["Location"], t[inside])
+        if "Rotation" in actors[Id]:
+            rotation[a, inside] = _resample(actor_t, actors[Id]["Rotation"], t[inside], angles=True)
+
+    if exclude_ego and A > 0:
+        ego = np.asarray(data["EgoVariables"]["VehicleLoc"], dtype=float)
+        dist = np.linalg.norm(location - ego[None], axis=-1)
+        is_ego = present.any(axis=1) & (np.where(present, dist, 0).max(axis=1) < ego_radius)
+        keep = ~is_ego
+        ids = [Id for Id, k in zip(ids, keep) if k]
+        location, rotation, present = location[keep], rotation[keep], present[keep]
+
+    return {
+        "ids": np.array(ids),
+        "t": t,
+        "location": location,
+        "rotation": rotation,
+        "present": present,
+    }
+
+
+def _velocity(location: np.ndarray, t: np.ndarray) -> np.ndarray:
+    # d location / dt along the time axis (axis -2), per presence run: central differences
+    # inside a run, one-sided at its first and last sample, NaN for single-sample runs
+    if len(t) < 2:
+        return np.zeros_like(location)
+    central = np.gradient(location, t, axis=-2)  # NaN next to every absent sample
+    step = np.diff(location, axis=-2) / np.diff(t)[:, None]
+    forward = np.full_like(central, np.nan)
+    backward = np.full_like(central, np.nan)
+    forward[..., :-1, :] = step
+    backward[..., 1:, :] = step
+    one_sided = np.where(np.isnan(forward), backward, forward)
+    return np.where(np.isnan(central), one_sided, central)
+
+
+def relative_kinematics(
+    data: Dict, tracks: Optional[Dict[str, np.ndarray]] = None, t: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    # (T, A) tables of every actor relative to the ego, in the ego (yaw) frame:
+    #   longitudinal [m] (+ ahead), lateral [m] (+ right), distance [m] (3D),
+    #   relative_speed [m/s] (longitudinal speed of the actor minus the ego's),
+    #   lateral_speed [m/s], range_rate [m/s] (d distance / dt) and bearing [deg]
+    #   (0 straight ahead, + to the right); all NaN where the actor is not present
+    if tracks is None:
+        tracks = actor_tracks(data, t=t)
+    t = tracks["t"]
+    ego_loc = np.asarray(data["EgoVariables"]["VehicleLoc"], dtype=float)
+    ego_yaw = np.radians(np.asarray(data["EgoVariables"]["VehicleRot"], dtype=float)[:, 1])
+    loc = np.swapaxes(tracks["location"], 0, 1)  # (T, A, 3)
+    present = tracks["present"].T
+
+    rel = (loc - ego_loc[:, None]) / 100  # cm -> m
+    rel_vel = (np.swapaxes(_velocity(tracks["location"], t), 0, 1) - _velocity(ego_loc, t)[:, None]) / 100
+    cy, sy = np.cos(ego_yaw)[:, None], np.sin(ego_yaw)[:, None]
+    longitudinal = cy * rel[..., 0] + sy * rel[..., 1]
+    lateral = -sy * rel[..., 0] + cy * rel[..., 1]
+    distance = np.linalg.norm(rel, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        range_rate = np.sum(rel * rel_vel, axis=-1) / distance
+    table = {
+        "longitudinal": longitudinal,
+        "lateral": lateral,
+        "distance": distance,
+        "relative_speed": cy * rel_vel[..., 0] + sy * rel_vel[..., 1],
+        "lateral_speed": -sy * rel_vel[..., 0] + cy * rel_vel[..., 1],
+        "range_rate": range_rate,
+        "bearing": np.degrees(np.arctan2(lateral, longitudinal)),
+    }
+    table = {k: np.where(present, v, np.nan) for k, v in table.items()}
+    table.update(ids=tracks["ids"], t=t, present=present)
+    return table
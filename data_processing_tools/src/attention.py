@@ -0,0 +1,128 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+from .gap_filling import find_runs
+
+# Attribution of gaze to the surrounding vehicles (areas of interest) over whole trials.
+#
+# For every frame and every actor (T x A arrays, one vectorised pass) the angle between
+# the world gaze ray (gaze.py) and the direction to the actor (actors.py) is computed,
+# both to the centre of the actor and to its approximate bounding box. An actor is
+# attended in a frame when the gaze ray passes within cone_deg of its box; if several
+# are, the one with the smallest offset (then the nearest) wins:
+#
+#   att = gaze_attention(world_gaze_rays(data), actor_tracks(data))
+#   att["attended"]  # (T,) index into att["ids"], -1 if no vehicle is looked at
+#   attention_summary(att)  # dwell time and glances per actor
+#
+# Boxes are oriented by the actor yaw only (flat highway).
+
+# half length, half width, half height [cm] of a typical passenger car
+VEHICLE_HALF_EXTENT = (240.0, 95.0, 75.0)
+# the recorder stores actor rotations (parser.parse_actor_location_rotation, resampled by
+# actors.actor_tracks) as FQuat::Euler(), ie. (roll, pitch, yaw) [deg]
+ACTOR_YAW = 2
+
+
+def _angle_deg(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # angle between the vectors of a and b (last axis), robust for small angles
+    cross = np.linalg.norm(np.cross(a, b), axis=-1)
+    dot = np.sum(a * b, axis=-1)
+    return np.degrees(np.arctan2(cross, dot))
+
+
+def gaze_attention(
+    rays: Dict[str, Dict[str, np.ndarray]],
+    tracks: Dict[str, np.ndarray],
+    eye: str = "COMBINED",
+    cone_deg: float = 3.0,
+    half_extent: Tuple[float, float, float] = VEHICLE_HALF_EXTENT,
+    max_distance: Optional[float] = None,  # cm, ignore actors further away
+) -> Dict[str, np.ndarray]:
+    # {"ids": (A,), "t": (T,), "offset": (T, A) deg to the actor centre,
+    #  "box_offset": (T, A) deg to the closest box point (0 if the ray hits the box),
+    #  "distance": (T, A) cm, "attended": (T,) actor index or -1}
+    origin = rays[eye]["origin"]  # (T, 3)
+    direction = rays[eye]["dir"]
+    valid = rays[eye]["valid"]
+    loc = np.swapaxes(tracks["location"], 0, 1)  # (T, A, 3)
+    present = tracks["present"].T
+    half = np.asarray(half_extent, dtype=float)
+    centre = loc + np.array([0.0, 0.0, half[2]])  # actor locations are at ground level
+
+    to_centre = centre - origin[:, None]
+    distance = np.linalg.norm(to_centre, axis=-1)
+    d = direction[:, None]  # (T, 1, 3)
+    offset = _angle_deg(d, to_centre)
+
+    # closest box point to the point of the ray that passes closest to the centre,
+    # computed in the (yaw-only) local frame of every actor
+    yaw = np.radians(np.nan_to_num(np.swapaxes(tracks["rotation"], 0, 1)[..., ACTOR_YAW]))
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    along = np.maximum(np.sum(to_centre * d, axis=-1), 0)
+    rel = origin[:, None] + along[..., None] * d - centre  # ray point relative to centre
+    local = np.stack(
+        [cy * rel[..., 0] + sy * rel[..., 1], -sy * rel[..., 0] + cy * rel[..., 1], rel[..., 2]],
+        axis=-1,
+    )
+    clamped = np.clip(local, -half, half)
+    world = np.stack(
+        [cy * clamped[..., 0] - sy * clamped[..., 1], sy * clamped[..., 0] + cy * clamped[..., 1], clamped[..., 2]],
+        axis=-1,
+    )
+    box_point = centre + world
+    box_offset = _angle_deg(d, box_point - origin[:, None])
+    inside = (np.abs(local) <= half).all(axis=-1)  # the ray passes through the box
+    box_offset = np.where(inside, 0.0, box_offset)
+
+    candidate = present & valid[:, None] & (box_offset <= cone_deg)
+    if max_distance is not None:
+        candidate &= distance <= max_distance
+    attended = np.full(len(origin), -1)
+    if loc.shape[1] > 0:
+        # smallest box offset wins, if the ray hits several boxes the nearest one
+        hit = candidate & inside
+        nearest_hit = np.argmin(np.where(hit, distance, np.inf), axis=1)
+        closest = np.argmin(np.where(candidate, box_offset, np.inf), axis=1)
+        attended = np.where(hit.any(axis=1), nearest_hit, closest)
+        attended[~candidate.any(axis=1)] = -1
+    return {
+        "ids": tracks["ids"],
+        "t": tracks["t"],
+        "offset": np.where(present, offset, np.nan),
+        "box_offset": np.where(present, box_offset, np.nan),
+        "distance": np.where(present, distance, np.nan),
+        "attended": attended,
+    }
+
+
+def attention_summary(
+    attention: Dict[str, np.ndarray], min_glance: float = 0.0, merge_gap: float = 0.0
+) -> Dict[Any, Dict[str, float]]:
+    # per actor id: dwell time [s] (all attended frames), number of glances, mean glance
+    # duration [s] and the time of the first glance; glances separated by at most
+    # merge_gap [s] count as one, then glances shorter than min_glance [s] are dropped
+    t = np.asarray(attention["t"], dtype=float)
+    attended = attention["attended"]
+    if not len(t):
+        return {}
+    dt = np.diff(t, append=t[-1] + (np.median(np.diff(t)) if len(t) > 1 else 0.0))
+    summary = {}
+    csum = np.concatenate([[0.0], np.cumsum(dt)])
+    for a, Id in enumerate(attention["ids"]):
+        starts, ends = find_runs(attended == a)
+        dwell = float(dt[attended == a].sum())
+        if len(starts) and merge_gap > 0:
+            gaps = t[starts[1:]] - t[ends[:-1] - 1] - dt[ends[:-1] - 1]
+            keep = np.concatenate([[True], gaps > merge_gap])
+            starts, ends = starts[keep], ends[np.concatenate([keep[1:], [True]])]
+        durations = csum[ends] - csum[starts]
+        long_enough = durations >= min_glance
+        starts, durations = starts[long_enough], durations[long_enough]
+        summary[Id.item() if hasattr(Id, "item") else Id] = {
+            "dwell_time": dwell,
+            "glance_count": int(len(durations)),
+            "mean_glance": float(durations.mean()) if len(durations) else 0.0,
+            "first_glance": float(t[starts[0]]) if len(starts) else float("nan"),
+        }
+    return summary
@@ -0,0 +1,107 @@
+from typing import Optional
+import numpy as np
+
+# Downsampling of long time series for plotting. Both methods return sorted indices
+# into the original samples (always including the first and last one), so the same
+# selection can be applied to the time axis and to every data column.
+#
+#   minmax: split the samples into equal-count buckets and keep the minimum and the
+#           maximum of every bucket. Visual extrema (blinks, braking spikes) survive
+#           exactly, which is what a line plot at screen resolution shows anyway.
+#   lttb:   Largest-Triangle-Three-Buckets, keeps the point of every bucket that spans
+#           the largest triangle with its neighbours. Smoother looking, but extrema are
+#           only approximately preserved.
+
+
+def _as_columns(y: np.ndarray) -> np.ndarray:
+    y = np.asarray(y, dtype=float)
+    return y.reshape(len(y), -1)
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    # y is (n,) or (n, d); with d > 1 the min/max of every column is kept
+    cols = _as_columns(y)
+    n = len(cols)
+    if n_buckets <= 0 or n <= 2 * n_buckets * cols.shape[1] + 2:
+        return np.arange(n)
+    size = int(np.ceil(n / n_buckets))
+    n_buckets = int(np.ceil(n / size))
+    pad = n_buckets * size - n
+    nan = np.isnan(cols)
+    # NaNs never win (unless a whole bucket is NaN, then its first sample is kept)
+    lo = np.pad(np.where(nan, np.inf, cols), ((0, pad), (0, 0)), constant_values=np.inf)
+    hi = np.pad(np.where(nan, -np.inf, cols), ((0, pad), (0, 0)), constant_values=-np.inf)
+    lo = lo.reshape(n_buckets, size, -1)
+    hi = hi.reshape(n_buckets, size, -1)
+    offsets = (np.arange(n_buckets) * size)[:, None]
+    idxs = np.concatenate(
+        [
+            (lo.argmin(axis=1) + offsets).ravel(),
+            (hi.argmax(axis=1) + offsets).ravel(),
+            [0, n - 1],
+        ]
+    )
+    return np.unique(np.minimum(idxs, n - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # bucket edges for the n - 2 inner points, first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    y_filled = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    # mean point of every bucket, used as the third triangle corner (vectorised)
+    csum_x = np.concatenate([[0.0], np.cumsum(x)])
+    csum_y = np.concatenate([[0.0], np.cumsum(y_filled)])
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    mean_x = (csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts
+    mean_y = (csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y_filled[-1])
+
+    out = np.empty(n_out, dtype=int)
+    out[0] = 0
+    a = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], max(edges[b + 1], edges[b] + 1)
+        bx = x[start:stop]
+        by = y_filled[start:stop]
+        # twice the triangle area between the previous pick, candidates and next mean
+        area = np.abs(
+            (x[a] - mean_x[b + 1]) * (by - y_filled[a])
+            - (x[a] - bx) * (mean_y[b + 1] - y_filled[a])
+        )
+        a = start + int(np.argmax(area))
+        out[b + 1] = a
+    out[-1] = n - 1
+    return np.unique(out)
+
+
+def decimation_indices(
+    y: np.ndarray,
+    max_points: Optional[int],
+    x: Optional[np.ndarray] = None,
+    method: str = "minmax",
+) -> np.ndarray:
+    # indices of at most ~max_points samples of y ((n,) or (n, d)), all of them if
+    # max_points is None or the series is already short enough
+    n = len(y)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    if method == "minmax":
+        n_cols = _as_columns(y).shape[1]
+        return minmax_indices(y, max(1, (max_points - 2) // (2 * n_cols)))
+    if method == "lttb":
+        if x is None:
+            x = np.arange(n)
+        cols = _as_columns(y)
+        if cols.shape[1] == 1:
+            return lttb_indices(x, cols[:, 0], max_points)
+        per_col = max(3, max_points // cols.shape[1])
+        return np.unique(
+            np.concatenate([lttb_indices(x, cols[:, i], per_col) for i in range(cols.shape[1])])
+        )
+    raise ValueError(f"unknown decimation method: {method}")
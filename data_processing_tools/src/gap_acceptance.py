@@ -0,0 +1,156 @@
+from typing import Dict, Optional
+import numpy as np
+
+from .attention import VEHICLE_HALF_EXTENT
+from .spatial_index import FrameIndex
+
+# Gaps of the target lane next to the ego, for every frame at once, and which of them
+# the driver accepted.
+#
+# All inputs are in the road frame (lanes.py): s [m] along the road, lanes from
+# LaneGeometry.assign and the speed [m/s] along the road, (A, T) for the other vehicles
+# and (T,) for the ego. The gap next to the ego is bounded by its leader and follower
+# in the target lane (spatial_index.FrameIndex, one searchsorted for all frames):
+#
+#   gaps = adjacent_gaps(s, lateral, lanes, speed, present, ego_s, ego_speed, target_lane)
+#   gaps["lead"], gaps["follow"]          # (T,) vehicle index, -1 for an open gap
+#   gaps["gap_length"], gaps["time_gap"]  # bumper to bumper [m], at the follower's speed [s]
+#
+# Consecutive frames next to the same (lead, follow) pair are one offered gap.
+# gap_episodes labels the gap next to the ego when it crossed into the target lane
+# "accepted", the gaps before it "rejected" (next to the ego for at least min_offer s)
+# or "passed" (driven by faster than that).
+
+VEHICLE_LENGTH = 2 * VEHICLE_HALF_EXTENT[0] / 100  # m
+LABELS = ("accepted", "rejected", "passed")
+
+
+def adjacent_gaps(
+    s: np.ndarray,
+    lateral: np.ndarray,
+    lanes: np.ndarray,
+    speed: np.ndarray,
+    present: np.ndarray,
+    ego_s: np.ndarray,
+    ego_speed: np.ndarray,
+    target_lane,
+    vehicle_length: float = VEHICLE_LENGTH,
+) -> Dict[str, np.ndarray]:
+    # (T,) arrays of the gap in target_lane (int or (T,)) next to the ego:
+    #   lead, follow: vehicle index bounding the gap (-1 if there is none)
+    #   front_gap, rear_gap [m]: ego to leader / follower to ego, bumper to bumper
+    #   gap_length [m]: follower to leader, bumper to bumper (NaN for open gaps)
+    #   time_gap, front_time_gap, rear_time_gap [s]: gaps over the speed of the
+    #     vehicle behind them
+    #   lead_speed, follow_speed [m/s] and lead_rel_speed, follow_rel_speed [m/s]
+    #     relative to the ego (+ faster than the ego)
+    s = np.asarray(s, dtype=float)
+    speed = np.asarray(speed, dtype=float)
+    ego_s = np.asarray(ego_s, dtype=float)
+    ego_speed = np.asarray(ego_speed, dtype=float)
+    T = len(ego_s)
+    frames = np.arange(T)
+    index = FrameIndex(s, lateral, present, lanes)
+    target = np.broadcast_to(np.asarray(target_lane, dtype=int), (T,))
+    lead, lead_dist = index.leader(frames, target, ego_s)
+    follow, follow_dist = index.follower(frames, target, ego_s)
+
+    def at(values: np.ndarray, vehicle: np.ndarray) -> np.ndarray:
+        if not len(values):
+            return np.full(T, np.nan)
+        return np.where(vehicle >= 0, values[np.maximum(vehicle, 0), frames], np.nan)
+
+    lead_speed = at(speed, lead)
+    follow_speed = at(speed, follow)
+    front_gap = lead_dist - vehicle_length
+    rear_gap = follow_dist - vehicle_length
+    gap_length = lead_dist + follow_dist - vehicle_length
+    with np.errstate(invalid="ignore", divide="ignore"):
+        time_gap = gap_length / follow_speed
+        front_time_gap = front_gap / ego_speed
+        rear_time_gap = rear_gap / follow_speed
+    return {
+        "lead": lead,
+        "follow": follow,
+        "front_gap": front_gap,
+        "rear_gap": rear_gap,
+        "gap_length": gap_length,
+        "time_gap": time_gap,
+        "front_time_gap": front_time_gap,
+        "rear_time_gap": rear_time_gap,
+        "lead_speed": lead_speed,
+        "follow_speed": follow_speed,
+        "lead_rel_speed": lead_speed - ego_speed,
+        "follow_rel_speed": follow_speed - ego_speed,
+    }
+
+
+def _segment_reduce(ufunc, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # ufunc over values[starts[k]:ends[k]] of every (non-empty) segment, one reduceat
+    if not len(starts):
+        return np.zeros(0)
+    bounds = np.stack([starts, ends], axis=1).ravel()
+    return ufunc.reduceat(np.append(values, 0.0), bounds)[::2]
+
+
+def gap_episodes(
+    gaps: Dict[str, np.ndarray],
+    t: np.ndarray,
+    offered: Optional[np.ndarray] = None,
+    i_cross: Optional[int] = None,
+    min_offer: float = 0.5,
+) -> Dict[str, np.ndarray]:
+    # one entry per offered gap: consecutive frames (where offered, default all) with
+    # the same (lead, follow) pair. Only frames up to the crossing frame i_cross count;
+    # the gap next to the ego at i_cross is "accepted", the others are "rejected" or
+    # "passed" (shorter than min_offer s). Without a crossing nothing is accepted.
+    t = np.asarray(t, dtype=float)
+    T = len(t)
+    lead, follow = gaps["lead"], gaps["follow"]
+    frame_ok = np.ones(T, dtype=bool) if offered is None else np.asarray(offered, dtype=bool).copy()
+    if i_cross is not None:
+        frame_ok[i_cross] = True  # the ego may already count as in the target lane
+        frame_ok[i_cross + 1 :] = False
+    # a new episode wherever the pair changes or an offered stretch begins
+    key = (lead + 1) * (max(lead.max(initial=0), follow.max(initial=0)) + 2) + follow + 1
+    change = np.ones(T, dtype=bool)
+    change[1:] = (key[1:] != key[:-1]) | ~frame_ok[:-1]
+    starts = np.nonzero(change & frame_ok)[0]
+    # every episode runs to its next change point or the end of its offered stretch
+    stop = np.nonzero(np.append(change[1:] | ~frame_ok[1:], True))[0] + 1
+    ends = stop[np.searchsorted(stop, starts, side="right")] if len(starts) else starts
+
+    dt = np.diff(t, append=t[-1] + (np.median(np.diff(t)) if T > 1 else 0.0)) if T else t
+    duration = _segment_reduce(np.add, dt, starts, ends)
+    finite = {k: np.isfinite(gaps[k]) for k in ("gap_length", "time_gap", "lead_rel_speed", "follow_rel_speed")}
+
+    def mean(k: str) -> np.ndarray:
+        total = _segment_reduce(np.add, np.where(finite[k], gaps[k], 0.0), starts, ends)
+        count = _segment_reduce(np.add, finite[k].astype(float), starts, ends)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def minimum(k: str) -> np.ndarray:
+        out = _segment_reduce(np.fmin, np.where(finite[k], gaps[k], np.inf), starts, ends)
+        return np.where(np.isinf(out), np.nan, out)
+
+    label = np.where(duration >= min_offer, "rejected", "passed").astype(object)
+    if i_cross is not None and len(starts):
+        label[(starts <= i_cross) & (i_cross < ends)] = "accepted"
+    return {
+        "label": label,
+        "lead": lead[starts],
+        "follow": follow[starts],
+        "i_start": starts,
+        "i_end": ends - 1,
+        "t_start": t[starts],
+        "t_end": t[ends - 1] if len(ends) else np.zeros(0),
+        "duration": duration,
+        # the gap as the ego first came alongside it
+        "gap_length": gaps["gap_length"][starts],
+        "time_gap": gaps["time_gap"][starts],
+        "min_gap_length": minimum("gap_length"),
+        "min_time_gap": minimum("time_gap"),
+        "mean_lead_rel_speed": mean("lead_rel_speed"),
+        "mean_follow_rel_speed": mean("follow_rel_speed"),
+    }
@@ -0,0 +1,122 @@
+from typing import Any, Callable, Optional, Tuple, Union
+import numpy as np
+
+# Run-length based filling of invalid samples (blinks, tracker dropouts, ...).
+#
+# The invalid samples are found once (a boolean mask, or a vectorised criteria such as
+# `lambda x: x < 0`), grouped into runs, and every run is filled from the valid samples
+# around it:
+#
+#   linear: linear interpolation between the neighbours of the run
+#   mean:   mean of the two neighbours of the run (constant over the run)
+#   hold:   last valid value before the run (sample-and-hold)
+#   cubic:  cubic Hermite curve through the neighbours, slopes from the samples outside
+#
+# At the edges of the array only one neighbour exists and its value is held, except in
+# mean mode, which fills edge runs with the mean of the valid samples (as utils.fill_gaps
+# always has). Runs longer than max_gap samples are left untouched. (n, d) arrays are
+# filled column-wise.
+#
+#   filled, was_filled = fill_gaps(pupil, lambda x: x < 0, mode="linear", max_gap=60)
+
+MODES = ("linear", "mean", "hold", "cubic")
+
+
+def find_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # [start, end) of every run of True in a 1D mask
+    edges = np.diff(np.concatenate([[0], np.asarray(mask, dtype=np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _fill_column(
+    values: np.ndarray, bad: np.ndarray, mode: str, max_gap: Optional[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(values)
+    out = values.copy()
+    good_idxs = np.flatnonzero(~bad)
+    starts, ends = find_runs(bad)
+    if len(good_idxs) == 0 or len(starts) == 0:
+        return out, np.zeros(n, dtype=bool)
+    lengths = ends - starts
+    fillable = np.ones(len(starts), dtype=bool) if max_gap is None else lengths <= max_gap
+    # run number of every bad sample, and whether it gets filled
+    run_of = np.repeat(np.arange(len(starts)), lengths)
+    bad_idxs = np.flatnonzero(bad)
+    keep = fillable[run_of]
+    run_of, bad_idxs = run_of[keep], bad_idxs[keep]
+    filled = np.zeros(n, dtype=bool)
+    filled[bad_idxs] = True
+    if len(bad_idxs) == 0:
+        return out, filled
+
+    # neighbours of every run, edge runs borrow the only neighbour they have
+    lo = starts - 1
+    hi = ends.copy()
+    lo = np.where(lo < 0, hi, lo)
+    hi = np.where(hi > n - 1, lo, hi)
+    v_lo, v_hi = values[lo], values[hi]
+
+    if mode == "linear":
+        out[bad_idxs] = np.interp(bad_idxs, good_idxs, values[good_idxs])
+    elif mode == "mean":
+        run_mean = np.where(
+            (starts == 0) | (ends == n), values[good_idxs].mean(), (v_lo + v_hi) / 2
+        )
+        out[bad_idxs] = run_mean[run_of]
+    elif mode == "hold":
+        out[bad_idxs] = v_lo[run_of]
+    elif mode == "cubic":
+        # slopes (per sample) from the valid samples just outside the run, if any
+        lo2 = np.maximum(lo - 1, 0)
+        hi2 = np.minimum(hi + 1, n - 1)
+        ok_lo2 = (lo2 < lo) & ~bad[lo2]
+        ok_hi2 = (hi2 > hi) & ~bad[hi2]
+        span = np.maximum(hi - lo, 1)
+        secant = (v_hi - v_lo) / span
+        m_lo = np.where(ok_lo2, v_lo - values[lo2], secant)
+        m_hi = np.where(ok_hi2, values[hi2] - v_hi, secant)
+        s = (bad_idxs - lo[run_of]) / span[run_of]
+        h00 = 2 * s**3 - 3 * s**2 + 1
+        h10 = s**3 - 2 * s**2 + s
+        h01 = -2 * s**3 + 3 * s**2
+        h11 = s**3 - s**2
+        r = run_of
+        out[bad_idxs] = (
+            h00 * v_lo[r]
+            + h10 * span[r] * m_lo[r]
+            + h01 * v_hi[r]
+            + h11 * span[r] * m_hi[r]
+        )
+        at_edge = ((starts == 0) | (ends == n))[run_of]
+        out[bad_idxs[at_edge]] = v_lo[run_of[at_edge]]
+    else:
+        raise ValueError(f"unknown gap filling mode: {mode} (expected one of {MODES})")
+    return out, filled
+
+
+def fill_gaps(
+    arr: np.ndarray,
+    invalid: Union[np.ndarray, Callable[[np.ndarray], Any]],
+    mode: str = "linear",
+    max_gap: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # returns (filled copy of arr, mask of the samples that were filled); invalid is a
+    # boolean mask (shape of arr, or (n,) for all columns) or a vectorised criteria
+    arr = np.asarray(arr)
+    if callable(invalid):
+        bad = np.asarray(invalid(arr), dtype=bool)
+    else:
+        bad = np.asarray(invalid, dtype=bool)
+    n = len(arr)
+    if n == 0:  # eg. a trial without any valid eye samples
+        return arr.astype(float), np.zeros(arr.shape, dtype=bool)
+    values = arr.astype(float).reshape(n, -1)
+    if bad.shape == (n,):
+        bad = np.repeat(bad[:, None], values.shape[1], axis=1)
+    bad = bad.reshape(n, -1) | np.isnan(values)
+    assert bad.shape == values.shape
+    out = np.empty_like(values)
+    filled = np.empty(values.shape, dtype=bool)
+    for j in range(values.shape[1]):
+        out[:, j], filled[:, j] = _fill_column(values[:, j], bad[:, j], mode, max_gap)
+    return out.reshape(arr.shape), filled.reshape(arr.shape)
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, Optional
+import numpy as np
+import os
+
+from .parser import cache_is_fresh, cache_path
+from .rotation import apply, compose, rotator_to_matrix
+
+# World-frame gaze rays for every frame of a recording.
+#
+# The eye tracker reports <eye>GazeOrigin (cm) and <eye>GazeDir in the camera (head)
+# frame. EgoVariables has the camera pose relative to the vehicle (CameraLoc/CameraRot)
+# and the vehicle pose in the world (VehicleLoc/VehicleRot), so
+#
+#   camera_to_world = R(VehicleRot) @ R(CameraRot)
+#   origin_world    = VehicleLoc + R(VehicleRot) @ CameraLoc + camera_to_world @ GazeOrigin
+#   dir_world       = camera_to_world @ normalize(GazeDir)
+#
+# Recordings that already log the absolute camera pose (CameraLocAbs/CameraRotAbs) use
+# it directly. All frames and eyes are transformed in one batched pass; the result of a
+# recording is cached next to its parsed data as <name>.gaze.npz.
+#
+#   rays = world_gaze_rays(data)
+#   rays["COMBINED"]["origin"], rays["COMBINED"]["dir"], rays["COMBINED"]["valid"]
+
+EYES = ("COMBINED", "LEFT", "RIGHT")
+
+
+def camera_pose(data: Dict, dtype=np.float64):
+    # (T, 3) world location [cm] and (T, 3, 3) camera-to-world rotation of the camera
+    ego = data["EgoVariables"]
+    if "CameraLocAbs" in ego and "CameraRotAbs" in ego:
+        loc = np.asarray(ego["CameraLocAbs"], dtype=dtype)
+        return loc, rotator_to_matrix(ego["CameraRotAbs"], dtype=dtype)
+    R_vehicle = rotator_to_matrix(ego["VehicleRot"], dtype=dtype)
+    loc = np.asarray(ego["VehicleLoc"], dtype=dtype) + apply(
+        R_vehicle, np.asarray(ego["CameraLoc"], dtype=dtype)
+    )
+    return loc, compose(R_vehicle, rotator_to_matrix(ego["CameraRot"], dtype=dtype))
+
+
+def world_gaze_rays(
+    data: Dict, eyes: Iterable[str] = EYES, dtype=np.float64
+) -> Dict[str, Dict[str, np.ndarray]]:
+    # {eye: {"origin": (T, 3) cm, "dir": (T, 3) unit vectors, "valid": (T,)}} in world
+    # coordinates; dir is NaN where the tracker reported no direction
+    eye_data = data["EyeTracker"]
+    eyes = [eye for eye in eyes if f"{eye}GazeDir" in eye_data]
+    cam_loc, cam_R = camera_pose(data, dtype)
+    dirs = np.stack([np.asarray(eye_data[f"{eye}GazeDir"], dtype=dtype) for eye in eyes])
+    origins = np.stack(
+        [
+            np.asarray(eye_data.get(f"{eye}GazeOrigin", np.zeros(dirs.shape[1:])), dtype=dtype)
+            for eye in eyes
+        ]
+    )  # (E, T, 3)
+    norms = np.linalg.norm(dirs, axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dirs = np.where(norms > 0, dirs / norms, np.nan)
+    # one einsum for all eyes, the (T, 3, 3) rotations broadcast over the eye axis
+    world_dirs = apply(cam_R, dirs)
+    world_origins = cam_loc + apply(cam_R, origins)
+    rays = {}
+    for i, eye in enumerate(eyes):
+        valid = np.isfinite(world_dirs[i]).all(axis=1)
+        if f"{eye}GazeValid" in eye_data:
+            valid &= np.asarray(eye_data[f"{eye}GazeValid"], dtype=bool)
+        rays[eye] = {"origin": world_origins[i], "dir": world_dirs[i], "valid": valid}
+    return rays
+
+
+def gaze_cache_path(filename: str) -> str:
+    # same naming as the parsed cache (parser.cache_path) of the recording
+    return cache_path(filename, ".gaze.npz")
+
+
+def save_gaze_rays(rays: Dict[str, Dict[str, np.ndarray]], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    arrays = {f"{eye}/{k}": v for eye, ray in rays.items() for k, v in ray.items()}
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_gaze_rays(path: str) -> Dict[str, Dict[str, np.ndarray]]:
+    rays: Dict[str, Dict[str, np.ndarray]] = {}
+    with np.load(path) as npz:
+        for key in npz.files:
+            eye, k = key.split("/", 1)
+            rays.setdefault(eye, {})[k] = npz[key]
+    return rays
+
+
+def cached_world_gaze_rays(
+    data: Dict, filename: str, force_reload: Optional[bool] = False
+) -> Dict[str, Dict[str, np.ndarray]]:
+    # world_gaze_rays of a recording, reusing its .gaze.npz if it is newer than the
+    # recording and matches the data
+    path = gaze_cache_path(filename)
+    if force_reload is False and cache_is_fresh(path, filename):
+        rays = load_gaze_rays(path)
+        n = len(data["TimestampCarla"])
+        if rays and all(len(ray["dir"]) == n for ray in rays.values()):
+            return rays
+    rays = world_gaze_rays(data)
+    save_gaze_rays(rays, path)
+    return rays
@@ -0,0 +1,156 @@
+from typing import Dict, Optional
+import numpy as np
+
+from .gap_filling import find_runs
+from .smoothing import savgol
+
+# Lane-change events of one vehicle from its lateral position, lateral velocity and
+# heading in the road frame (lanes.py), all frames in one vectorised pass.
+#
+#   lane, offset = geometry.assign(location)
+#   events = detect_lane_changes(t, lateral, lane, heading)
+#   events["kind"]     # "complete" or "aborted"
+#   events["t_start"], events["t_cross"], events["t_end"], events["from_lane"], events["to_lane"]
+#
+# A manoeuvre is a run of frames in which the vehicle moves sideways in one direction:
+# lateral speed above lateral_speed [m/s] or heading towards that side by more than
+# heading_deg. Every change of the assigned lane inside such a run is a lane change:
+#
+#   t_start  start of the run (or the previous crossing of the same run)
+#   t_cross  the lateral position passes the boundary between the two lanes
+#              (interpolated between frames)
+#   t_end    end of the run (or the next crossing of the same run)
+#
+# A run without a lane change that still brings the vehicle more than abort_offset [m]
+# from its lane centre towards the boundary is an aborted attempt (t_cross is NaN and
+# to_lane the lane it was heading for). Lanes are numbered from the left, so direction
+# +1 is a change to the right.
+
+def lateral_velocity(t: np.ndarray, lateral: np.ndarray, window: int = 9) -> np.ndarray:
+    # d lateral / dt [m/s] from a Savitzky-Golay derivative on the (median) frame rate
+    t = np.asarray(t, dtype=float)
+    if len(t) < 2:
+        return np.zeros(len(t))
+    dt = float(np.median(np.diff(t)))
+    return savgol(lateral, window, polyorder=2, deriv=1, delta=dt)
+
+
+def _crossing(t: np.ndarray, lateral: np.ndarray, boundary: np.ndarray, i: np.ndarray):
+    # (first frame past the boundary, interpolated crossing time) of every lane switch;
+    # searches back from the frames i at which the assigned lane switched, since the
+    # hysteresis of the assignment delays the switch past the boundary
+    n = len(t)
+    side = np.sign(np.nan_to_num(lateral[:, None] - boundary[None]))  # (T, E)
+    after = side[i, np.arange(len(i))]
+    # last frame before i that is still on the other side of the boundary
+    before = (side != after[None]) & (np.arange(n)[:, None] < i[None])
+    j = np.where(before.any(axis=0), n - 1 - np.argmax(before[::-1], axis=0), i - 1)
+    j = np.clip(j, 0, n - 2)
+    y0, y1 = lateral[j], lateral[j + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.clip((boundary - y0) / (y1 - y0), 0, 1)
+    return j + 1, t[j] + np.nan_to_num(frac, nan=1.0) * (t[j + 1] - t[j])
+
+
+def _segment_max(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # max of values[starts[k]:ends[k]] for every (non-empty) segment, one reduceat
+    if not len(starts):
+        return np.zeros(0)
+    bounds = np.stack([starts, ends], axis=1).ravel()
+    return np.maximum.reduceat(np.append(values, -np.inf), bounds)[::2]
+
+
+def detect_lane_changes(
+    t: np.ndarray,
+    lateral: np.ndarray,
+    lane: np.ndarray,
+    heading: Optional[np.ndarray] = None,
+    lane_centres: Optional[np.ndarray] = None,
+    lane_width: float = 3.75,
+    lateral_speed: float = 0.2,
+    heading_deg: float = 1.0,
+    abort_offset: float = 0.8,
+    window: int = 9,
+) -> Dict[str, np.ndarray]:
+    # t (T,) s, lateral (T,) m (+ right), lane (T,) from LaneGeometry.assign, heading
+    # (T,) deg relative to the road (+ right, optional); lane_centres [m] are needed to
+    # place the boundaries (default: c0 = 0 and lane_width spacing from lane 0)
+    t = np.asarray(t, dtype=float)
+    lateral = np.asarray(lateral, dtype=float)
+    lane = np.asarray(lane, dtype=int)
+    n = len(t)
+    if lane_centres is None:
+        lane_centres = lane_width * np.arange(max(int(lane.max()) + 1, 1) if n else 1)
+    lane_centres = np.asarray(lane_centres, dtype=float)
+    v = lateral_velocity(t, lateral, window)
+
+    # sideways motion to the right (+1) and to the left (-1)
+    moving = {d: np.nan_to_num(d * v) > lateral_speed for d in (1, -1)}
+    if heading is not None:
+        h = np.nan_to_num(np.asarray(heading, dtype=float))
+        for d in moving:
+            moving[d] |= d * h > heading_deg
+
+    # lane switches between two valid lanes
+    switch = np.nonzero((lane[1:] != lane[:-1]) & (lane[1:] >= 0) & (lane[:-1] >= 0))[0] + 1
+    from_lane, to_lane = lane[switch - 1], lane[switch]
+    direction = np.sign(to_lane - from_lane)
+    last = len(lane_centres) - 1
+    boundary = 0.5 * (lane_centres[np.clip(from_lane, 0, last)] + lane_centres[np.clip(to_lane, 0, last)])
+    i, t_cross = _crossing(t, lateral, boundary, switch) if len(switch) else (switch, np.zeros(0))
+
+    # the motion run around every crossing, in its direction
+    run_start, run_end = i.copy(), i.copy()
+    in_run = np.zeros(len(i), dtype=bool)
+    runs = {}
+    for d in (1, -1):
+        starts, ends = runs[d] = find_runs(moving[d])
+        sel = np.nonzero(direction == d)[0]
+        if not len(starts) or not len(sel):
+            continue
+        k = np.maximum(np.searchsorted(starts, i[sel], side="right") - 1, 0)
+        hit = (starts[k] <= i[sel]) & (i[sel] < ends[k])
+        run_start[sel] = np.where(hit, starts[k], i[sel])
+        run_end[sel] = np.where(hit, ends[k] - 1, i[sel])
+        in_run[sel] = hit
+    # several crossings of one run (changing two lanes at once) split it between them
+    if len(i) > 1:
+        same = (run_start[1:] == run_start[:-1]) & (direction[1:] == direction[:-1])
+        run_start[1:] = np.where(same, i[:-1], run_start[1:])
+        run_end[:-1] = np.where(same, i[1:], run_end[:-1])
+
+    # runs without a crossing that still got far from the lane centre: aborted attempts
+    excursion = np.where(lane >= 0, lateral - lane_centres[np.clip(lane, 0, last)], np.nan)
+    crossings = np.concatenate([[0], np.cumsum(np.bincount(i, minlength=n)[:n])])
+    a_start, a_end, a_dir = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    for d, (starts, ends) in runs.items():
+        if not len(starts):
+            continue
+        no_cross = crossings[ends] == crossings[starts]
+        peak = _segment_max(np.nan_to_num(d * excursion, nan=-np.inf), starts, ends)
+        keep = no_cross & (peak >= abort_offset)
+        a_start.append(starts[keep])
+        a_end.append(ends[keep] - 1)
+        a_dir.append(np.full(int(keep.sum()), d))
+    a_start, a_end, a_dir = (np.concatenate(a) for a in (a_start, a_end, a_dir))
+    a_from = lane[a_start]
+
+    i_start = np.concatenate([run_start, a_start]).astype(int)
+    i_end = np.concatenate([run_end, a_end]).astype(int)
+    events = {
+        "kind": np.array(["complete"] * len(i) + ["aborted"] * len(a_start), dtype=object),
+        "direction": np.concatenate([direction, a_dir]).astype(int),
+        "from_lane": np.concatenate([from_lane, a_from]).astype(int),
+        "to_lane": np.concatenate([to_lane, a_from + a_dir]).astype(int),
+        "i_start": i_start,
+        "i_cross": np.concatenate([i, np.full(len(a_start), -1)]).astype(int),
+        "i_end": i_end,
+        "t_start": t[i_start],
+        "t_cross": np.concatenate([t_cross, np.full(len(a_start), np.nan)]),
+        "t_end": t[i_end],
+        # False: the lane changed without a detected sideways motion (slow drift)
+        "in_motion": np.concatenate([in_run, np.ones(len(a_start), dtype=bool)]),
+        "peak_lateral_speed": _segment_max(np.abs(np.nan_to_num(v)), i_start, i_end + 1),
+    }
+    order = np.argsort(events["t_start"], kind="stable")
+    return {k: col[order] for k, col in events.items()}
@@ -0,0 +1,217 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import os
+
+from .parser import cache_is_fresh, cache_path
+
+# Lane assignment for every sample of every vehicle of a trial.
+#
+# A LaneGeometry is a straight road: a reference point and heading, the lateral offsets
+# of the lane centres (m, positive to the right of the driving direction, UE y axis) and
+# the lane width. Lanes are numbered 0.. from the left of the driving direction. The
+# geometry either comes from the optional "lane_geometry" section of the scenario config
+#
+#   "lane_geometry": {"origin": [x, y], "heading_deg": 0.0, "lane_width": 3.75,
+#                     "lane_centres": [-3.75, 0.0, 3.75]}       (origin in cm)
+#
+# or is fitted to the recorded positions (LaneGeometry.fit): the heading is the circular
+# mean of the direction of travel of all vehicles (without the steps of lane changes)
+# and the lane centres the circular mean of the lateral positions modulo the lane width.
+#
+# assign() maps (..., T, 3) locations to (lane, offset from the lane centre [m]) in one
+# vectorised pass. Near a lane boundary (within hysteresis m) the previous lane is kept,
+# so vehicles driving on a marking don't flicker between lanes. Samples outside all
+# lanes get lane -1.
+
+LANE_WIDTH = 3.75  # m, per brief_introduction.md of scenario 1
+
+
+def _circular_mean(angles: np.ndarray, weights: Optional[np.ndarray] = None) -> float:
+    if weights is None:
+        weights = np.ones_like(angles)
+    return float(np.arctan2(np.sum(weights * np.sin(angles)), np.sum(weights * np.cos(angles))))
+
+
+class LaneGeometry:
+    def __init__(
+        self,
+        origin: np.ndarray,
+        heading: float,
+        lane_centres: np.ndarray,
+        lane_width: float = LANE_WIDTH,
+    ):
+        # origin [cm] (xy), heading [rad] of the driving direction, lane centres [m]
+        self.origin = np.asarray(origin, dtype=float)[:2]
+        self.heading = float(heading)
+        self.direction = np.array([np.cos(heading), np.sin(heading)])
+        self.lane_centres = np.sort(np.asarray(lane_centres, dtype=float))
+        self.lane_width = float(lane_width)
+
+    def __repr__(self) -> str:
+        return (
+            f"LaneGeometry(heading={np.degrees(self.heading):.2f}deg, "
+            f"lane_centres={np.round(self.lane_centres, 2).tolist()}, lane_width={self.lane_width})"
+        )
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional["LaneGeometry"]:
+        # the "lane_geometry" section of a scenario config (or the section itself);
+        # None if the config has none
+        if config is None:
+            return None
+        section = config.get("lane_geometry", config)
+        if "lane_centres" not in section:
+            return None
+        return cls(
+            origin=section.get("origin", (0.0, 0.0)),
+            heading=np.radians(section.get("heading_deg", 0.0)),
+            lane_centres=section["lane_centres"],
+            lane_width=section.get("lane_width", LANE_WIDTH),
+        )
+
+    @classmethod
+    def fit(
+        cls,
+        ego_loc: np.ndarray,
+        locations: Optional[np.ndarray] = None,
+        lane_width: float = LANE_WIDTH,
+        n_lanes: int = 3,
+    ) -> "LaneGeometry":
+        # ego_loc (T, 3) cm; locations (A, T, 3) cm of the other vehicles (optional)
+        ego_xy = np.asarray(ego_loc, dtype=float)[:, :2]
+        step = np.diff(ego_xy, axis=0)
+        if locations is not None:
+            # the other vehicles mostly keep their lane, which pins the road direction
+            step = np.concatenate(
+                [step, np.diff(np.asarray(locations, dtype=float)[..., :2], axis=-2).reshape(-1, 2)]
+            )
+        step = step[np.isfinite(step).all(axis=1)]
+        length = np.linalg.norm(step, axis=1)
+        angle = np.arctan2(step[:, 1], step[:, 0])
+        heading = _circular_mean(angle, length)
+        # drop the steps of lane changes (the more oblique half) and average again
+        deviation = np.abs(np.angle(np.exp(1j * (angle - heading))))
+        straight = (deviation <= np.median(deviation[length > 0])) & (length > 0)
+        heading = _circular_mean(angle[straight], length[straight])
+        origin = ego_xy[0]
+        geometry = cls(origin, heading, [0.0], lane_width)
+
+        xy = ego_xy
+        if locations is not None:
+            xy = np.concatenate([xy, np.asarray(locations, dtype=float)[..., :2].reshape(-1, 2)])
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        _, lateral = geometry.to_road_frame(xy)
+        # same direction traffic only: close to the ego's lateral range
+        _, ego_lateral = geometry.to_road_frame(ego_xy)
+        near = np.abs(lateral - np.median(ego_lateral)) < n_lanes * lane_width
+        phase = _circular_mean(2 * np.pi * lateral[near] / lane_width)
+        centre0 = phase / (2 * np.pi) * lane_width
+        # lanes covering the ego's lateral range, completed to n_lanes around it
+        lo = np.floor((np.percentile(ego_lateral, 1) - centre0) / lane_width + 0.5)
+        hi = np.floor((np.percentile(ego_lateral, 99) - centre0) / lane_width + 0.5)
+        extra = max(0, n_lanes - int(hi - lo + 1))
+        occupied = np.round((lateral[near] - centre0) / lane_width)
+        # extend towards the side where the other vehicles drive
+        left = np.sum(occupied < lo)
+        right = np.sum(occupied > hi)
+        n_left = min(extra, int(round(extra * left / max(left + right, 1))))
+        first = lo - n_left
+        last = hi + (extra - n_left)
+        geometry.lane_centres = centre0 + lane_width * np.arange(first, last + 1)
+        return geometry
+
+    def to_road_frame(self, location: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (s, lateral) [m] of (..., 2) or (..., 3) locations [cm]
+        rel = (np.asarray(location, dtype=float)[..., :2] - self.origin) / 100
+        d = self.direction
+        return rel[..., 0] * d[0] + rel[..., 1] * d[1], -rel[..., 0] * d[1] + rel[..., 1] * d[0]
+
+    def assign(
+        self, location: np.ndarray, hysteresis: float = 0.3
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # (lane, offset [m]) for (..., T, 3) locations, time along the second last axis;
+        # offset is positive to the right of the lane centre
+        _, lateral = self.to_road_frame(location)
+        w = self.lane_width
+        c0 = self.lane_centres[0]
+        n = len(self.lane_centres)
+        finite = np.isfinite(lateral)
+        pos = np.where(finite, (lateral - c0) / w, 0.0)
+        nearest = np.floor(pos + 0.5)
+        on_road = finite & (nearest >= 0) & (nearest < n)
+        # only samples clearly inside a lane decide, the others keep the previous lane
+        margin = 0.5 - hysteresis / w
+        decided = on_road & (np.abs(pos - nearest) <= margin)
+        T = lateral.shape[-1]
+        idx = np.where(decided, np.arange(T), -1)
+        last = np.maximum.accumulate(idx, axis=-1)
+        held = np.take_along_axis(nearest, np.maximum(last, 0), axis=-1)
+        lane = np.where(last >= 0, held, nearest)
+        lane = np.where(on_road, lane, -1).astype(int)
+        offset = np.where(lane >= 0, lateral - (c0 + w * np.maximum(lane, 0)), np.nan)
+        return lane, offset
+
+
+def lane_cache_path(filename: str) -> str:
+    # same naming as the parsed cache (parser.cache_path) of the recording
+    return cache_path(filename, ".lanes.npz")
+
+
+def assign_lanes(
+    data: Dict,
+    tracks: Dict[str, np.ndarray],
+    geometry: Optional[LaneGeometry] = None,
+    hysteresis: float = 0.3,
+) -> Dict[str, np.ndarray]:
+    # lanes of the ego (T,) and of all tracked actors (A, T), fitting the geometry to the
+    # trial if none is given
+    ego_loc = np.asarray(data["EgoVariables"]["VehicleLoc"], dtype=float)
+    if geometry is None:
+        geometry = LaneGeometry.fit(ego_loc, tracks["location"])
+    ego_lane, ego_offset = geometry.assign(ego_loc[None], hysteresis)
+    lane, offset = geometry.assign(tracks["location"], hysteresis)
+    lane[~tracks["present"]] = -1
+    return {
+        "ids": tracks["ids"],
+        "ego_lane": ego_lane[0],
+        "ego_offset": ego_offset[0],
+        "lane": lane,
+        "offset": np.where(tracks["present"], offset, np.nan),
+        "origin": geometry.origin,
+        "heading": np.array(geometry.heading),
+        "lane_centres": geometry.lane_centres,
+        "lane_width": np.array(geometry.lane_width),
+    }
+
+
+def cached_lane_assignment(
+    data: Dict,
+    filename: str,
+    tracks: Dict[str, np.ndarray],
+    geometry: Optional[LaneGeometry] = None,
+    force_reload: Optional[bool] = False,
+) -> Dict[str, np.ndarray]:
+    # assign_lanes of a recording, reusing its .lanes.npz if it is newer than the
+    # recording and matches the data and the given geometry
+    path = lane_cache_path(filename)
+    if force_reload is False and cache_is_fresh(path, filename):
+        with np.load(path) as npz:
+            lanes = {k: npz[k] for k in npz.files}
+        same_geometry = geometry is None or (
+            np.allclose(lanes["origin"], geometry.origin)
+            and np.isclose(lanes["heading"], geometry.heading)
+            and np.array_equal(lanes["lane_centres"], geometry.lane_centres)
+            and np.isclose(lanes["lane_width"], geometry.lane_width)
+        )
+        if (
+            same_geometry
+            and lanes["lane"].shape == tracks["present"].shape
+            and np.array_equal(lanes["ids"], tracks["ids"])
+        ):
+            return lanes
+    lanes = assign_lanes(data, tracks, geometry)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **lanes)
+    os.replace(tmp_path, path)
+    return lanes
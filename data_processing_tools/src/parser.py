@@ -1,26 +1,32 @@
+import hashlib
 import os
 from typing import Dict, List, Any, Optional
 import time
-import sys
 import pickle
 
-# allow us to import from this current directory
-parser_dir: str = "/".join(__file__.split("/")[:-1])
-sys.path.insert(1, parser_dir)
-
-from utils import (
-    process_UE4_string_to_value,
-    convert_to_np,
-    convert_standalone_dict_to_list,
-    get_filename_from_path,
-    cleanup_data_line,
-)
+try:
+    from .utils import (
+        process_UE4_string_to_value,
+        convert_to_np,
+        convert_standalone_dict_to_list,
+        get_filename_from_path,
+        cleanup_data_line,
+    )
+except ImportError:  # imported as a top-level module from this directory
+    from utils import (
+        process_UE4_string_to_value,
+        convert_to_np,
+        convert_standalone_dict_to_list,
+        get_filename_from_path,
+        cleanup_data_line,
+    )
 import numpy as np
 
+parser_dir: str = os.path.dirname(os.path.abspath(__file__))
+
 # used as the dictionary key when the data has no explicit title (ie. included as raw array)
 _no_title_key: str = "data_single"  # data with this key will be converted to a raw list
-cache_dir: str = os.path.join(parser_dir, "cache")
-os.makedirs(cache_dir, exist_ok=True)
+cache_dir: str = os.path.join(parser_dir, "cache")  # created on first cache_data()
 
 
 def parse_data_line(data_line: str, t: float, working_map: dict) -> dict:
@@ -298,26 +304,38 @@ def parse_file(
     return data
 
 
-def try_load_data(filename: str) -> Optional[Dict[str, Any]]:
-    # actual_name: str = get_filename_from_path(filename)
-    # print(f"Trying to load data from {actual_name}")
+def cache_path(filename: str, suffix: str = ".pkl") -> str:
+    # <cache_dir>/<name>-<hash of the absolute path><suffix>: every trial's recording is
+    # called recording.txt, so the name alone would share one cache between all of them
     actual_name: str = os.path.basename(filename).replace(".txt", "")
-    filename = f"{os.path.join(cache_dir, actual_name)}.pkl"
+    key: str = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()[:10]
+    return f"{os.path.join(cache_dir, actual_name)}-{key}{suffix}"
+
+
+def cache_is_fresh(cached: str, filename: str) -> bool:
+    # a cache is stale once the file it was made from has been rewritten
+    if not os.path.exists(cached):
+        return False
+    return not os.path.exists(filename) or os.path.getmtime(cached) >= os.path.getmtime(filename)
+
+
+def try_load_data(filename: str) -> Optional[Dict[str, Any]]:
+    cached: str = cache_path(filename)
     data = None
-    if os.path.exists(filename):
-        with open(filename, "rb") as f:
+    if cache_is_fresh(cached, filename):
+        with open(cached, "rb") as f:
             data = pickle.load(f)
-        print(f"Loaded data from {filename}")
+        print(f"Loaded data from {cached}")
     else:
-        print(f"Did not find data at {filename}")
+        print(f"Did not find up-to-date data at {cached}")
     return data
 
 
 def cache_data(data: Dict[str, Any], filename: str) -> None:
-    # actual_name: str = get_filename_from_path(filename)
-    actual_name: str = os.path.basename(filename).replace(".txt", "")
     os.makedirs(cache_dir, exist_ok=True)
-    filename = f"{os.path.join(cache_dir, actual_name)}.pkl"
-    with open(filename, "wb") as filehandler:
+    cached: str = cache_path(filename)
+    tmp: str = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as filehandler:
         pickle.dump(data, filehandler)
-    print(f"cached data to {filename}")
+    os.replace(tmp, cached)  # readers never see a half-written cache
+    print(f"cached data to {cached}")
@@ -0,0 +1,149 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+import os
+import shutil
+import tempfile
+
+# Renders visualizer plots in a pool of worker processes so that figures are drawn
+# off the critical path (and in parallel) instead of one after the other.
+#
+#   plots = PlotQueue(results_dir, max_workers=4)
+#   plots.submit(plot_versus, data_x=t, data_y=y, name_y="Throttle")
+#   ...
+#   plots.close()  # wait for all figures
+#
+# A job is a module-level plotting function plus its arguments. Large arrays are
+# written once to .npy files in a spill directory and opened memory-mapped by the
+# workers, so they are neither pickled per job nor copied into every worker.
+# Jobs that write the same figure file should not be in flight at the same time.
+#
+# A job whose figure is already up to date (visualizer.is_call_cached) is dropped in
+# submit(), before anything is spilled, and the pool is only started for the first job
+# that has to be drawn, so a fully cached re-run starts no worker processes at all.
+
+
+class ArrayRef:
+    # stand-in for an array that was spilled to disk
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> np.ndarray:
+        return np.load(self.path, mmap_mode="r")
+
+
+def _resolve(value: Any) -> Any:
+    if isinstance(value, ArrayRef):
+        return value.load()
+    if isinstance(value, tuple):  # e.g. the idxs tuple returned by np.where
+        return tuple(_resolve(v) for v in value)
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return value
+
+
+def _init_worker(results_dir: str) -> None:
+    from .visualizer import set_results_dir
+
+    set_results_dir(results_dir)
+
+
+def _render(fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> None:
+    fn(*_resolve(args), **{k: _resolve(v) for k, v in kwargs.items()})
+
+
+class PlotQueue:
+    def __init__(
+        self,
+        results_dir: str,
+        max_workers: Optional[int] = None,
+        spill_bytes: int = 1 << 16,  # arrays at least this large go through .npy files
+    ):
+        # max_workers=0 renders synchronously in this process (no pool, no spilling)
+        if max_workers is None:
+            max_workers = min(4, os.cpu_count() or 1)
+        self.results_dir = results_dir
+        self.max_workers = max_workers
+        self.spill_bytes = spill_bytes
+        self.futures: List[Tuple[str, Future]] = []
+        self.spilled: Dict[int, Tuple[np.ndarray, ArrayRef]] = {}
+        self.spill_dir: Optional[str] = None
+        self.executor: Optional[ProcessPoolExecutor] = None  # started on the first job
+        self.n_cached = 0  # jobs skipped because their figure is up to date
+        if max_workers == 0:
+            _init_worker(results_dir)
+
+    def _spill(self, value: Any) -> Any:
+        if isinstance(value, tuple):
+            return tuple(self._spill(v) for v in value)
+        if isinstance(value, list):
+            return [self._spill(v) for v in value]
+        if not isinstance(value, np.ndarray) or value.nbytes < self.spill_bytes:
+            return value
+        if value.dtype == object:
+            return value
+        key = id(value)
+        if key not in self.spilled:  # the same array (e.g. time) is shared by many plots
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="plot_queue_")
+            path = os.path.join(self.spill_dir, f"{len(self.spilled)}.npy")
+            np.save(path, value)
+            # keep a reference so the id can't be reused by another array
+            self.spilled[key] = (value, ArrayRef(path))
+        return self.spilled[key][1]
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Optional[Future]:
+        if self.max_workers == 0:
+            fn(*args, **kwargs)  # checks the plot cache itself
+            return None
+        from .visualizer import is_call_cached
+
+        if is_call_cached(fn, args, kwargs, self.results_dir):
+            self.n_cached += 1
+            return None
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.results_dir,),
+            )
+        future = self.executor.submit(
+            _render,
+            fn,
+            self._spill(args),
+            {k: self._spill(v) for k, v in kwargs.items()},
+        )
+        self.futures.append((fn.__name__, future))
+        return future
+
+    def close(self, raise_errors: bool = True) -> None:
+        # wait for every figure, then re-raise the first failure (if any)
+        errors = []
+        try:
+            for name, future in self.futures:
+                if future.cancelled():
+                    continue
+                e = future.exception()
+                if e is not None:
+                    print(f"WARNING: {name} failed: {type(e).__name__}: {e}")
+                    errors.append(e)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+            self.spilled.clear()
+            self.futures = []
+        if errors and raise_errors:
+            raise errors[0]
+
+    def __enter__(self) -> "PlotQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            for _, future in self.futures:
+                future.cancel()
+        self.close(raise_errors=exc_type is None)
@@ -0,0 +1,191 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import os
+
+from .parser import cache_path
+
+# Multi-resolution summaries of a time series for fast windowed statistics.
+#
+# Level k of a SummaryPyramid holds min, max, sum and count (of non-NaN samples) of
+# consecutive 2^k-sample buckets, so the whole pyramid is ~2n values per statistic.
+# Any sample range is covered by at most 2 buckets per level, which makes a [t0, t1]
+# query O(log n) without touching the raw samples:
+#
+#   pyr = SummaryPyramid(pupil_diameter, t)
+#   pyr.query(12.0, 48.5)  # {"min": .., "max": .., "mean": .., "sum": .., "count": ..}
+#   pyr.overview(0, 300, n_bins=200)  # per-bin summaries for a zoomed plot
+#
+# The pyramids of a recording are saved next to its parsed cache (see parser.py) as
+# <name>.pyramid.npz and can be queried without loading the recording again.
+
+STATS = ("min", "max", "sum", "count")
+
+# channel path in the parsed data -> samples that are invalid and ignored
+DEFAULT_CHANNELS: Dict[str, Optional[str]] = {
+    "EyeTracker/LEFTPupilDiameter": "negative",
+    "EyeTracker/RIGHTPupilDiameter": "negative",
+    "EyeTracker/LEFTEyeOpenness": "negative",
+    "EyeTracker/RIGHTEyeOpenness": "negative",
+    "EgoVariables/VehicleVel": None,
+    "UserInputs/Steering": None,
+    "UserInputs/Throttle": None,
+    "UserInputs/Brake": None,
+}
+
+
+def _combine(a: np.ndarray, b: np.ndarray, stat: str) -> np.ndarray:
+    if stat == "min":
+        return np.minimum(a, b)
+    if stat == "max":
+        return np.maximum(a, b)
+    return a + b
+
+
+class SummaryPyramid:
+    def __init__(self, values: np.ndarray, t: np.ndarray, valid: Optional[np.ndarray] = None):
+        values = np.asarray(values, dtype=float).ravel()
+        t = np.asarray(t, dtype=float).ravel()
+        assert values.shape == t.shape
+        assert len(t) < 2 or (np.diff(t) >= 0).all()  # time must be sorted
+        ok = ~np.isnan(values)
+        if valid is not None:
+            ok &= np.asarray(valid, dtype=bool)
+        self.t = t
+        level0 = {
+            "min": np.where(ok, values, np.inf),
+            "max": np.where(ok, values, -np.inf),
+            "sum": np.where(ok, values, 0.0),
+            "count": ok.astype(np.int64),
+        }
+        self.levels: List[Dict[str, np.ndarray]] = [level0]
+        while len(self.levels[-1]["count"]) > 1:
+            prev = self.levels[-1]
+            m = len(prev["count"])
+            level = {}
+            for stat in STATS:
+                arr = prev[stat]
+                if m % 2 == 1:  # pad with the identity of the statistic
+                    identity = {"min": np.inf, "max": -np.inf}.get(stat, 0)
+                    arr = np.append(arr, np.array(identity, dtype=arr.dtype))
+                level[stat] = _combine(arr[0::2], arr[1::2], stat)
+            self.levels.append(level)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def query_index(self, i0: int, i1: int) -> Dict[str, float]:
+        # summary of samples [i0, i1)
+        i0 = max(int(i0), 0)
+        i1 = min(int(i1), len(self))
+        acc = {"min": np.inf, "max": -np.inf, "sum": 0.0, "count": 0}
+        k = 0
+        while i0 < i1:
+            level = self.levels[k]
+            if i0 & 1:
+                for stat in STATS:
+                    acc[stat] = _combine(acc[stat], level[stat][i0], stat)
+                i0 += 1
+            if i1 & 1:
+                i1 -= 1
+                for stat in STATS:
+                    acc[stat] = _combine(acc[stat], level[stat][i1], stat)
+            i0 >>= 1
+            i1 >>= 1
+            k += 1
+        count = int(acc["count"])
+        if count == 0:
+            return {"min": np.nan, "max": np.nan, "mean": np.nan, "sum": 0.0, "count": 0}
+        return {
+            "min": float(acc["min"]),
+            "max": float(acc["max"]),
+            "mean": float(acc["sum"]) / count,
+            "sum": float(acc["sum"]),
+            "count": count,
+        }
+
+    def query(self, t0: float, t1: float) -> Dict[str, float]:
+        # summary of samples with t0 <= t <= t1
+        i0 = np.searchsorted(self.t, t0, side="left")
+        i1 = np.searchsorted(self.t, t1, side="right")
+        return self.query_index(i0, i1)
+
+    def overview(self, t0: float, t1: float, n_bins: int) -> Dict[str, np.ndarray]:
+        # per-bin summaries of [t0, t1] split into n_bins equal time bins
+        edges = np.linspace(t0, t1, n_bins + 1)
+        idxs = np.searchsorted(self.t, edges, side="left")
+        idxs[-1] = np.searchsorted(self.t, t1, side="right")
+        rows = [self.query_index(idxs[i], idxs[i + 1]) for i in range(n_bins)]
+        out = {k: np.array([r[k] for r in rows]) for k in ("min", "max", "mean", "count")}
+        out["t"] = (edges[:-1] + edges[1:]) / 2
+        return out
+
+    def to_arrays(self, prefix: str = "") -> Dict[str, np.ndarray]:
+        arrays = {f"{prefix}t": self.t}
+        for k, level in enumerate(self.levels):
+            for stat in STATS:
+                arrays[f"{prefix}L{k}/{stat}"] = level[stat]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str = "") -> "SummaryPyramid":
+        pyr = cls.__new__(cls)
+        pyr.t = arrays[f"{prefix}t"]
+        pyr.levels = []
+        k = 0
+        while f"{prefix}L{k}/count" in arrays:
+            pyr.levels.append({stat: arrays[f"{prefix}L{k}/{stat}"] for stat in STATS})
+            k += 1
+        return pyr
+
+
+def _get_channel(data: Dict, path: str) -> Optional[np.ndarray]:
+    node = data
+    for key in path.split("/"):
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return np.asarray(node)
+
+
+def build_pyramids(
+    data: Dict,
+    channels: Optional[Dict[str, Optional[str]]] = None,
+    t: Optional[np.ndarray] = None,
+) -> Dict[str, SummaryPyramid]:
+    # one pyramid per (1D) channel of parsed recording data, on the simulator clock in s
+    if channels is None:
+        channels = DEFAULT_CHANNELS
+    if t is None:
+        t = np.asarray(data["TimestampCarla"], dtype=float) / 1000
+    pyramids = {}
+    for path, invalid in channels.items():
+        values = _get_channel(data, path)
+        if values is None or values.ndim != 1 or len(values) != len(t):
+            continue
+        valid = values >= 0 if invalid == "negative" else None
+        pyramids[path] = SummaryPyramid(values, t, valid)
+    return pyramids
+
+
+def pyramid_cache_path(filename: str) -> str:
+    # same naming as the parsed cache (parser.cache_path) of the recording
+    return cache_path(filename, ".pyramid.npz")
+
+
+def save_pyramids(pyramids: Dict[str, SummaryPyramid], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    arrays = {}
+    for name, pyr in pyramids.items():
+        arrays.update(pyr.to_arrays(prefix=f"{name}:"))
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_pyramids(path: str, channels: Optional[Iterable[str]] = None) -> Dict[str, SummaryPyramid]:
+    with np.load(path) as npz:
+        names = sorted({key.split(":", 1)[0] for key in npz.files})
+        if channels is not None:
+            names = [name for name in names if name in set(channels)]
+        arrays = {key: npz[key] for key in npz.files if key.split(":", 1)[0] in names}
+    return {name: SummaryPyramid.from_arrays(arrays, prefix=f"{name}:") for name in names}
@@ -0,0 +1,187 @@
+from typing import Optional
+import numpy as np
+import time
+
+# Batched rotations in the Unreal Engine convention, for whole trials at once.
+#
+# Rotators are (..., 3) arrays of (pitch, yaw, roll) as recorded by DReyeVR (degrees
+# unless degrees=False). The matrix of a rotator maps local vectors to world vectors,
+# world = R @ local, and matches FRotator::RotateVector():
+#
+#   R = Rz(yaw) @ Ry(-pitch) @ Rx(-roll)    (UE is left-handed, pitch up is positive)
+#
+# so its columns are the forward (X), right (Y) and up (Z) axes of the rotated frame.
+# Quaternions are (..., 4) arrays (x, y, z, w) like FQuat. Everything broadcasts over
+# leading dimensions and is applied with einsum/matmul, without Python loops:
+#
+#   R = rotator_to_matrix(data["EgoVariables"]["VehicleRot"])  # (n, 3, 3)
+#   world_dirs = apply(R, local_dirs)                          # (n, 3)
+#   cam_to_world = compose(R_vehicle, R_camera)                # camera, then vehicle
+#
+# Pass dtype=np.float32 to halve the memory traffic when single precision is enough.
+# `python -m src.rotation` runs a small throughput benchmark.
+
+
+def _angles(rot: np.ndarray, degrees: bool, dtype) -> np.ndarray:
+    rot = np.asarray(rot, dtype=dtype)
+    assert rot.shape[-1] == 3, "rotators are (..., 3) arrays of (pitch, yaw, roll)"
+    return np.deg2rad(rot) if degrees else rot
+
+
+def rotator_to_matrix(rot: np.ndarray, degrees: bool = True, dtype=np.float64) -> np.ndarray:
+    p, y, r = np.moveaxis(_angles(rot, degrees, dtype), -1, 0)
+    CP, SP = np.cos(p), np.sin(p)
+    CY, SY = np.cos(y), np.sin(y)
+    CR, SR = np.cos(r), np.sin(r)
+    R = np.empty(p.shape + (3, 3), dtype=dtype)
+    R[..., 0, 0] = CP * CY
+    R[..., 1, 0] = CP * SY
+    R[..., 2, 0] = SP
+    R[..., 0, 1] = SR * SP * CY - CR * SY
+    R[..., 1, 1] = SR * SP * SY + CR * CY
+    R[..., 2, 1] = -SR * CP
+    R[..., 0, 2] = -(CR * SP * CY + SR * SY)
+    R[..., 1, 2] = CY * SR - CR * SP * SY
+    R[..., 2, 2] = CR * CP
+    return R
+
+
+def matrix_to_rotator(R: np.ndarray, degrees: bool = True) -> np.ndarray:
+    R = np.asarray(R)
+    pitch = np.arctan2(R[..., 2, 0], np.hypot(R[..., 0, 0], R[..., 1, 0]))
+    yaw = np.arctan2(R[..., 1, 0], R[..., 0, 0])
+    roll = np.arctan2(-R[..., 2, 1], R[..., 2, 2])
+    rot = np.stack([pitch, yaw, roll], axis=-1)
+    return np.rad2deg(rot) if degrees else rot
+
+
+def forward_vector(rot: np.ndarray, degrees: bool = True, dtype=np.float64) -> np.ndarray:
+    # FRotator::Vector(), the X axis of the rotated frame (roll has no effect)
+    p, y, _ = np.moveaxis(_angles(rot, degrees, dtype), -1, 0)
+    CP = np.cos(p)
+    return np.stack([CP * np.cos(y), CP * np.sin(y), np.sin(p)], axis=-1)
+
+
+def apply(R: np.ndarray, vec: np.ndarray) -> np.ndarray:
+    # R @ vec for every leading index (either side may be a single matrix/vector)
+    return np.einsum("...ij,...j->...i", R, vec)
+
+
+def apply_inverse(R: np.ndarray, vec: np.ndarray) -> np.ndarray:
+    # R^T @ vec, ie. world vectors into the rotated (local) frame
+    return np.einsum("...ji,...j->...i", R, vec)
+
+
+def inverse(R: np.ndarray) -> np.ndarray:
+    return np.swapaxes(R, -1, -2)
+
+
+def compose(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    # rotation that applies inner first, then outer (eg. child frame -> parent -> world);
+    # batched matmul is ~3x faster than the equivalent einsum for stacks of 3x3 matrices
+    return np.matmul(outer, inner)
+
+
+def rotate_vector(vec: np.ndarray, rot: np.ndarray, degrees: bool = True, dtype=np.float64) -> np.ndarray:
+    # FRotator::RotateVector()
+    return apply(rotator_to_matrix(rot, degrees, dtype), np.asarray(vec, dtype=dtype))
+
+
+def unrotate_vector(vec: np.ndarray, rot: np.ndarray, degrees: bool = True, dtype=np.float64) -> np.ndarray:
+    # FRotator::UnrotateVector()
+    return apply_inverse(rotator_to_matrix(rot, degrees, dtype), np.asarray(vec, dtype=dtype))
+
+
+def matrix_to_quat(R: np.ndarray) -> np.ndarray:
+    # branch-free variant of Shepperd's method: take the best conditioned of the four
+    # candidate solutions for every matrix
+    R = np.asarray(R)
+    m00, m11, m22 = R[..., 0, 0], R[..., 1, 1], R[..., 2, 2]
+    candidates = np.stack(
+        [
+            np.stack([1 + m00 - m11 - m22, R[..., 1, 0] + R[..., 0, 1], R[..., 0, 2] + R[..., 2, 0], R[..., 2, 1] - R[..., 1, 2]], -1),
+            np.stack([R[..., 1, 0] + R[..., 0, 1], 1 - m00 + m11 - m22, R[..., 2, 1] + R[..., 1, 2], R[..., 0, 2] - R[..., 2, 0]], -1),
+            np.stack([R[..., 0, 2] + R[..., 2, 0], R[..., 2, 1] + R[..., 1, 2], 1 - m00 - m11 + m22, R[..., 1, 0] - R[..., 0, 1]], -1),
+            np.stack([R[..., 2, 1] - R[..., 1, 2], R[..., 0, 2] - R[..., 2, 0], R[..., 1, 0] - R[..., 0, 1], 1 + m00 + m11 + m22], -1),
+        ],
+        axis=-2,
+    )  # (..., 4 candidates, xyzw)
+    best = np.argmax(np.stack([m00 - m11 - m22, m11 - m00 - m22, m22 - m00 - m11, m00 + m11 + m22], -1), axis=-1)
+    q = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.where(q[..., 3:] < 0, -q, q)  # w >= 0
+
+
+def quat_to_matrix(q: np.ndarray) -> np.ndarray:
+    q = np.asarray(q)
+    x, y, z, w = np.moveaxis(q / np.linalg.norm(q, axis=-1, keepdims=True), -1, 0)
+    R = np.empty(x.shape + (3, 3), dtype=q.dtype)
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - z * w)
+    R[..., 0, 2] = 2 * (x * z + y * w)
+    R[..., 1, 0] = 2 * (x * y + z * w)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - x * w)
+    R[..., 2, 0] = 2 * (x * z - y * w)
+    R[..., 2, 1] = 2 * (y * z + x * w)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def rotator_to_quat(rot: np.ndarray, degrees: bool = True, dtype=np.float64) -> np.ndarray:
+    return matrix_to_quat(rotator_to_matrix(rot, degrees, dtype))
+
+
+def quat_to_rotator(q: np.ndarray, degrees: bool = True) -> np.ndarray:
+    return matrix_to_rotator(quat_to_matrix(q), degrees)
+
+
+def quat_conjugate(q: np.ndarray) -> np.ndarray:
+    return np.asarray(q) * np.array([-1, -1, -1, 1], dtype=np.asarray(q).dtype)
+
+
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Hamilton product, the rotation that applies b first, then a (like compose)
+    a, b = np.asarray(a), np.asarray(b)
+    av, aw = a[..., :3], a[..., 3:]
+    bv, bw = b[..., :3], b[..., 3:]
+    v = aw * bv + bw * av + np.cross(av, bv)
+    w = aw * bw - np.sum(av * bv, axis=-1, keepdims=True)
+    return np.concatenate([v, w], axis=-1)
+
+
+def quat_apply(q: np.ndarray, vec: np.ndarray) -> np.ndarray:
+    # v' = v + 2w (u x v) + 2 u x (u x v), for unit quaternions q = (u, w)
+    q = np.asarray(q)
+    u, w = q[..., :3], q[..., 3:]
+    t = 2 * np.cross(u, vec)
+    return vec + w * t + np.cross(u, t)
+
+
+def _timed(fn) -> float:
+    start_t = time.perf_counter()
+    fn()
+    return time.perf_counter() - start_t
+
+
+def _benchmark(n: int = 1_000_000, repeats: int = 5, seed: Optional[int] = 0) -> None:
+    rng = np.random.default_rng(seed)
+    for dtype in (np.float64, np.float32):
+        rot = rng.uniform(-180, 180, (n, 3)).astype(dtype)
+        vec = rng.normal(size=(n, 3)).astype(dtype)
+        R = rotator_to_matrix(rot, dtype=dtype)
+        q = matrix_to_quat(R)
+        cases = {
+            "rotator_to_matrix": lambda: rotator_to_matrix(rot, dtype=dtype),
+            "apply": lambda: apply(R, vec),
+            "compose": lambda: compose(R, R),
+            "matrix_to_quat": lambda: matrix_to_quat(R),
+            "quat_apply": lambda: quat_apply(q, vec),
+        }
+        for name, fn in cases.items():
+            best = min(_timed(fn) for _ in range(repeats))
+            print(f"{np.dtype(dtype).name:>8} {name:<20} {n / best / 1e6:8.1f} M rotations/s")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,188 @@
+from typing import Dict, Optional
+import numpy as np
+import warnings
+
+from .gap_filling import fill_gaps
+
+# Smoothing filters for (n,) or (n, d) arrays, all columns in one call.
+#
+#   moving_average: centred boxcar from a cumulative sum, O(n) for any window
+#   ema:            exponential moving average, O(n) in blocks of closed-form cumsums
+#   savgol:         Savitzky-Golay (local polynomial) filter, also for derivatives
+#   median:         centred running median, robust to spikes
+#
+# Edges are handled explicitly: moving_average and median shrink the window at the
+# ends of the array (no zero padding as with np.convolve(mode="same")) and savgol fits
+# its polynomial to the first/last full window. NaNs are gaps: moving_average, ema and
+# median ignore them, savgol interpolates across them. With keep_nan the samples that
+# were NaN stay NaN in the output.
+
+
+def _as_columns(arr: np.ndarray) -> np.ndarray:
+    arr = np.asarray(arr, dtype=float)
+    return arr.reshape(len(arr), -1)
+
+
+def _window_bounds(n: int, window: int):
+    # [lo, hi) of the centred window around every sample, clipped to the array
+    lo = np.arange(n) - (window - 1) // 2
+    return np.clip(lo, 0, n), np.clip(lo + window, 0, n)
+
+
+def moving_average(arr: np.ndarray, window: int, keep_nan: bool = False) -> np.ndarray:
+    cols = _as_columns(arr)
+    n = len(cols)
+    valid = ~np.isnan(cols)
+    csum = np.zeros((n + 1, cols.shape[1]))
+    ccount = np.zeros((n + 1, cols.shape[1]))
+    np.cumsum(np.where(valid, cols, 0.0), axis=0, out=csum[1:])
+    np.cumsum(valid, axis=0, out=ccount[1:])
+    lo, hi = _window_bounds(n, window)
+    counts = ccount[hi] - ccount[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (csum[hi] - csum[lo]) / counts  # NaN where the whole window is NaN
+    if keep_nan:
+        out[~valid] = np.nan
+    return out.reshape(np.shape(arr))
+
+
+def ema(
+    arr: np.ndarray,
+    alpha: Optional[float] = None,
+    span: Optional[float] = None,
+    keep_nan: bool = False,
+) -> np.ndarray:
+    # y[i] = weighted mean of the valid x[j <= i] with weights (1 - alpha)^(i - j)
+    if alpha is None:
+        assert span is not None, "either alpha or span is needed"
+        alpha = 2 / (span + 1)
+    assert 0 < alpha <= 1
+    cols = _as_columns(arr)
+    n = len(cols)
+    valid = ~np.isnan(cols)
+    x = np.where(valid, cols, 0.0)
+    decay = 1 - alpha
+    if decay == 0:
+        out = np.where(valid, cols, np.nan)
+        return out.reshape(np.shape(arr))
+    # inside a block the recursion is a cumsum with weights decay^-k; the block length
+    # keeps these weights (and the rounding error) below ~1e8
+    block = max(1, int(np.log(1e8) / -np.log(decay)))
+    num = np.zeros(cols.shape)
+    den = np.zeros(cols.shape)
+    carry_num = np.zeros(cols.shape[1])
+    carry_den = np.zeros(cols.shape[1])
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        k = np.arange(stop - start)[:, None]
+        w = decay ** -k
+        grow = decay ** (k + 1)
+        num[start:stop] = grow * carry_num + decay ** k * np.cumsum(w * x[start:stop], axis=0)
+        den[start:stop] = grow * carry_den + decay ** k * np.cumsum(w * valid[start:stop], axis=0)
+        carry_num, carry_den = num[stop - 1], den[stop - 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = num / den  # NaN until the first valid sample
+    if keep_nan:
+        out[~valid] = np.nan
+    return out.reshape(np.shape(arr))
+
+
+def savgol_coeffs(window: int, polyorder: int, deriv: int = 0, pos: Optional[int] = None) -> np.ndarray:
+    # weights of the window samples that give the derivative of the fitted polynomial
+    # at sample pos of the window (default: the centre)
+    assert window % 2 == 1 and polyorder < window
+    if pos is None:
+        pos = window // 2
+    x = np.arange(window) - pos
+    A = np.vander(x, polyorder + 1, increasing=True)
+    # the deriv-th coefficient of the fit, times deriv!
+    return np.linalg.pinv(A)[deriv] * np.prod(np.arange(1, deriv + 1))
+
+
+def savgol(
+    arr: np.ndarray,
+    window: int,
+    polyorder: int = 2,
+    deriv: int = 0,
+    delta: float = 1.0,
+    keep_nan: bool = False,
+) -> np.ndarray:
+    cols = _as_columns(arr)
+    n = len(cols)
+    nan = np.isnan(cols)
+    if nan.any():
+        cols, _ = fill_gaps(cols, nan, mode="linear")
+    window = min(window, n if n % 2 == 1 else n - 1)
+    if window <= polyorder:
+        out = cols.copy() if deriv == 0 else np.zeros_like(cols)
+    else:
+        half = window // 2
+        out = np.empty_like(cols)
+        # interior: every full window dotted with the centre coefficients
+        windows = np.lib.stride_tricks.sliding_window_view(cols, window, axis=0)
+        out[half : n - half] = windows @ savgol_coeffs(window, polyorder, deriv)
+        # edges: evaluate the polynomial fitted to the first/last full window
+        for i in range(half):
+            out[i] = savgol_coeffs(window, polyorder, deriv, pos=i) @ cols[:window]
+            out[n - 1 - i] = savgol_coeffs(window, polyorder, deriv, pos=window - 1 - i) @ cols[n - window :]
+    out = out / delta**deriv
+    if keep_nan:
+        out[nan] = np.nan
+    return out.reshape(np.shape(arr))
+
+
+def median(arr: np.ndarray, window: int, keep_nan: bool = False) -> np.ndarray:
+    cols = _as_columns(arr)
+    n = len(cols)
+    before = (window - 1) // 2
+    after = window - 1 - before
+    # NaN padding shrinks the window at the edges, since nanmedian ignores it
+    padded = np.pad(cols, ((before, after), (0, 0)), constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+    if n >= window and not np.isnan(cols).any():
+        # nanmedian is much slower, so only the (shrunken) edge windows use it
+        out = np.empty_like(cols)
+        out[before : n - after] = np.median(windows[before : n - after], axis=-1)
+        out[:before] = np.nanmedian(windows[:before], axis=-1)
+        out[n - after :] = np.nanmedian(windows[n - after :], axis=-1)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN windows
+            out = np.nanmedian(windows, axis=-1)
+    if keep_nan:
+        out[np.isnan(cols)] = np.nan
+    return out.reshape(np.shape(arr))
+
+
+FILTERS = {
+    "moving_average": moving_average,
+    "ema": ema,
+    "savgol": savgol,
+    "median": median,
+}
+
+
+def smooth(arr: np.ndarray, method: str = "moving_average", **kwargs) -> np.ndarray:
+    if method not in FILTERS:
+        raise ValueError(f"unknown smoothing method: {method} (expected one of {list(FILTERS)})")
+    return FILTERS[method](arr, **kwargs)
+
+
+def smooth_channels(
+    channels: Dict[str, np.ndarray], method: str = "moving_average", **kwargs
+) -> Dict[str, np.ndarray]:
+    # smooths many channels of a trial with the same filter; channels of equal length
+    # are stacked into one (n, d) array and filtered in a single call
+    by_length: Dict[int, list] = {}
+    for name, arr in channels.items():
+        by_length.setdefault(len(arr), []).append(name)
+    out = {}
+    for names in by_length.values():
+        stacked = np.concatenate([_as_columns(channels[name]) for name in names], axis=1)
+        smoothed = smooth(stacked, method, **kwargs)
+        col = 0
+        for name in names:
+            width = _as_columns(channels[name]).shape[1]
+            out[name] = smoothed[:, col : col + width].reshape(np.shape(channels[name]))
+            col += width
+    return {name: out[name] for name in channels}
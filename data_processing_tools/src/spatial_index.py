@@ -0,0 +1,136 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from .lanes import LANE_WIDTH, LaneGeometry
+
+# Per-frame spatial index over all actors of a trial, for leader/follower and radius
+# queries on every frame at once.
+#
+# Positions are expressed in the road frame of a lanes.LaneGeometry (s, longitudinal,
+# and lateral offset, in m). Every present (actor, frame) sample is stored once, sorted
+# by (frame, lane, s), so the vehicle ahead of / behind any position in any lane of any
+# frame is a single searchsorted over all queries:
+#
+#   index = FrameIndex.from_tracks(actor_tracks(data), geometry)
+#   ahead, gap = index.leader(frames, lanes, s)     # actor index (-1 if none), gap [m]
+#   behind, gap = index.follower(frames, lanes, s)
+#   near = index.within_radius(frames, xy, 50)     # (Q, A) bool
+#
+# Lanes come from lane assignment (LaneGeometry.assign) when available, otherwise the
+# lateral offset is rounded to lane_width strips centred on the road axis (lateral 0
+# is a lane centre, eg. the ego's starting lane of a fitted geometry).
+
+
+class FrameIndex:
+    def __init__(
+        self,
+        s: np.ndarray,
+        lateral: np.ndarray,
+        present: np.ndarray,
+        lanes: Optional[np.ndarray] = None,
+        lane_width: float = LANE_WIDTH,
+    ):
+        # s, lateral [m], present and lanes are (A, T) arrays
+        present = np.asarray(present, dtype=bool) & np.isfinite(s)
+        if lanes is None:
+            lanes = np.round(np.nan_to_num(lateral) / lane_width).astype(int)
+        else:
+            lanes = np.asarray(lanes)
+            present &= lanes >= 0  # -1: not on any lane
+        self.n_actors, self.n_frames = present.shape
+        self.ids = np.arange(self.n_actors)  # actor ids, from_tracks uses the recorded ones
+        self.s = s
+        self.lateral = lateral
+        self.present = present
+        self.lanes = lanes
+        actor, frame = np.nonzero(present)
+        lane = lanes[actor, frame].astype(int)
+        self.lane_min = int(lane.min()) if len(lane) else 0
+        self.n_lanes = int(lane.max()) - self.lane_min + 1 if len(lane) else 1
+        s_flat = s[actor, frame]
+        self.s_min = float(s_flat.min()) if len(s_flat) else 0.0
+        # one sortable key: group (frame, lane) major, s minor
+        self.span = (float(s_flat.max()) - self.s_min if len(s_flat) else 0.0) + 1.0
+        group = frame * self.n_lanes + (lane - self.lane_min)
+        keys = group * self.span + (s_flat - self.s_min)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.groups = group[order]
+        self.actor = actor[order]
+        self.s_sorted = s_flat[order]
+
+    @classmethod
+    def from_tracks(
+        cls,
+        tracks: Dict[str, np.ndarray],
+        geometry: LaneGeometry,
+        lanes: Optional[np.ndarray] = None,
+        hysteresis: float = 0.3,
+    ) -> "FrameIndex":
+        # lanes default to geometry.assign of the tracks
+        s, lateral = geometry.to_road_frame(tracks["location"])
+        if lanes is None:
+            lanes, _ = geometry.assign(tracks["location"], hysteresis)
+        index = cls(s, lateral, tracks["present"], lanes, geometry.lane_width)
+        index.ids = tracks["ids"]
+        return index
+
+    def _query(self, frames, lanes, s) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        frames, lanes, s = np.broadcast_arrays(
+            np.asarray(frames, dtype=int), np.asarray(lanes, dtype=int), np.asarray(s, dtype=float)
+        )
+        lane_ok = (lanes >= self.lane_min) & (lanes < self.lane_min + self.n_lanes)
+        group = frames * self.n_lanes + np.clip(lanes - self.lane_min, 0, self.n_lanes - 1)
+        keys = group * self.span + np.clip(s - self.s_min, -0.5, self.span - 0.5)
+        return group, keys, lane_ok
+
+    def leader(self, frames, lanes, s) -> Tuple[np.ndarray, np.ndarray]:
+        # nearest actor strictly ahead of s in the same frame and lane: (actor, gap [m])
+        group, keys, lane_ok = self._query(frames, lanes, s)
+        pos = np.searchsorted(self.keys, keys, side="right")
+        pos_c = np.clip(pos, 0, max(len(self.keys) - 1, 0))
+        found = lane_ok & (pos < len(self.keys))
+        if len(self.keys):
+            found &= self.groups[pos_c] == group
+        return self._result(found, pos_c, np.asarray(s, dtype=float), ahead=True)
+
+    def follower(self, frames, lanes, s) -> Tuple[np.ndarray, np.ndarray]:
+        # nearest actor strictly behind s in the same frame and lane: (actor, gap [m])
+        group, keys, lane_ok = self._query(frames, lanes, s)
+        pos = np.searchsorted(self.keys, keys, side="left") - 1
+        pos_c = np.maximum(pos, 0)
+        found = lane_ok & (pos >= 0)
+        if len(self.keys):
+            found &= self.groups[pos_c] == group
+        return self._result(found, pos_c, np.asarray(s, dtype=float), ahead=False)
+
+    def _result(self, found, pos, s, ahead: bool) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self.keys):
+            return np.full(found.shape, -1), np.full(found.shape, np.nan)
+        actor = np.where(found, self.actor[pos], -1)
+        gap = (self.s_sorted[pos] - s) if ahead else (s - self.s_sorted[pos])
+        return actor, np.where(found, gap, np.nan)
+
+    def within_radius(self, frames, xy: np.ndarray, radius: float) -> np.ndarray:
+        # (Q, A) mask of the actors within radius [m] of the road-frame points xy =
+        # (s, lateral) [m] at the given frames
+        frames = np.asarray(frames, dtype=int)
+        xy = np.asarray(xy, dtype=float)
+        ds = self.s[:, frames].T - xy[..., 0:1]
+        dl = self.lateral[:, frames].T - xy[..., 1:2]
+        with np.errstate(invalid="ignore"):
+            return self.present[:, frames].T & (ds**2 + dl**2 <= radius**2)
+
+    def neighbours(self, s: np.ndarray, lanes: np.ndarray, lane_offset: int = 0) -> Dict[str, np.ndarray]:
+        # leader and follower of a vehicle (eg. the ego) for every frame, in its own lane
+        # or lane_offset lanes next to it; s and lanes are (T,) arrays
+        frames = np.arange(self.n_frames)
+        target = np.asarray(lanes) + lane_offset
+        leader, lead_gap = self.leader(frames, target, s)
+        follower, follow_gap = self.follower(frames, target, s)
+        return {
+            "leader": leader,
+            "leader_gap": lead_gap,
+            "follower": follower,
+            "follower_gap": follow_gap,
+        }
@@ -1,9 +1,11 @@
-from typing import Callable, Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple, TYPE_CHECKING
 import numpy as np
-import pandas as pd
 import time
 import os
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def get_filename_from_path(path: str) -> str:
     # TODO: use something more platform independent?
@@ -127,88 +129,40 @@ def normalize(arr: np.ndarray, axis=1) -> np.ndarray:
     return arr
 
 
-def VectorFromRotator(arr: np.ndarray) -> np.ndarray:
+def _rotation_module():
+    try:
+        from . import rotation
+    except ImportError:  # imported as a top-level module from this directory
+        import rotation
+    return rotation
+
+
+def VectorFromRotator(arr: np.ndarray, degrees: bool = True) -> np.ndarray:
     # implementing FRotator::Vector()
     n = len(arr)
     assert arr.shape == (n, 3)
-    # note this FRotator holds degrees as (pitch, yaw, roll)
-    pitch: np.ndarray = arr[:, 0]
-    yaw: np.ndarray = arr[:, 1]
-    roll: np.ndarray = arr[:, 2]  # not needed
-    CP = np.cos(pitch)
-    SP = np.sin(pitch)
-    CY = np.cos(yaw)
-    SY = np.sin(yaw)
-    vec = np.array([CP * CY, CP * SY, SP]).T
+    # note this FRotator holds degrees as (pitch, yaw, roll), roll is not needed
+    vec = _rotation_module().forward_vector(arr, degrees=degrees)
     assert vec.shape == (n, 3)
     return vec
 
 
 def RotateVector(
-    vec: np.ndarray, rot: np.ndarray, rot_order: str = "PYR"
+    vec: np.ndarray, rot: np.ndarray, rot_order: str = "PYR", degrees: bool = True
 ) -> np.ndarray:
     # implementing FRotator::RotateVector()
     # https://docs.unrealengine.com/4.27/en-US/API/Runtime/Core/Math/FRotator/RotateVector/
     n = len(vec)
     assert vec.shape == (n, 3)
-    assert rot.shape == (n, 3)  # rotator is in degrees
-    # rotmat = np.zeros((n, 3, 3)) # creating rotation matrices
+    assert rot.shape == (n, 3)  # rotator is in degrees (unless degrees=False)
     # using default rotation order as (Pitch, Yaw, Roll) as per:
     # https://github.com/EpicGames/UnrealEngine/blob/d9d435c9c280b99a6c679b517adedd3f4b02cfd7/Engine/Source/Runtime/Core/Public/Math/Rotator.h#L769-L772
 
     assert len(rot_order) == 3
     assert "".join(sorted(rot_order)).lower() == "pry"
-    pitch, yaw, roll = None, None, None
-    for i, c in enumerate(rot_order):
-        if c.lower() == "p":
-            pitch = rot[:, i]
-        elif c.lower() == "y":
-            yaw = rot[:, i]
-        elif c.lower() == "r":
-            roll = rot[:, i]
-        else:
-            raise NotImplementedError
-
-    CP = np.cos(pitch)
-    SP = np.sin(pitch)
-    CY = np.cos(yaw)
-    SY = np.sin(yaw)
-    CR = np.cos(roll)
-    SR = np.sin(roll)
-    ZERO = np.zeros(n)
-    ONE = np.ones(n)
-    # create the big rotation matrix for each rotator in rot from euler angles
-    # http://planning.cs.uiuc.edu/node102.html
-    yaw_rotmat = np.array(
-        [
-            [CY, -SY, ZERO],  # this is
-            [SY, CY, ZERO],  # the yaw (counterclockwise)
-            [ZERO, ZERO, ONE],  # rottation matrix
-        ]
-    )
-    yaw_rotmat = np.moveaxis(yaw_rotmat, 2, 0)
-    assert yaw_rotmat.shape == (n, 3, 3)
-    pitch_rotmat = np.array(
-        [
-            [CP, ZERO, SP],  # this is
-            [ZERO, ONE, ZERO],  # the pitch (counterclockwise)
-            [-SP, ZERO, CP],  # rotation matrix
-        ]
-    )
-    pitch_rotmat = np.moveaxis(pitch_rotmat, 2, 0)
-    assert pitch_rotmat.shape == (n, 3, 3)
-    roll_rotmat = np.array(
-        [
-            [ONE, ZERO, ZERO],  # this is
-            [ZERO, CR, -SR],  # the roll (counterclockwise)
-            [ZERO, SR, CR],  # rotation matrix
-        ]
-    )
-    roll_rotmat = np.moveaxis(roll_rotmat, 2, 0)
-    assert roll_rotmat.shape == (n, 3, 3)
-    rotmat = np.matmul(yaw_rotmat, np.matmul(pitch_rotmat, roll_rotmat))
-    # apply the rotation matrices to the vector
-    rotated = np.array([np.matmul(rotmat[i], vec[i]) for i in range(n)])
+    columns = [rot_order.lower().index(c) for c in "pyr"]
+    # batched (einsum) rotation matrices in the UE convention, see rotation.py
+    rotated = _rotation_module().rotate_vector(vec, rot[:, columns], degrees=degrees)
     assert rotated.shape == (n, 3)
     return rotated
 
@@ -249,7 +203,9 @@ def get_angles(dir1: np.ndarray, dir2: np.ndarray) -> Tuple[np.ndarray, np.ndarr
     return (pitch, yaw)
 
 
-def convert_to_df(data: Dict[str, Any]) -> pd.DataFrame:
+def convert_to_df(data: Dict[str, Any]) -> "pd.DataFrame":
+    import pandas as pd  # only needed here, so don't pay for it on import
+
     start_t: float = time.time()
     data = convert_to_list(data)
     data = flatten_dict(data)
@@ -264,33 +220,18 @@ def convert_to_df(data: Dict[str, Any]) -> pd.DataFrame:
 def fill_gaps(
     arr: np.ndarray, criteria: Callable[[Any], bool], mode: Optional[str] = "mean"
 ) -> np.ndarray:
-    bad_idxs = np.where(criteria(arr) == True)
-    assert len(bad_idxs) == 1  # only supports 1D data rn
-    ret = arr
-    for i in bad_idxs[0]:
-        if mode == "mean":
-            # check lower bound
-            lo = i - 1
-            while lo > 0 and criteria(arr[lo]) == True:
-                lo -= 1
-            if lo < 0:  # HACK for bounds check
-                ret[i] = np.mean(arr)
-                continue
-
-            # check upper bound
-            hi = i + 1
-            while hi < len(arr) - 1 and criteria(arr[hi]) == True:
-                hi += 1
-            if hi > len(arr) - 1:  # HACK for bounds check
-                ret[i] = np.mean(arr)
-                continue
-
-            ret[i] = (ret[lo] + ret[hi]) / 2
-        # TODO: add other modes
-    assert ret.shape == arr.shape
+    # fills arr in place and returns it (criteria must be vectorised, eg. lambda x: x < 0);
+    # see gap_filling.fill_gaps for a copying version, the other modes, N-D data and max_gap
     try:
-        assert len(np.where(criteria(ret) == True)[0]) == 0  # no more bad idxs
-    except:
+        from .gap_filling import fill_gaps as fill_runs
+    except ImportError:  # imported as a top-level module from this directory
+        from gap_filling import fill_gaps as fill_runs
+
+    filled, _ = fill_runs(arr, criteria, mode=mode)
+    assert filled.shape == np.shape(arr)
+    ret = arr
+    ret[...] = filled
+    if np.any(criteria(ret)):
         print("ERROR: some gaps still unfilled!!")
     return ret
 
@@ -1,14 +1,47 @@
-from typing import Optional, Tuple, List
+from typing import Any, Callable, Dict, Optional, Tuple, List
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 
+import hashlib
+import inspect
+import json
 import os
 
-mpl.use("Agg")
+from .decimation import decimation_indices
+
+try:
+    import fcntl  # serializes manifest updates from parallel renderers (POSIX only)
+except ImportError:
+    fcntl = None
 
 results_dir: str = "results"
 
+# long series are downsampled to about this many points before plotting (None: never),
+# see decimation.py; the min/max method keeps every visual extremum
+plot_point_budget: Optional[int] = 4000
+decimation_method: str = "minmax"
+
+# Every saved figure is recorded in a manifest in its results dir together with a digest
+# of the plotting function's inputs and of this module's source. A plot whose digest
+# matches an existing file is skipped before any figure is created.
+plot_cache_enabled: bool = True
+_manifest_name: str = ".plot_manifest.json"
+_source_digest: Optional[str] = None
+
+# matplotlib is imported on first plot so that runs without plots don't pay for it
+_pyplot = None
+
+
+def get_pyplot():
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib as mpl
+
+        mpl.use("Agg")
+        import matplotlib.pyplot as plt
+
+        _pyplot = plt
+    return _pyplot
+
 
 def set_results_dir(new_dir: str) -> None:
     global results_dir
@@ -16,6 +49,130 @@ def set_results_dir(new_dir: str) -> None:
     os.makedirs(results_dir, exist_ok=True)
 
 
+def set_point_budget(max_points: Optional[int], method: str = "minmax") -> None:
+    global plot_point_budget, decimation_method
+    plot_point_budget = max_points
+    decimation_method = method
+
+
+def _decimate(y: np.ndarray, x: Optional[np.ndarray] = None) -> np.ndarray:
+    return decimation_indices(y, plot_point_budget, x, decimation_method)
+
+
+def set_plot_cache(enabled: bool) -> None:
+    global plot_cache_enabled
+    plot_cache_enabled = enabled
+
+
+def _hash_value(h: "hashlib._Hash", value: Any) -> None:
+    if isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        h.update(f"ndarray{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.tobytes() if arr.dtype != object else repr(arr.tolist()).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}(".encode())
+        for v in value:
+            _hash_value(h, v)
+        h.update(b")")
+    elif isinstance(value, dict):
+        h.update(b"dict(")
+        for k in sorted(value, key=str):
+            h.update(repr(k).encode())
+            _hash_value(h, value[k])
+        h.update(b")")
+    else:
+        h.update(repr(value).encode())
+    h.update(b"\0")
+
+
+def plot_digest(fn_name: str, args: Dict[str, Any]) -> str:
+    # hash of the plotting inputs and of the plotting code (this file)
+    global _source_digest
+    if _source_digest is None:
+        src = hashlib.sha1()
+        for path in (__file__, os.path.join(os.path.dirname(__file__), "decimation.py")):
+            with open(path, "rb") as f:
+                src.update(f.read())
+        _source_digest = src.hexdigest()
+    h = hashlib.sha1()
+    h.update(f"{_source_digest}:{fn_name}:{plot_point_budget}:{decimation_method}".encode())
+    for k, v in args.items():
+        h.update(k.encode())
+        _hash_value(h, v)
+    return h.hexdigest()
+
+
+def figure_filename(filename: str) -> str:
+    return filename.lower().replace(" ", "_")  # all lowercase, use _ instead of spaces
+
+
+def _load_manifest(dir_path: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(dir_path, _manifest_name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_plot_cached(filename: str, digest: str, dir_path: Optional[str] = None) -> bool:
+    if not plot_cache_enabled:
+        return False
+    if dir_path is None:
+        dir_path = results_dir
+    filename = figure_filename(filename)
+    if not os.path.exists(os.path.join(dir_path, filename)):
+        return False
+    return _load_manifest(dir_path).get(filename) == digest
+
+
+def _versus_figure(args: Dict[str, Any]) -> str:
+    title = args["title"]
+    if title is None:
+        title = f"{args['name_y'].lower()} vs {args['name_x'].lower()}"
+    return f"{title}.png"
+
+
+# figure file written by each cached plotting function, from its bound arguments
+# (None: never cached); must match the names the functions below save to
+_cached_figures: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "plot_versus": _versus_figure,
+    "plot_histogram2d": lambda a: f"{a['name_x']} x {a['name_y']} Histogram2D.png",
+    "plot_vector_vs_time": lambda a: f"{a['title']}.png",
+    "plot_3Dt": lambda a: None if a["interactive"] else f"{a['title']}.png",
+}
+
+
+def is_call_cached(
+    fn: Callable, args: Tuple, kwargs: Dict[str, Any], dir_path: Optional[str] = None
+) -> bool:
+    # whether fn(*args, **kwargs) would find its figure cached and return without
+    # drawing, decided without calling it (PlotQueue skips such jobs before queueing)
+    figure = _cached_figures.get(getattr(fn, "__name__", ""))
+    if figure is None or not plot_cache_enabled or globals().get(fn.__name__) is not fn:
+        return False
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)  # what locals() holds on entry to fn
+    filename = figure(arguments)
+    return filename is not None and is_plot_cached(
+        filename, plot_digest(fn.__name__, arguments), dir_path
+    )
+
+
+def _record_plot(dir_path: str, filename: str, digest: str) -> None:
+    # read-merge-write under a lock so parallel renderers don't drop each other's entries
+    manifest_path = os.path.join(dir_path, _manifest_name)
+    with open(f"{manifest_path}.lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = _load_manifest(dir_path)
+        manifest[filename] = digest
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+
 def plot_versus(
     data_x: np.ndarray,
     data_y: np.ndarray,
@@ -31,6 +188,14 @@ def plot_versus(
     omit: Optional[Tuple[int, int]] = None,
     norm: Optional[bool] = False,  # normalize the data
 ) -> None:
+    digest = plot_digest("plot_versus", locals())
+    if title is None:
+        nx = name_x.lower()
+        ny = name_y.lower()
+        title = f"{ny} vs {nx}"
+    filename = f"{title}.png"
+    if is_plot_cached(filename, digest):
+        return
     if valid_idxs is not None:
         data_x = data_x[valid_idxs]
         data_y = data_y[valid_idxs]
@@ -40,8 +205,15 @@ def plot_versus(
     if omit is not None:
         data_x = data_x[omit[0] : -omit[1]]
         data_y = data_y[omit[0] : -omit[1]]
+    data_x = np.asarray(data_x)
+    data_y = np.asarray(data_y)
+    if len(data_x) == len(data_y):
+        idxs = _decimate(data_y, data_x)
+        data_x = data_x[idxs]
+        data_y = data_y[idxs]
 
     # create a figure that is 6in x 6in
+    plt = get_pyplot()
     fig = plt.figure()
 
     # the axis limits and grid lines
@@ -56,10 +228,6 @@ def plot_versus(
     plt.xticks()
     plt.yticks()
     plt.tick_params(labelsize=15)
-    if title is None:
-        nx = name_x.lower()
-        ny = name_y.lower()
-        title = f"{ny} vs {nx}"
     plt.title(title, fontsize=18)
 
     # plot dots
@@ -81,8 +249,7 @@ def plot_versus(
 
     # complete the layout, save figure, and show the figure for you to see
     plt.tight_layout()
-    filename = f"{title}.png"
-    save_figure_to_file(fig, filename)
+    save_figure_to_file(fig, filename, digest=digest)
 
 
 def plot_histogram2d(
@@ -95,11 +262,16 @@ def plot_histogram2d(
     bins: Optional[int] = 50,
     cmap: Optional[str] = "hot",
 ):
+    digest = plot_digest("plot_histogram2d", locals())
+    title: str = f"{name_x} x {name_y} Histogram2D"
+    filename = f"{title}.png"
+    if is_plot_cached(filename, digest):
+        return
+    plt = get_pyplot()
     fig = plt.figure()
     plt.hist2d(data_x, data_y, bins=bins, cmap=cmap)
     cb = plt.colorbar()
     cb.set_label("Frequency")
-    title: str = f"{name_x} x {name_y} Histogram2D"
     plt.title(title)
     unit_x_str = f" ({units_x})" if units_x is not None else ""
     unit_y_str = f" ({units_y})" if units_y is not None else ""
@@ -107,8 +279,7 @@ def plot_histogram2d(
     plt.ylabel(f"{name_y}{unit_y_str}")
     plt.tight_layout()
     # save to disk
-    filename = f"{title}.png"
-    save_figure_to_file(fig, filename)
+    save_figure_to_file(fig, filename, digest=digest)
 
 
 def plot_diff(
@@ -131,6 +302,7 @@ def plot_diff(
     subB = subB[trim_start : max_size - trim_end]
 
     # create a figure that is 6in x 6in
+    plt = get_pyplot()
     fig = plt.figure()
 
     # the axis limits and grid lines
@@ -166,22 +338,26 @@ def plot_diff(
 
 
 def save_figure_to_file(
-    fig: plt.Figure,
+    fig: "matplotlib.figure.Figure",
     filename: str,
     dir_path: Optional[str] = None,
     silent: Optional[bool] = False,
+    digest: Optional[str] = None,  # see plot_digest, recorded in the plot manifest
 ) -> None:
     # make file and save to disk
     if dir_path is None:
         global results_dir
         dir_path = results_dir
-    if not os.path.exists(os.path.join(os.getcwd(), dir_path)):
-        os.mkdir(dir_path)
-    filename: str = filename.lower().replace(
-        " ", "_"
-    )  # all lowercase, use _ instead of spaces
-    fig.savefig(os.path.join(dir_path, filename))
-    plt.close(fig)
+    os.makedirs(dir_path, exist_ok=True)
+    filename: str = figure_filename(filename)
+    # write to a temporary file first so concurrent renders never leave a partial png
+    path = os.path.join(dir_path, filename)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format=os.path.splitext(filename)[1][1:] or "png")
+    os.replace(tmp_path, path)
+    get_pyplot().close(fig)
+    if digest is not None:
+        _record_plot(dir_path, filename, digest)
     if not silent:
         print(f"output figure to {dir_path}/{filename}")
 
@@ -197,6 +373,10 @@ def plot_vector_vs_time(
     omit: Optional[Tuple[int, int]] = None,
     norm: Optional[bool] = False,
 ) -> None:
+    digest = plot_digest("plot_vector_vs_time", locals())
+    filename: str = f"{title}.png"
+    if is_plot_cached(filename, digest):
+        return
     if valid_idxs is not None:
         xyz = xyz[valid_idxs]
         t = t[valid_idxs]
@@ -208,6 +388,7 @@ def plot_vector_vs_time(
     n, d = xyz.shape
     assert xyz.shape == (n, d)
     assert t.shape == (n,)
+    plt = get_pyplot()
     fig = plt.figure()
     fig.suptitle(title)
     gs = fig.add_gridspec(d, hspace=0)
@@ -215,7 +396,8 @@ def plot_vector_vs_time(
     for dim in range(d):
         data_dim = xyz[:, dim]
         axs[dim].set(ylabel=ax_titles[dim] if dim < len(ax_titles) else "")
-        axs[dim].plot(t, data_dim)
+        idxs = _decimate(data_dim, t)
+        axs[dim].plot(t[idxs], data_dim[idxs])
         if vlines is not None:
             ymin = np.min(data_dim)
             ymax = np.max(data_dim)
@@ -228,8 +410,7 @@ def plot_vector_vs_time(
                     colors="r",
                 )
 
-    filename: str = f"{title}.png"
-    save_figure_to_file(fig, filename, silent=silent)
+    save_figure_to_file(fig, filename, silent=silent, digest=digest)
 
 
 def plot_3Dt(
@@ -242,13 +423,20 @@ def plot_3Dt(
     valid_idxs: Optional[np.ndarray] = None,
     omit: Optional[Tuple[int, int]] = None,
 ) -> None:
+    digest = plot_digest("plot_3Dt", locals())
+    filename: str = f"{title}.png"
+    if not interactive and is_plot_cached(filename, digest):
+        return
     if valid_idxs is not None:
         xyz = xyz[valid_idxs]
         t = t[valid_idxs]
     if omit is not None:
         xyz = xyz[omit[0] : -omit[1]]
         t = t[omit[0] : -omit[1]]
+    plt = get_pyplot()
     if interactive:
+        import matplotlib as mpl
+
         try:
             mpl.use("TkAgg")
         except Exception as e:
@@ -257,6 +445,10 @@ def plot_3Dt(
     n = len(t)
     assert xyz.shape == (n, 3)
     assert t.shape == (n,)
+    # min/max of every axis per bucket, so the extent of the path is kept
+    idxs = _decimate(xyz, t)
+    xyz = xyz[idxs]
+    t = t[idxs]
     fig = plt.figure(figsize=(10, 10))
     ax = fig.add_subplot(111, projection="3d")
     x = xyz[:, 1]
@@ -282,5 +474,4 @@ def plot_3Dt(
         plt.close()
         plt.clf()
     else:
-        filename: str = f"{title}.png"
-        save_figure_to_file(fig, filename)
+        save_figure_to_file(fig, filename, digest=digest)
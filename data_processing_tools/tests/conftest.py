@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tools import each other and the src package as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,24 @@
+import numpy as np
+
+from src.actors import relative_kinematics
+
+
+def test_relative_kinematics_has_speed_on_first_and_last_present_frame():
+    t = np.arange(10) * 0.1
+    ego_loc = np.stack([2000 * t, np.zeros_like(t), np.zeros_like(t)], axis=1)  # 20 m/s along x
+    present = np.zeros((2, 10), dtype=bool)
+    present[0, 2:8] = True  # spawned late, destroyed early
+    present[1, 5] = True    # seen for a single frame
+    location = np.full((2, 10, 3), np.nan)
+    location[0, 2:8] = np.stack([5000 + 2500 * t[2:8], np.full(6, 350.0), np.zeros(6)], axis=1)
+    location[1, 5] = [0, 0, 0]
+    tracks = {'ids': np.array(['1', '2']), 't': t, 'location': location, 'present': present}
+    data = {'EgoVariables': {'VehicleLoc': ego_loc, 'VehicleRot': np.zeros((10, 3))}}
+
+    table = relative_kinematics(data, tracks)
+    np.testing.assert_allclose(table['relative_speed'][2:8, 0], 5.0)
+    np.testing.assert_allclose(table['lateral_speed'][2:8, 0], 0.0, atol=1e-12)
+    assert np.isnan(table['relative_speed'][:2, 0]).all() and np.isnan(table['relative_speed'][8:, 0]).all()
+    np.testing.assert_allclose(table['lateral'][2:8, 0], 3.5)
+    # no speed from a single sample, but its position is still known
+    assert np.isnan(table['relative_speed'][5, 1]) and table['distance'][5, 1] == 10.0
@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from single_exp_data_intergrate import aligned_tensor_to_json, build_aligned_tensor
+
+
+def make_vehicles():
+    return {
+        'ego': {
+            'carla_ts': [0.0, 0.1, 0.2, 0.3],
+            'location': [[0, 0, 0], [1, 0, 0], [2, 0, 0], [3, 0, 0]],
+        },
+        # spawned late
+        'other': {
+            'carla_ts': [0.2, 0.3],
+            'location': [[10, 3, 0], [11, 3, 0]],
+        },
+    }
+
+
+def test_build_aligned_tensor_masks_absent_samples():
+    aligned = build_aligned_tensor(make_vehicles(), 'ego', features=['location'])
+    assert aligned['veh_ids'] == ['ego', 'other']
+    assert aligned['features'] == ['location_0', 'location_1', 'location_2']
+    np.testing.assert_array_equal(aligned['mask'][1], [False, False, True, True])
+    assert np.isnan(aligned['data'][1, :2]).all()
+    np.testing.assert_array_equal(aligned['data'][1, 2:, 0], [10, 11])
+
+
+def test_build_aligned_tensor_rejects_mismatched_width():
+    vehicles = make_vehicles()
+    vehicles['other']['location'] = [[10, 3], [11, 3]]
+    with pytest.raises(ValueError, match="other.*'location'.*width 2"):
+        build_aligned_tensor(vehicles, 'ego', features=['location'])
+
+
+def test_aligned_tensor_json_uses_null_for_absent_samples():
+    aligned = build_aligned_tensor(make_vehicles(), 'ego', features=['location'])
+    text = json.dumps(aligned_tensor_to_json(aligned), allow_nan=False)
+    restored = json.loads(text)
+    assert restored['data'][1][0] == [None, None, None]
+    np.testing.assert_array_equal(
+        np.asarray(restored['data'], dtype=float), aligned['data']
+    )
@@ -0,0 +1,29 @@
+import numpy as np
+
+from src.attention import attention_summary, gaze_attention
+
+
+def test_box_follows_actor_yaw():
+    # actor 10 m ahead (+x) turned to yaw 90 deg: its long side (480 cm) faces the ego
+    origin = np.array([[0.0, 0.0, 75.0], [0.0, 0.0, 75.0]])
+    targets = np.array([[1000.0, 200.0, 75.0],   # 2 m off centre: within the half length
+                        [1000.0, 400.0, 75.0]])  # 4 m off centre: past the front bumper
+    direction = targets - origin
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    rays = {'COMBINED': {'origin': origin, 'dir': direction, 'valid': np.ones(2, dtype=bool)}}
+    tracks = {
+        'ids': np.array([7]),
+        't': np.array([0.0, 0.1]),
+        'location': np.array([[[1000.0, 0.0, 0.0], [1000.0, 0.0, 0.0]]]),
+        'rotation': np.array([[[0.0, 0.0, 90.0], [0.0, 0.0, 90.0]]]),  # roll, pitch, yaw
+        'present': np.ones((1, 2), dtype=bool),
+    }
+    att = gaze_attention(rays, tracks, cone_deg=3.0)
+    assert att['box_offset'][0, 0] == 0.0  # the ray passes through the side of the box
+    np.testing.assert_array_equal(att['attended'], [0, -1])
+    assert att['box_offset'][1, 0] > 3.0
+
+
+def test_attention_summary_of_empty_trial():
+    att = {'ids': np.array([7]), 't': np.zeros(0), 'attended': np.zeros(0, dtype=int)}
+    assert attention_summary(att) == {}
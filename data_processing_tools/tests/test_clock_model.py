@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from single_exp_data_intergrate import estimate_clock_model, traj_to_vr_time
+
+
+def ego_position_cm(t_s):
+    # accelerating ego on a road heading 30 deg off the x axis
+    s = 2000 * t_s + 50 * t_s**2 + 300 * np.sin(0.7 * t_s)
+    heading = np.radians(30)
+    return np.stack([s * np.cos(heading) + 5e4, s * np.sin(heading) - 2e4, np.full_like(s, 30)], axis=1)
+
+
+@pytest.mark.parametrize('offset_ms, drift_ppm', [(137.0, 250.0), (-2500.0, -80.0), (0.0, 0.0)])
+def test_clock_model_recovers_offset_and_drift(offset_ms, drift_ppm):
+    slope = 1 + drift_ppm * 1e-6
+    # trajectory clock at 20 Hz, VR at ~90 Hz with its own offset and rate
+    traj_ts_ms = 10000 + np.arange(0, 60000, 50.0)
+    true_traj_s = (traj_ts_ms - traj_ts_ms[0]) / 1000
+    vr_true_s = np.arange(-1.0, 55.0, 1 / 90)  # VR log starts earlier, ends earlier
+    vr_ts_ms = traj_ts_ms[0] + offset_ms + slope * vr_true_s * 1000
+
+    model = estimate_clock_model(
+        traj_ts_ms,
+        ego_position_cm(true_traj_s),
+        vr_ts_ms,
+        ego_position_cm(vr_true_s),
+    )
+    assert model is not None
+    assert model['offset_ms'] == pytest.approx(offset_ms, abs=0.5)
+    assert model['drift_ppm'] == pytest.approx(drift_ppm, abs=10)
+    assert model['residual_stats']['max_abs'] < 1.0
+    # only trajectory samples inside the VR log are paired
+    assert model['n_pairs'] < len(traj_ts_ms)
+    predicted = traj_to_vr_time(traj_ts_ms[:10], model)
+    expected = traj_ts_ms[0] + offset_ms + slope * (traj_ts_ms[:10] - traj_ts_ms[0])
+    np.testing.assert_allclose(predicted, expected, atol=0.5)
+
+
+def test_clock_model_needs_motion():
+    ts = np.arange(0, 5000, 50.0)
+    parked = np.zeros((len(ts), 3))
+    assert estimate_clock_model(ts, parked, ts, parked) is None
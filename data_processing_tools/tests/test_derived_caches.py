@@ -0,0 +1,19 @@
+import os
+
+from convert import build_cache
+from src.pyramid import pyramid_cache_path
+
+
+def test_cache_paths_are_unique_per_recording():
+    a = pyramid_cache_path('/data/1/mandatory_a/recording.txt')
+    b = pyramid_cache_path('/data/1/mandatory_b/recording.txt')
+    assert a != b
+    assert os.path.basename(a).startswith('recording-') and a.endswith('.pyramid.npz')
+
+
+def test_build_cache_failure_only_warns(capsys):
+    def broken():
+        raise KeyError('EyeTracker')
+
+    build_cache('pyramid', 'recording.txt', broken)
+    assert "WARNING: could not build the pyramid cache of recording.txt: KeyError" in capsys.readouterr().out
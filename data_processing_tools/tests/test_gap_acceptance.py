@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from src.gap_acceptance import VEHICLE_LENGTH, adjacent_gaps, gap_episodes
+
+
+def platoon():
+    # target lane 1: a platoon at 25 m/s; the ego in lane 0 at 33 m/s closes in by 8 m/s,
+    # so each vehicle comes alongside at r0 / 8 s (2.55, 6.31, 6.675 and 10.5 s)
+    t = np.arange(0, 10, 0.1)
+    r0 = np.array([20.4, 50.5, 53.4, 84.0, 10.0])  # the last one drives ahead in lane 0
+    s = 100 + r0[:, None] + 25 * t[None]
+    lanes = np.array([1, 1, 1, 1, 0])[:, None].repeat(len(t), axis=1)
+    lateral = 3.75 * lanes.astype(float)
+    speed = np.full(s.shape, 25.0)
+    present = np.ones(s.shape, dtype=bool)
+    ego_s = 100 + 33 * t
+    ego_speed = np.full(len(t), 33.0)
+    return t, adjacent_gaps(s, lateral, lanes, speed, present, ego_s, ego_speed, target_lane=1)
+
+
+def test_adjacent_gaps_known_answers():
+    t, gaps = platoon()
+    i = 70  # t = 7 s: between vehicles 2 (behind) and 3 (ahead)
+    assert (gaps['lead'][i], gaps['follow'][i]) == (3, 2)
+    assert gaps['front_gap'][i] == pytest.approx(84.0 - 8 * 7 - VEHICLE_LENGTH)
+    assert gaps['rear_gap'][i] == pytest.approx(8 * 7 - 53.4 - VEHICLE_LENGTH)
+    assert gaps['gap_length'][i] == pytest.approx(84.0 - 53.4 - VEHICLE_LENGTH)
+    assert gaps['time_gap'][i] == pytest.approx((84.0 - 53.4 - VEHICLE_LENGTH) / 25)
+    assert gaps['lead_rel_speed'][i] == pytest.approx(-8.0)
+    # before the first vehicle comes alongside the gap is open behind the ego
+    assert (gaps['lead'][0], gaps['follow'][0]) == (0, -1)
+    assert np.isnan(gaps['gap_length'][0]) and np.isnan(gaps['follow_speed'][0])
+
+
+def test_gap_episodes_labels():
+    t, gaps = platoon()
+    episodes = gap_episodes(gaps, t, i_cross=80, min_offer=0.5)
+    assert list(episodes['label']) == ['rejected', 'rejected', 'passed', 'accepted']
+    np.testing.assert_array_equal(episodes['lead'], [0, 1, 2, 3])
+    np.testing.assert_array_equal(episodes['follow'], [-1, 0, 1, 2])
+    np.testing.assert_allclose(episodes['duration'], [2.6, 3.8, 0.3, 1.4], atol=1e-9)
+    # the accepted gap ends at the crossing frame
+    assert episodes['i_end'][-1] == 80
+    np.testing.assert_allclose(episodes['min_gap_length'][1:], np.array([30.1, 2.9, 30.6]) - VEHICLE_LENGTH)
+    np.testing.assert_allclose(episodes['mean_follow_rel_speed'][1:], -8.0)
+
+
+def test_gap_episodes_without_crossing_accepts_nothing():
+    t, gaps = platoon()
+    offered = t < 5  # the ego only drove next to the lane for 5 s
+    episodes = gap_episodes(gaps, t, offered)
+    assert list(episodes['label']) == ['rejected', 'rejected']
+    assert episodes['t_end'][-1] == pytest.approx(4.9)
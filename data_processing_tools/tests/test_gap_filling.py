@@ -0,0 +1,33 @@
+import numpy as np
+
+from src import utils
+from src.gap_filling import fill_gaps
+
+
+def test_mean_mode_fills_interior_runs_with_neighbour_mean_and_edges_with_array_mean():
+    pupil = np.array([-1.0, 4.0, -1.0, -1.0, 6.0, 2.0, -1.0])
+    filled, was_filled = fill_gaps(pupil, pupil < 0, mode="mean")
+    np.testing.assert_allclose(filled, [4.0, 4.0, 5.0, 5.0, 6.0, 2.0, 4.0])
+    np.testing.assert_array_equal(was_filled, pupil < 0)
+    assert pupil[0] == -1.0  # the input is not modified
+
+
+def test_linear_mode_is_column_wise_and_respects_max_gap():
+    arr = np.array([[0.0, 1.0], [np.nan, 1.0], [2.0, np.nan], [3.0, np.nan], [4.0, np.nan], [5.0, 5.0]])
+    filled, was_filled = fill_gaps(arr, np.isnan(arr), mode="linear", max_gap=2)
+    np.testing.assert_allclose(filled[:, 0], [0, 1, 2, 3, 4, 5])
+    assert np.isnan(filled[2:5, 1]).all() and not was_filled[:, 1].any()
+
+
+def test_utils_fill_gaps_still_fills_in_place():
+    pupil = np.array([3.0, -1.0, 5.0, -1.0])
+    ret = utils.fill_gaps(pupil, lambda x: x < 0, mode="mean")
+    assert ret is pupil
+    np.testing.assert_allclose(pupil, [3.0, 4.0, 5.0, 4.0])
+
+
+def test_empty_input_returns_empty_copies():
+    for arr in (np.zeros(0), np.zeros((0, 2))):
+        filled, was_filled = fill_gaps(arr, lambda x: x < 0, mode="linear")
+        assert filled.shape == arr.shape and was_filled.shape == arr.shape
+        assert was_filled.dtype == bool
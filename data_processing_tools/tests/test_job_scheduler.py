@@ -0,0 +1,10 @@
+from job_scheduler import job_fingerprint
+
+
+def test_clock_correction_changes_job_fingerprint(tmp_path):
+    for name in ('trial.json', 'recording.txt'):
+        (tmp_path / name).write_text('x')
+    job = {'json_file': str(tmp_path / 'trial.json'), 'log_file': str(tmp_path / 'recording.txt')}
+    plain = job_fingerprint(job, 'v1')
+    assert job_fingerprint({**job, 'clock_correction': False}, 'v1') == plain
+    assert job_fingerprint({**job, 'clock_correction': True}, 'v1') != plain
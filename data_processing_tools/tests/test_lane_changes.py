@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.lane_changes import detect_lane_changes
+from src.lanes import LaneGeometry
+
+CENTRES = np.array([0.0, 3.75, 7.5, 11.25])
+
+
+def ramp(t, t0, duration, y0, y1):
+    # cosine lateral profile from y0 to y1 over [t0, t0 + duration]
+    phase = np.clip((t - t0) / duration, 0, 1)
+    return y0 + (y1 - y0) * (1 - np.cos(np.pi * phase)) / 2
+
+
+def drive():
+    t = np.arange(0, 40, 0.1)
+    lateral = ramp(t, 5, 4, 0.0, 3.75)                              # lane 0 -> 1, crosses at 7 s
+    lateral += 1.2 * np.sin(np.pi * np.clip((t - 15) / 4, 0, 1)) ** 2  # drifts 1.2 m right, returns
+    lateral += ramp(t, 25, 8, 0.0, 7.5)                             # lane 1 -> 3 in one manoeuvre
+    geometry = LaneGeometry(origin=(0.0, 0.0), heading=0.0, lane_centres=CENTRES)
+    location = np.stack([2500 * t, 100 * lateral, np.zeros_like(t)], axis=1)  # road along +x
+    lane, _ = geometry.assign(location)
+    return t, lateral, lane
+
+
+def test_detect_lane_changes_known_answers():
+    t, lateral, lane = drive()
+    events = detect_lane_changes(t, lateral, lane, lane_centres=CENTRES)
+
+    assert list(events['kind']) == ['complete', 'aborted', 'complete', 'complete']
+    np.testing.assert_array_equal(events['direction'], [1, 1, 1, 1])
+    np.testing.assert_array_equal(events['from_lane'], [0, 1, 1, 2])
+    np.testing.assert_array_equal(events['to_lane'], [1, 2, 2, 3])
+    # boundaries at 1.875, 5.625 and 9.375 m: 7 s, 25 + 8/3 s and 25 + 16/3 s
+    np.testing.assert_allclose(events['t_cross'][[0, 2, 3]], [7.0, 25 + 8 / 3, 25 + 16 / 3], atol=0.02)
+    assert np.isnan(events['t_cross'][1]) and events['i_cross'][1] == -1
+
+    # each manoeuvre spans its sideways motion
+    assert 5.0 <= events['t_start'][0] < 5.5 and 8.5 < events['t_end'][0] <= 9.0
+    assert 15.0 <= events['t_start'][1] < 15.5 and 16.5 < events['t_end'][1] <= 17.5
+    # the double change is split at its crossings
+    assert 25.0 <= events['t_start'][2] < 25.5 and events['t_end'][3] <= 33.0
+    assert events['i_end'][2] == events['i_cross'][3] and events['i_start'][3] == events['i_cross'][2]
+    assert events['in_motion'].all()
+    assert events['peak_lateral_speed'][0] == pytest.approx(3.75 * np.pi / 8, rel=0.05)
+
+
+def test_detect_lane_changes_ignores_lane_keeping():
+    t = np.arange(0, 20, 0.1)
+    lateral = 3.75 + 0.3 * np.sin(2 * np.pi * t / 5)  # weaving inside lane 1
+    events = detect_lane_changes(t, lateral, np.ones(len(t), dtype=int), lane_centres=CENTRES)
+    assert len(events['kind']) == 0
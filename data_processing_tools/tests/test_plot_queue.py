@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+
+from src.plot_queue import PlotQueue
+from src.visualizer import plot_vector_vs_time, plot_versus
+
+
+def submit_all(plots, t):
+    plots.submit(plot_versus, data_x=t, data_y=np.sin(t), name_x="Time", name_y="Sine")
+    plots.submit(plot_vector_vs_time, np.stack([t, t**2, np.cos(t)], axis=1), t, "Vector")
+
+
+def test_cached_plots_are_skipped_before_the_pool_starts(tmp_path):
+    t = np.linspace(0, 10, 20000)  # large enough to be spilled
+    results = str(tmp_path)
+    with PlotQueue(results, max_workers=2) as plots:
+        submit_all(plots, t)
+        assert plots.executor is not None and plots.n_cached == 0
+    assert sorted(f for f in os.listdir(results) if f.endswith('.png')) == ['sine_vs_time.png', 'vector.png']
+
+    with PlotQueue(results, max_workers=2) as plots:
+        submit_all(plots, t)
+        assert plots.executor is None and plots.spill_dir is None
+        assert plots.n_cached == 2
+
+    # changed data is drawn again
+    with PlotQueue(results, max_workers=2) as plots:
+        plots.submit(plot_versus, data_x=t, data_y=np.cos(t), name_x="Time", name_y="Sine")
+        assert plots.n_cached == 0 and plots.executor is not None
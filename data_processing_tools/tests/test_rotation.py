@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from src.rotation import (
+    apply, forward_vector, matrix_to_rotator, quat_to_matrix, rotator_to_matrix, rotator_to_quat
+)
+
+
+def ue_rotation_matrix(pitch, yaw, roll):
+    # FRotationTranslationMatrix (UnrealMath), rows are the rotated X, Y and Z axes
+    # and vectors are transformed as rows: world = local @ M
+    P, Y, R = np.radians([pitch, yaw, roll])
+    SP, CP, SY, CY, SR, CR = np.sin(P), np.cos(P), np.sin(Y), np.cos(Y), np.sin(R), np.cos(R)
+    return np.array([
+        [CP * CY, CP * SY, SP],
+        [SR * SP * CY - CR * SY, SR * SP * SY + CR * CY, -SR * CP],
+        [-(CR * SP * CY + SR * SY), CY * SR - CR * SP * SY, CR * CP],
+    ])
+
+
+@pytest.mark.parametrize('rot, local, world', [
+    ((0, 90, 0), (1, 0, 0), (0, 1, 0)),     # yaw turns forward towards +Y (right)
+    ((90, 0, 0), (1, 0, 0), (0, 0, 1)),     # pitch up points forward at +Z
+    ((0, 0, 90), (0, 1, 0), (0, 0, -1)),    # roll right lowers the right axis
+    ((0, 0, 90), (0, 0, 1), (0, 1, 0)),
+    ((0, 180, 0), (1, 2, 3), (-1, -2, 3)),
+])
+def test_rotator_to_matrix_known_answers(rot, local, world):
+    np.testing.assert_allclose(apply(rotator_to_matrix(rot), local), world, atol=1e-12)
+
+
+def test_rotator_to_matrix_matches_ue_rotation_matrix():
+    rng = np.random.default_rng(0)
+    rots = rng.uniform([-89, -180, -180], [89, 180, 180], size=(50, 3))
+    R = rotator_to_matrix(rots)
+    expected = np.stack([ue_rotation_matrix(*rot) for rot in rots])
+    # our matrices act on column vectors, so they are UE's transposed
+    np.testing.assert_allclose(R, np.swapaxes(expected, -1, -2), atol=1e-12)
+    np.testing.assert_allclose(R[..., 0], forward_vector(rots), atol=1e-12)
+    np.testing.assert_allclose(matrix_to_rotator(R), rots, atol=1e-9)
+    np.testing.assert_allclose(quat_to_matrix(rotator_to_quat(rots)), R, atol=1e-12)
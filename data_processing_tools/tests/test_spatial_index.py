@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.lanes import LaneGeometry
+from src.spatial_index import FrameIndex
+
+
+def test_default_lanes_are_centred_on_the_road_axis():
+    # one frame; the ego lane centre is lateral 0, vehicles wobble around the centres
+    lateral = np.array([[-0.2], [0.3], [3.6], [-3.9], [1.8]])
+    s = np.array([[10.0], [30.0], [5.0], [-20.0], [50.0]])
+    index = FrameIndex(s, lateral, np.ones_like(s, dtype=bool))
+    np.testing.assert_array_equal(index.lanes[:, 0], [0, 0, 1, -1, 0])
+    # the ego jittering across lateral 0 stays in one lane with the same leader
+    for ego_lateral in (-0.1, 0.1):
+        lane = np.round(ego_lateral / 3.75).astype(int)
+        assert index.leader([0], [lane], [0.0]) == (np.array([0]), np.array([10.0]))
+    actor, gap = index.follower([0], [-1], [0.0])
+    assert actor[0] == 3 and gap[0] == 20.0
+
+
+def test_from_tracks_uses_lane_geometry():
+    geometry = LaneGeometry(origin=(0.0, 0.0), heading=np.pi / 2, lane_centres=[-3.75, 0.0, 3.75])
+    # road along +y, so lateral (+ right) is -x; locations in cm
+    location = np.array([
+        [[0.0, 1000.0, 0.0], [0.0, 2000.0, 0.0]],       # centre lane
+        [[-375.0, 3000.0, 0.0], [-390.0, 4000.0, 0.0]],  # right lane
+        [[5000.0, 0.0, 0.0], [5000.0, 0.0, 0.0]],       # off the road
+    ])
+    tracks = {'ids': np.array(['7', '8', '9']), 'location': location, 'present': np.ones((3, 2), dtype=bool)}
+    index = FrameIndex.from_tracks(tracks, geometry)
+    np.testing.assert_array_equal(index.lanes, [[1, 1], [2, 2], [-1, -1]])
+    np.testing.assert_allclose(index.s[:, 1], [20.0, 40.0, 0.0], atol=1e-9)
+    lead, gap = index.leader([0, 1], [2, 2], [0.0, 0.0])
+    np.testing.assert_array_equal(index.ids[lead], ['8', '8'])
+    np.testing.assert_allclose(gap, [30.0, 40.0])
+    assert not index.present[2].any()
@@ -0,0 +1,13 @@
+import os
+
+import build
+
+
+def test_convert_version_follows_local_imports_only():
+    sources = [os.path.join(build.TOOLS_DIR, path) for path in build.STAGE_SOURCES['convert']]
+    files = {os.path.relpath(path, build.TOOLS_DIR) for path in build.local_imports(sources)}
+    # imported by convert directly, through src/ and lazily inside functions
+    assert {'convert.py', 'single_exp_data_intergrate.py', 'config_loader.py',
+            'src/parser.py', 'src/utils.py', 'src/rotation.py', 'src/visualizer.py'} <= files
+    # analysis-only modules do not invalidate converted trials
+    assert not {'src/lane_changes.py', 'src/gap_acceptance.py', 'lane_change_events.py'} & files
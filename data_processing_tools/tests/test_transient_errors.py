@@ -0,0 +1,19 @@
+import errno
+from concurrent.futures.process import BrokenProcessPool
+
+from single_person_data_intergrate import is_transient
+
+
+def test_transient_errors_are_retried():
+    assert is_transient(BrokenProcessPool('worker died'))
+    assert is_transient(MemoryError())
+    assert is_transient(TimeoutError())
+    assert is_transient(OSError(errno.EIO, 'Input/output error'))
+    assert is_transient(OSError(errno.EAGAIN, 'Resource temporarily unavailable'))
+
+
+def test_permanent_errors_are_not_retried():
+    assert not is_transient(FileNotFoundError(errno.ENOENT, 'No such file'))
+    assert not is_transient(PermissionError(errno.EACCES, 'Permission denied'))
+    assert not is_transient(IsADirectoryError(errno.EISDIR, 'Is a directory'))
+    assert not is_transient(KeyError('location'))
@@ -0,0 +1,12 @@
+from trial_catalog import TrialCatalog
+
+
+def test_on_result_skips_malformed_trial(tmp_path, capsys):
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{not json')
+    catalog = TrialCatalog(str(tmp_path / 'catalog.sqlite'))
+    catalog.on_result({'job': {'output_dir': str(broken)}})
+    catalog.on_result({'job': {'output_dir': str(tmp_path / 'missing.json')}})
+    assert capsys.readouterr().out.count('WARNING: could not catalog') == 2
+    assert catalog.get(str(broken)) is None
+    catalog.close()
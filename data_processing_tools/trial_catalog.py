@@ -0,0 +1,371 @@
+"""
+trial_catalog.py - SQLite catalog of processed trials with summary statistics
+
+The catalog keeps one row per integrated trial so that questions such as
+"which trials have less than 80% valid eye tracking" or "how long are the
+mandatory trials of participant 12" are answered with SQL instead of opening
+hundreds of JSON files. Rows are updated incrementally: the pipeline upserts a
+trial as soon as it is converted, and sync() only re-reads trials whose
+integrated file changed since it was catalogued.
+
+Usage:
+    # Catalog (or update) all processed trials and print a report
+    python trial_catalog.py --data-dir ../lc_data_all
+
+    from trial_catalog import TrialCatalog
+
+    catalog = TrialCatalog('lc_data_all/trial_catalog.sqlite')
+    catalog.sync('lc_data_all')
+    rows = catalog.query(
+        "SELECT participant, scenario_idx, validity_pct FROM trials "
+        "WHERE exp_type = ? AND validity_pct < ?", ('discretionary', 80)
+    )
+
+Tables:
+    trials:       one row per trial (see TRIAL_COLUMNS)
+    trial_params: (output_file, name, value), one row per scenario parameter,
+                  e.g. SELECT output_file FROM trial_params
+                       WHERE name = 'cav_time_gap' AND value = 0.6
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from config_loader import get_default_constants
+from intergrate_all import find_all_person_data, find_trial_files
+from job_scheduler import file_fingerprint
+
+
+CATALOG_FILE = 'trial_catalog.sqlite'
+
+# Column name -> SQL type of the trials table
+TRIAL_COLUMNS = {
+    'output_file': 'TEXT PRIMARY KEY',   # integrated trial JSON
+    'participant': 'TEXT',
+    'exp_type': 'TEXT',
+    'scenario_idx': 'INTEGER',
+    'param_name': 'TEXT',
+    'params': 'TEXT',                    # JSON of exp_info['param']
+    'json_file': 'TEXT',                 # source trajectory JSON
+    'log_file': 'TEXT',                  # source VR recording
+    'json_fingerprint': 'TEXT',
+    'log_fingerprint': 'TEXT',
+    'output_fingerprint': 'TEXT',
+    'vr_id': 'TEXT',
+    'num_vehicles': 'INTEGER',
+    'num_frames': 'INTEGER',
+    'duration_s': 'REAL',
+    'validity_pct': 'REAL',              # frames with all eye-tracker flags valid
+    'clock_offset_ms': 'REAL',
+    'clock_drift_ppm': 'REAL',
+    'residual_mean_ms': 'REAL',
+    'residual_std_ms': 'REAL',
+    'residual_median_abs_ms': 'REAL',
+    'residual_p95_abs_ms': 'REAL',
+    'residual_max_abs_ms': 'REAL',
+    'updated_at': 'REAL',
+}
+
+# Eye-tracker flags that must all be set for a frame to count as valid
+# (same criterion as src.utils.filter_to_idxs)
+VALIDITY_FLAGS = (
+    'COMBINEDGazeValid',
+    'LEFTGazeValid',
+    'LEFTEyeOpennessValid',
+    'LEFTPupilPositionValid',
+    'RIGHTGazeValid',
+    'RIGHTEyeOpennessValid',
+    'RIGHTPupilPositionValid',
+)
+OPENNESS_KEYS = ('LEFTEyeOpenness', 'RIGHTEyeOpenness')
+
+
+# ============================================================================
+# SUMMARY FUNCTIONS
+# ============================================================================
+
+def validity_percentage(vr_info: dict) -> Optional[float]:
+    """
+    Percentage of frames where every eye-tracker validity flag is set and
+    both eyes are open.
+
+    Args:
+        vr_info: all_veh_info entry of the VR vehicle
+
+    Returns:
+        Percentage in [0, 100], or None if the trial has no eye-tracking data
+    """
+    import numpy as np
+
+    if not all(k in vr_info for k in VALIDITY_FLAGS + OPENNESS_KEYS):
+        return None
+    num_frames = len(vr_info[VALIDITY_FLAGS[0]])
+    if num_frames == 0:
+        return None
+    valid = np.ones(num_frames, dtype=bool)
+    for key in VALIDITY_FLAGS:
+        valid &= np.asarray(vr_info[key], dtype=float) != 0
+    for key in OPENNESS_KEYS:
+        valid &= np.asarray(vr_info[key], dtype=float) > 0
+    return float(100 * valid.mean())
+
+
+def summarize_trial(output_file: str, job: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Build the catalog row of one integrated trial.
+
+    Args:
+        output_file: Path of the integrated trial JSON
+        job: Optional convert job that produced it (adds the source files)
+
+    Returns:
+        Dictionary with the columns of TRIAL_COLUMNS
+    """
+    with open(output_file, 'r') as f:
+        data = json.load(f)
+    exp_info = data['exp_info']
+    vr_id = str(data['vr_id'])
+    vr_info = data['all_veh_info'].get(vr_id, {})
+    carla_ts = vr_info.get('carla_ts', [])
+    clock = data.get('clock_alignment') or {}
+    stats = clock.get('residual_stats') or {}
+
+    json_file = job['json_file'] if job is not None else None
+    log_file = job['log_file'] if job is not None else None
+    return {
+        'output_file': os.path.abspath(output_file),
+        'participant': os.path.basename(os.path.dirname(os.path.dirname(
+            os.path.abspath(output_file)))),
+        'exp_type': exp_info['type'],
+        'scenario_idx': get_default_constants().get_param_dict(exp_info['type']).get(
+            str(exp_info['param_name'])),
+        'param_name': str(exp_info['param_name']),
+        'params': json.dumps(exp_info['param']),
+        'json_file': os.path.abspath(json_file) if json_file else None,
+        'log_file': os.path.abspath(log_file) if log_file else None,
+        'json_fingerprint': file_fingerprint(json_file) if json_file else None,
+        'log_fingerprint': file_fingerprint(log_file) if log_file else None,
+        'output_fingerprint': file_fingerprint(output_file),
+        'vr_id': vr_id,
+        'num_vehicles': len(data['all_veh_info']),
+        'num_frames': len(carla_ts),
+        'duration_s': float(carla_ts[-1] - carla_ts[0]) if len(carla_ts) > 1 else 0.0,
+        'validity_pct': validity_percentage(vr_info),
+        'clock_offset_ms': clock.get('offset_ms'),
+        'clock_drift_ppm': clock.get('drift_ppm'),
+        'residual_mean_ms': stats.get('mean'),
+        'residual_std_ms': stats.get('std'),
+        'residual_median_abs_ms': stats.get('median_abs'),
+        'residual_p95_abs_ms': stats.get('p95_abs'),
+        'residual_max_abs_ms': stats.get('max_abs'),
+        'updated_at': time.time(),
+    }
+
+
+# ============================================================================
+# CATALOG
+# ============================================================================
+
+class TrialCatalog:
+    """
+    SQLite database with one row per processed trial.
+
+    Attributes:
+        db_path: Path of the SQLite file
+        conn: Open sqlite3 connection
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open (and if needed create) a catalog.
+
+        Args:
+            db_path: Path of the SQLite file
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        columns = ', '.join(f"{name} {sql_type}" for name, sql_type in TRIAL_COLUMNS.items())
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS trials ({columns})")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS trial_params ("
+                "output_file TEXT, name TEXT, value REAL, "
+                "PRIMARY KEY (output_file, name))"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_trials_scenario "
+                "ON trials (exp_type, scenario_idx)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_trials_participant ON trials (participant)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_params_value ON trial_params (name, value)"
+            )
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.conn.close()
+
+    def upsert(self, row: dict) -> None:
+        """
+        Insert or replace one trial row and its parameters.
+
+        Source files and fingerprints missing from row (None) keep the values
+        already in the catalog.
+        """
+        old = self.get(row['output_file'])
+        if old is not None:
+            for key in ('json_file', 'log_file', 'json_fingerprint', 'log_fingerprint'):
+                if row[key] is None:
+                    row[key] = old[key]
+        names = list(TRIAL_COLUMNS)
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO trials ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' for _ in names)})",
+                [row[name] for name in names]
+            )
+            self.conn.execute(
+                "DELETE FROM trial_params WHERE output_file = ?", (row['output_file'],)
+            )
+            self.conn.executemany(
+                "INSERT INTO trial_params (output_file, name, value) VALUES (?, ?, ?)",
+                [(row['output_file'], name, value)
+                 for name, value in json.loads(row['params']).items()]
+            )
+
+    def update_trial(self, output_file: str, job: Optional[Dict[str, str]] = None) -> None:
+        """Summarize one integrated trial and store it."""
+        self.upsert(summarize_trial(output_file, job))
+
+    def on_result(self, result: Dict[str, object]) -> None:
+        """JobScheduler callback: catalog a freshly converted trial."""
+        job = result['job']
+        try:
+            self.update_trial(job['output_dir'], job)
+        except (OSError, ValueError, KeyError) as e:
+            # A malformed trial must not abort the rest of the batch
+            print(f"WARNING: could not catalog {job['output_dir']}: {e}")
+
+    def get(self, output_file: str) -> Optional[sqlite3.Row]:
+        """Row of one trial, or None if it is not catalogued."""
+        return self.conn.execute(
+            "SELECT * FROM trials WHERE output_file = ?", (os.path.abspath(output_file),)
+        ).fetchone()
+
+    def is_current(self, output_file: str) -> bool:
+        """Check whether the catalogued row matches the file on disk."""
+        row = self.get(output_file)
+        return row is not None and row['output_fingerprint'] == file_fingerprint(output_file)
+
+    def remove(self, output_file: str) -> None:
+        """Delete one trial from the catalog."""
+        with self.conn:
+            self.conn.execute("DELETE FROM trials WHERE output_file = ?", (output_file,))
+            self.conn.execute("DELETE FROM trial_params WHERE output_file = ?", (output_file,))
+
+    def sync(self, data_dir: str) -> Dict[str, int]:
+        """
+        Bring the catalog in line with the processed data directory.
+
+        Only trials whose integrated file changed are re-read; trials whose
+        file disappeared are removed.
+
+        Args:
+            data_dir: Directory containing processed participant data
+
+        Returns:
+            Counts of 'updated', 'unchanged' and 'removed' trials
+        """
+        counts = {'updated': 0, 'unchanged': 0, 'removed': 0}
+        present = set()
+        for person_dir in find_all_person_data(data_dir):
+            for output_file in find_trial_files(person_dir):
+                present.add(os.path.abspath(output_file))
+                if self.is_current(output_file):
+                    counts['unchanged'] += 1
+                    continue
+                try:
+                    self.update_trial(output_file)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"WARNING: could not catalog {output_file}: {e}")
+                    continue
+                counts['updated'] += 1
+
+        # Only forget trials that belonged to this data directory
+        root = os.path.abspath(data_dir) + os.sep
+        for row in self.conn.execute("SELECT output_file FROM trials").fetchall():
+            if row['output_file'].startswith(root) and row['output_file'] not in present:
+                self.remove(row['output_file'])
+                counts['removed'] += 1
+        return counts
+
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Run a read query and return all rows."""
+        return self.conn.execute(sql, params).fetchall()
+
+    def print_report(self) -> None:
+        """Print per-scenario trial counts and summary metrics."""
+        rows = self.query(
+            "SELECT exp_type, scenario_idx, param_name, COUNT(*) AS n, "
+            "AVG(duration_s) AS duration, AVG(validity_pct) AS validity, "
+            "MAX(residual_p95_abs_ms) AS p95 "
+            "FROM trials GROUP BY exp_type, scenario_idx ORDER BY exp_type, scenario_idx"
+        )
+        print(f"{'exp_type':<14} {'idx':>3} {'params':<22} {'trials':>6} "
+              f"{'dur [s]':>8} {'valid %':>8} {'p95 res [ms]':>13}")
+        for row in rows:
+            validity = f"{row['validity']:8.1f}" if row['validity'] is not None else f"{'-':>8}"
+            p95 = f"{row['p95']:13.1f}" if row['p95'] is not None else f"{'-':>13}"
+            print(f"{row['exp_type']:<14} {row['scenario_idx']:>3} {row['param_name']:<22} "
+                  f"{row['n']:>6} {row['duration']:8.1f} {validity} {p95}")
+        total = self.query("SELECT COUNT(*) AS n, COUNT(DISTINCT participant) AS p FROM trials")[0]
+        print(f"{total['n']} trials from {total['p']} participants")
+
+
+def default_catalog_path(data_dir: str) -> str:
+    """Default location of the catalog inside a processed data directory."""
+    return os.path.join(data_dir, CATALOG_FILE)
+
+
+# ============================================================================
+# COMMAND LINE INTERFACE
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Update the SQLite trial catalog and print a report'
+    )
+    parser.add_argument(
+        '--data-dir', '-d',
+        type=str,
+        default=None,
+        help='Path to the processed data directory (default: ../lc_data_all)'
+    )
+    parser.add_argument(
+        '--db',
+        type=str,
+        default=None,
+        help=f'Path of the catalog (default: <data-dir>/{CATALOG_FILE})'
+    )
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lc_data_all'
+        )
+    catalog = TrialCatalog(args.db or default_catalog_path(data_dir))
+    start_t = time.time()
+    counts = catalog.sync(data_dir)
+    print(f"Catalog synced in {time.time() - start_t:.2f}s: {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed")
+    catalog.print_report()
+    catalog.close()